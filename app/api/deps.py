@@ -1,19 +1,47 @@
 from jose import jwt, JWTError
-from fastapi import Depends, HTTPException
+from fastapi import Depends, HTTPException, Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
+from dataclasses import dataclass
 from datetime import datetime, timezone
+from time import time
 
-from app.db.session import get_db
+from app.db.session import get_db, open_read_session
 from app.db.models import Business, Admin
-from app.core.security import SECRET_KEY, ALGORITHM
-from app.core.config import TIERS
+from app.core.security import SECRET_KEY, ALGORITHM, build_entitlements_claim
+from app.core.config import FEATURE_BITS
+from app.core.utils import (
+    get_cached_principal,
+    set_cached_principal,
+    get_cached_token_epoch,
+    set_cached_token_epoch,
+)
 
 
 #HTTP bearer scheme used for JWT-based authentication
 bearer_scheme = HTTPBearer(auto_error=False)
 
 
+#Compact snapshot of the business fields needed to authorise a request
+@dataclass(frozen=True)
+class BusinessPrincipal:
+    id: int
+    token_version: int
+    entitlements_version: int
+    tier: str
+    is_active: bool
+    email_verified: bool
+    stripe_subscription_status: str | None
+    stripe_current_period_end: datetime | None
+
+
+#Compact snapshot of an authenticated administrator
+@dataclass(frozen=True)
+class AdminPrincipal:
+    id: int
+    email: str
+
+
 #Decode and validate a JWT access token
 def decode_token(token: str) -> dict:
     try:
@@ -30,16 +58,100 @@ def decode_token(token: str) -> dict:
         raise HTTPException(status_code=401, detail="Invalid token")
 
 
-#Resolve the currently authenticated business with full access checks
-def get_current_business(
+#Decode the bearer token once per request
+def get_token_payload(
     creds: HTTPAuthorizationCredentials = Depends(bearer_scheme),
-    db: Session = Depends(get_db),
-) -> Business:
+) -> dict:
 
     if not creds or not creds.credentials:
         raise HTTPException(status_code=401, detail="Not authenticated")
 
-    payload = decode_token(creds.credentials)
+    return decode_token(creds.credentials)
+
+
+#Load the current (token_version, entitlements_version) epoch for a business, falling back to a primary key read
+def _load_token_epoch(db: Session, business_id: int, refresh: bool = False) -> tuple[int, int] | None:
+    epoch = None if refresh else get_cached_token_epoch(business_id)
+    if epoch is not None:
+        return epoch
+
+    row = (
+        db.query(Business.token_version, Business.entitlements_version)
+        .filter(Business.id == business_id)
+        .first()
+    )
+
+    if not row:
+        return None
+
+    epoch = (row.token_version, row.entitlements_version)
+    set_cached_token_epoch(business_id, epoch)
+
+    return epoch
+
+
+#Load the auth snapshot for a business, reading only the narrow auth columns on a cache miss
+def _load_business_principal(
+    db: Session,
+    business_id: int,
+    epoch: tuple[int, int],
+) -> BusinessPrincipal | None:
+    key = f"business:{business_id}"
+
+    #A snapshot taken before the latest epoch bump may carry stale access flags
+    principal = get_cached_principal(key)
+    if principal and (principal.token_version, principal.entitlements_version) == epoch:
+        return principal
+
+    row = (
+        db.query(
+            Business.id,
+            Business.token_version,
+            Business.entitlements_version,
+            Business.tier,
+            Business.is_active,
+            Business.email_verified,
+            Business.stripe_subscription_status,
+            Business.stripe_current_period_end,
+        )
+        .filter(Business.id == business_id)
+        .first()
+    )
+
+    if not row:
+        return None
+
+    principal = BusinessPrincipal(
+        id=row.id,
+        token_version=row.token_version,
+        entitlements_version=row.entitlements_version,
+        tier=row.tier,
+        is_active=row.is_active,
+        email_verified=row.email_verified,
+        stripe_subscription_status=row.stripe_subscription_status,
+        stripe_current_period_end=row.stripe_current_period_end,
+    )
+
+    set_cached_principal(key, principal)
+    return principal
+
+
+#Read-your-writes key for the token's subject
+def _pin_key(payload: dict) -> str:
+    return f"{payload.get('type') or 'business'}:{payload.get('sub')}"
+
+
+#Read-only session for dashboard lists: replica, unless the caller wrote recently
+def get_read_db(payload: dict = Depends(get_token_payload)):
+    db = open_read_session(_pin_key(payload))
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+#Resolve the business principal behind a decoded token without access checks
+def _resolve_business_principal(payload: dict, db: Session) -> BusinessPrincipal:
 
     if payload.get("type") == "admin":
         raise HTTPException(status_code=403, detail="Forbidden")
@@ -48,57 +160,86 @@ def get_current_business(
     if not business_id:
         raise HTTPException(status_code=401, detail="Invalid token")
 
-    business = db.get(Business, int(business_id))
-    if not business:
+    epoch = _load_token_epoch(db, int(business_id))
+    if epoch is None:
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+    #A token newer than this process's cached epoch was issued after a revoke elsewhere; re-read it
+    version = payload.get("ver", 0)
+    if version > epoch[0]:
+        epoch = _load_token_epoch(db, int(business_id), refresh=True)
+        if epoch is None:
+            raise HTTPException(status_code=401, detail="Invalid token")
+
+    if version < epoch[0]:
+        raise HTTPException(status_code=401, detail="Token revoked")
+
+    if version != epoch[0]:
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+    principal = _load_business_principal(db, int(business_id), epoch)
+    if not principal:
         raise HTTPException(status_code=401, detail="Invalid token")
 
-    if not business.email_verified:
+    #Writes through this request's session pin the business's reads to the primary
+    db.info["pin_key"] = _pin_key(payload)
+
+    return principal
+
+
+#Resolve the authenticated business principal with full access checks
+def get_current_principal(
+    payload: dict = Depends(get_token_payload),
+    db: Session = Depends(get_db),
+) -> BusinessPrincipal:
+
+    principal = _resolve_business_principal(payload, db)
+
+    if not principal.email_verified:
         raise HTTPException(status_code=403, detail="Email not verified")
 
-    if not business.is_active:
+    if not principal.is_active:
         raise HTTPException(status_code=403, detail="Account inactive")
 
+    return principal
+
+
+#Resolve the currently authenticated business with full access checks
+def get_current_business(
+    principal: BusinessPrincipal = Depends(get_current_principal),
+    db: Session = Depends(get_db),
+) -> Business:
+
+    business = db.get(Business, principal.id)
+    if not business:
+        raise HTTPException(status_code=401, detail="Invalid token")
+
     return business
 
 
 #Resolve an authenticated business during onboarding before full activation
 def get_current_business_onboarding(
-    creds: HTTPAuthorizationCredentials = Depends(bearer_scheme),
+    payload: dict = Depends(get_token_payload),
     db: Session = Depends(get_db),
 ) -> Business:
 
-    if not creds or not creds.credentials:
-        raise HTTPException(status_code=401, detail="Not authenticated")
+    principal = _resolve_business_principal(payload, db)
 
-    payload = decode_token(creds.credentials)
-
-    if payload.get("type") == "admin":
-        raise HTTPException(status_code=403, detail="Forbidden")
-
-    business_id = payload.get("sub")
-    if not business_id:
-        raise HTTPException(status_code=401, detail="Invalid token")
+    if not principal.email_verified:
+        raise HTTPException(status_code=403, detail="Email not verified")
 
-    business = db.get(Business, int(business_id))
+    business = db.get(Business, principal.id)
     if not business:
         raise HTTPException(status_code=401, detail="Invalid token")
 
-    if not business.email_verified:
-        raise HTTPException(status_code=403, detail="Email not verified")
-
     return business
 
 
 #Resolve the currently authenticated administrator
 def get_current_admin(
-    creds: HTTPAuthorizationCredentials = Depends(bearer_scheme),
+    payload: dict = Depends(get_token_payload),
     db: Session = Depends(get_db),
-) -> Admin:
-
-    if not creds or not creds.credentials:
-        raise HTTPException(status_code=401, detail="Not authenticated")
-
-    payload = decode_token(creds.credentials)
+) -> AdminPrincipal:
 
     if payload.get("type") != "admin":
         raise HTTPException(status_code=403, detail="Admin access required")
@@ -107,32 +248,50 @@ def get_current_admin(
     if not admin_id:
         raise HTTPException(status_code=401, detail="Invalid token")
 
+    db.info["pin_key"] = _pin_key(payload)
+
+    key = f"admin:{admin_id}"
+    principal = get_cached_principal(key)
+    if principal:
+        return principal
+
     admin = db.get(Admin, int(admin_id))
     if not admin:
         raise HTTPException(status_code=401, detail="Invalid token")
 
-    return admin
+    principal = AdminPrincipal(id=admin.id, email=admin.email)
+    set_cached_principal(key, principal)
+
+    return principal
 
 
-#Enforce feature availability and subscription validity for a business
+#Enforce feature availability and subscription validity using the token's entitlements claim
 def require_feature(feature: str):
-    def _check(business: Business = Depends(get_current_business)):
+    bit = FEATURE_BITS.get(feature, 0)
+
+    def _check(
+        response: Response,
+        payload: dict = Depends(get_token_payload),
+        business: BusinessPrincipal = Depends(get_current_principal),
+    ):
+        entitlements = payload.get("ent")
+        stale_headers = None
 
-        if not TIERS.get(business.tier, {}).get(feature):
-            raise HTTPException(status_code=403, detail="Upgrade required")
+        #Claims issued before the latest tier/subscription change are re-derived from the principal
+        if not entitlements or entitlements.get("v") != business.entitlements_version:
+            entitlements = build_entitlements_claim(business)
+            stale_headers = {"X-Entitlements-Stale": "1"}
+            response.headers.update(stale_headers)
 
-        if business.tier != "free":
-            if business.stripe_subscription_status not in ("active", "trialing"):
-                raise HTTPException(status_code=402, detail="Payment required")
+        if not entitlements["f"] & bit:
+            raise HTTPException(status_code=403, detail="Upgrade required", headers=stale_headers)
 
-            period_end = business.stripe_current_period_end
-            if period_end:
-                if period_end.tzinfo is None:
-                    period_end = period_end.replace(tzinfo=timezone.utc)
+        if entitlements["pay"]:
+            raise HTTPException(status_code=402, detail="Payment required", headers=stale_headers)
 
-                if datetime.now(timezone.utc) > period_end:
-                    raise HTTPException(status_code=402, detail="Subscription expired")
+        if entitlements["exp"] and time() > entitlements["exp"]:
+            raise HTTPException(status_code=402, detail="Subscription expired", headers=stale_headers)
 
         return business
 
-    return _check
\ No newline at end of file
+    return _check
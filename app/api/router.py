@@ -11,6 +11,8 @@ from app.api.routes import (
     stripe_webhook,
     public,
     customisation,
+    settings,
+    internal,
 )
 
 
@@ -28,6 +30,7 @@ api_router.include_router(enquiries.router)
 api_router.include_router(bookings.router)
 api_router.include_router(customisation.router)
 api_router.include_router(me.router)
+api_router.include_router(settings.router)
 
 
 #Public, unauthenticated routes used by customer-facing websites
@@ -40,4 +43,5 @@ api_router.include_router(stripe_webhook.router)
 
 
 #Admin-only routes for platform management
-api_router.include_router(business.router)
\ No newline at end of file
+api_router.include_router(business.router)
+api_router.include_router(internal.router)
\ No newline at end of file
@@ -1,16 +1,17 @@
 from datetime import datetime, timezone
 from fastapi import APIRouter, Depends, HTTPException, Request
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 import stripe
 
 from app.db.session import get_db
 from app.db.models import Business
-from app.core.security import hash_password, verify_password, create_access_token, verify_captcha, rate_limit
+from app.core.security import hash_password, verify_password, create_business_token, verify_captcha_async, rate_limit
 from app.services.email import (
     send_verification_email,
     send_password_reset_email,
 )
-from app.core.utils import slugify, generate_verification_code
+from app.core.utils import slugify, generate_verification_code, invalidate_cached_principal, revoke_business_tokens
 from app.api.deps import get_current_business_onboarding
 from app.core.config import settings, RESERVED_SLUGS, RATE_LIMITS
 from app.services.audit import log_action
@@ -67,10 +68,33 @@ def login(
 
     log_action(db=db, actor_type="business", actor_id=business.id, action="auth.login")
 
-    token = create_access_token({"sub": str(business.id)})
+    token = create_business_token(business)
     return TokenResponse(access_token=token)
 
 
+#Re-issue an access token with up-to-date entitlements for the current business
+@router.post("/refresh", response_model=TokenResponse)
+def refresh_token(
+    business: Business = Depends(get_current_business_onboarding),
+):
+    return TokenResponse(access_token=create_business_token(business))
+
+
+#Log out by revoking every access token issued to the business
+@router.post("/logout")
+def logout(
+    db: Session = Depends(get_db),
+    business: Business = Depends(get_current_business_onboarding),
+):
+    revoke_business_tokens(business)
+    db.commit()
+    invalidate_cached_principal(business.id)
+
+    log_action(db=db, actor_type="business", actor_id=business.id, action="auth.logout")
+
+    return {"status": "ok"}
+
+
 #Pre-register a new business and send an email verification code
 @router.post("/pre-register")
 def pre_register(
@@ -134,12 +158,13 @@ def pre_register(
         existing.is_active = False
         existing.email_verified = False
 
+        print("➡️ Queueing verification email (resend)")
+        send_verification_email(db=db, user_email=existing.email, code=code)
+
         db.commit()
+        invalidate_cached_principal(existing.id)
         print("DB commit complete (existing business updated)")
 
-        print("➡️ Sending verification email (resend)")
-        send_verification_email(user_email=existing.email, code=code)
-
         print("=== PRE-REGISTER COMPLETE (code_resent) ===")
         return {"status": "code_resent"}
 
@@ -186,14 +211,15 @@ def pre_register(
     )
 
     db.add(business)
+
+    print("➡️ Queueing verification email (new account)")
+    send_verification_email(db=db, user_email=business.email, code=code)
+
     db.commit()
 
     print("✅ New business created")
     print("Business ID:", business.id)
 
-    print("➡️ Sending verification email (new account)")
-    send_verification_email(user_email=business.email, code=code)
-
     print("=== PRE-REGISTER COMPLETE (code_sent) ===")
 
     return {"status": "code_sent"}
@@ -202,7 +228,7 @@ def pre_register(
 
 #Verify an email address using a one-time verification code
 @router.post("/verify-email-code")
-def verify_email_code(
+async def verify_email_code(
     payload: VerifyEmailCodeRequest,
     request: Request,
     db: Session = Depends(get_db),
@@ -217,8 +243,13 @@ def verify_email_code(
     if not rate_limit(key, limit, window):
         raise HTTPException(status_code=429, detail="Too many attempts")
 
-    verify_captcha(payload.captcha_token)
+    #The captcha round trip waits on the event loop; only the database work takes a worker thread
+    await verify_captcha_async(payload.captcha_token)
+
+    return await run_in_threadpool(_verify_email_code, db, email, code)
 
+
+def _verify_email_code(db: Session, email: str, code: str) -> dict:
     business = db.query(Business).filter(Business.email == email).first()
     if not business:
         raise HTTPException(status_code=400, detail="Invalid verification code")
@@ -245,6 +276,7 @@ def verify_email_code(
         business.is_active = True
 
     db.commit()
+    invalidate_cached_principal(business.id)
 
     log_action(
         db=db,
@@ -350,9 +382,11 @@ def resend_verification(
     business.is_active = False
     business.email_verified = False
 
+    send_verification_email(db=db, user_email=business.email, code=code)
+
     db.commit()
+    invalidate_cached_principal(business.id)
 
-    send_verification_email(user_email=business.email, code=code)
     return {"status": "ok"}
 
 
@@ -379,15 +413,17 @@ def request_password_reset(
 
     business.password_reset_code = code
     business.password_reset_expires = expires
+
+    send_password_reset_email(db=db, user_email=business.email, code=code)
+
     db.commit()
 
-    send_password_reset_email(user_email=business.email, code=code)
     return {"status": "ok"}
 
 
 #Reset account password after successful email + captcha verification
 @router.post("/reset-password")
-def reset_password(
+async def reset_password(
     payload: PasswordResetConfirmRequest,
     request: Request,
     db: Session = Depends(get_db),
@@ -401,8 +437,12 @@ def reset_password(
     if not rate_limit(key, limit, window):
         raise HTTPException(status_code=429, detail="Too many attempts")
 
-    verify_captcha(payload.captcha_token)
+    await verify_captcha_async(payload.captcha_token)
+
+    return await run_in_threadpool(_reset_password, db, email, payload)
+
 
+def _reset_password(db: Session, email: str, payload: PasswordResetConfirmRequest) -> dict:
     business = db.query(Business).filter(Business.email == email).first()
     if not business:
         raise HTTPException(status_code=400, detail="Invalid reset code")
@@ -421,7 +461,9 @@ def reset_password(
     business.hashed_password = hash_password(payload.new_password)
     business.password_reset_code = None
     business.password_reset_expires = None
+    revoke_business_tokens(business)
     db.commit()
+    invalidate_cached_principal(business.id)
 
     log_action(
         db=db,
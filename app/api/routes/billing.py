@@ -3,13 +3,12 @@ from sqlalchemy.orm import Session
 from datetime import timezone
 
 from app.db.session import get_db
-from app.db.models import Business
-from app.api.deps import get_current_business
+from app.api.deps import BusinessPrincipal, get_current_principal
 
 router = APIRouter(
     prefix="/billing",
     tags=["Billing"],
-    dependencies=[Depends(get_current_business)],
+    dependencies=[Depends(get_current_principal)],
 )
 
 
@@ -24,7 +23,7 @@ Full Stripe integration will be implemented later.
 # Return current billing and subscription status for the business
 @router.get("/overview")
 def billing_overview(
-    business: Business = Depends(get_current_business),
+    business: BusinessPrincipal = Depends(get_current_principal),
     db: Session = Depends(get_db),
 ):
     """
@@ -45,7 +44,7 @@ def billing_overview(
 # Disabled - Pro plan checkout (to be implemented later)
 @router.post("/checkout")
 def create_checkout(
-    business: Business = Depends(get_current_business),
+    business: BusinessPrincipal = Depends(get_current_principal),
     db: Session = Depends(get_db),
 ):
     """
@@ -61,7 +60,7 @@ def create_checkout(
 # Disabled - Stripe billing portal (to be implemented later)
 @router.post("/portal")
 def billing_portal(
-    business: Business = Depends(get_current_business),
+    business: BusinessPrincipal = Depends(get_current_principal),
 ):
     """
     Billing portal is currently disabled.
@@ -76,7 +75,7 @@ def billing_portal(
 # Disabled - Cancel subscription (to be implemented later)
 @router.post("/cancel")
 def cancel_subscription(
-    business: Business = Depends(get_current_business),
+    business: BusinessPrincipal = Depends(get_current_principal),
     db: Session = Depends(get_db),
 ):
     """
@@ -92,7 +91,7 @@ def cancel_subscription(
 # Disabled - Resume subscription (to be implemented later)
 @router.post("/resume")
 def resume_subscription(
-    business: Business = Depends(get_current_business),
+    business: BusinessPrincipal = Depends(get_current_principal),
     db: Session = Depends(get_db),
 ):
     """
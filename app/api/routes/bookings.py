@@ -1,4 +1,5 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from typing import List, Optional, Literal
 from datetime import datetime, timezone
@@ -6,12 +7,18 @@ from datetime import datetime, timezone
 from app.db.session import get_db
 from app.db.models import Booking, Enquiry, Business
 from app.schemas.bookings import BookingFromEnquiryCreate, BookingOut, BookingNotesUpdate
-from app.api.deps import get_current_business, require_feature
+from app.api.deps import BusinessPrincipal, get_current_business, get_current_principal, get_read_db, require_feature
 from app.services.email import (
     send_booking_confirmed_customer,
     send_booking_cancelled_customer,
 )
 from app.services.audit import log_action
+from app.core.utils import keyset_page, invalidate_availability
+from app.services.stats import update_enquiry_state
+from app.services.reminders import notify_booking_changed
+from app.services.availability import business_slot_unit
+from app.services.bookings import claim_booking_slot
+from app.services.slot_bitmap import record_booking_slots, release_booking_slots
 
 router = APIRouter(
     prefix="/bookings",
@@ -28,15 +35,26 @@ or via public booking requests.
 """
 
 
-#Retrieve bookings with optional status filtering and sorting
+#Keyset order per sort mode; id breaks ties so cursors are stable
+BOOKING_SORT_ORDERS = {
+    "upcoming": ((Booking.start_time, False), (Booking.id, False)),
+    "past": ((Booking.start_time, True), (Booking.id, True)),
+    "created": ((Booking.created_at, True), (Booking.id, True)),
+}
+
+
+#Retrieve bookings with optional status filtering and sorting.
+#Pass the X-Next-Cursor response header back as ?cursor= for the next page.
 @router.get("/", response_model=List[BookingOut])
 def get_bookings(
+    response: Response,
     status: Optional[Literal["pending", "confirmed", "cancelled"]] = Query(None),
     sort: Literal["upcoming", "past", "created"] = Query("upcoming"),
-    limit: int = Query(20, le=100),
+    limit: int = Query(20, ge=1, le=100),
     offset: int = Query(0, ge=0),
-    db: Session = Depends(get_db),
-    business: Business = Depends(get_current_business),
+    cursor: Optional[str] = Query(None),
+    db: Session = Depends(get_read_db),
+    business: BusinessPrincipal = Depends(get_current_principal),
 ):
     now = datetime.now(timezone.utc)
 
@@ -49,13 +67,19 @@ def get_bookings(
         query = query.filter(Booking.status == status)
 
     if sort == "past":
-        query = query.filter(Booking.end_time < now).order_by(Booking.start_time.desc())
-    elif sort == "created":
-        query = query.order_by(Booking.created_at.desc())
-    else:
-        query = query.filter(Booking.end_time >= now).order_by(Booking.start_time.asc())
+        query = query.filter(Booking.end_time < now)
+    elif sort == "upcoming":
+        query = query.filter(Booking.end_time >= now)
 
-    return query.offset(offset).limit(limit).all()
+    try:
+        rows, next_cursor = keyset_page(query, BOOKING_SORT_ORDERS[sort], sort, limit, cursor, offset)
+    except ValueError:
+        raise HTTPException(400, "Invalid cursor")
+
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+
+    return rows
 
 
 #Confirm a pending booking and notify the customer
@@ -79,27 +103,32 @@ def confirm_booking(
         raise HTTPException(404, "Booking not found or already confirmed")
 
     booking.status = "confirmed"
-    db.commit()
-    db.refresh(booking)
-
-    log_action(
-        db=db,
-        actor_type="business",
-        actor_id=business.id,
-        action="booking.confirmed",
-        details=f"booking_id={booking.id}",
-    )
+    record_booking_slots(db, business.id, booking.start_time, booking.end_time, business_slot_unit(db, business.id))
 
     if booking.enquiry_id:
         enquiry = db.query(Enquiry).get(booking.enquiry_id)
         if enquiry:
             send_booking_confirmed_customer(
+                db=db,
                 customer_email=enquiry.email,
                 business_name=business.name,
                 business_email=business.email,
                 start_time=booking.start_time,
             )
 
+    db.commit()
+    db.refresh(booking)
+    notify_booking_changed(booking)
+    invalidate_availability(business.id)
+
+    log_action(
+        db=db,
+        actor_type="business",
+        actor_id=business.id,
+        action="booking.confirmed",
+        details=f"booking_id={booking.id}",
+    )
+
     return {"success": True}
 
 
@@ -123,25 +152,30 @@ def cancel_booking(
         raise HTTPException(404, "Booking not found")
 
     booking.status = "cancelled"
-    db.commit()
-
-    log_action(
-        db=db,
-        actor_type="business",
-        actor_id=business.id,
-        action="booking.cancelled",
-        details=f"booking_id={booking.id}",
-    )
+    release_booking_slots(db, business.id, booking.start_time, booking.end_time, business_slot_unit(db, business.id))
 
     if booking.enquiry_id:
         enquiry = db.query(Enquiry).get(booking.enquiry_id)
         if enquiry:
             send_booking_cancelled_customer(
+                db=db,
                 customer_email=enquiry.email,
                 business_name=business.name,
                 start_time=booking.start_time,
             )
 
+    db.commit()
+    notify_booking_changed(booking)
+    invalidate_availability(business.id)
+
+    log_action(
+        db=db,
+        actor_type="business",
+        actor_id=business.id,
+        action="booking.cancelled",
+        details=f"booking_id={booking.id}",
+    )
+
     return {"success": True}
 
 
@@ -178,18 +212,38 @@ def create_booking_from_enquiry(
             "End time must be after start time",
         )
 
-    booking = Booking(
-        business_id=business.id,
-        enquiry_id=enquiry.id,
-        start_time=payload.start_time,
-        end_time=payload.end_time,
-        status="confirmed",
+    try:
+        booking = claim_booking_slot(
+            db,
+            business.id,
+            payload.start_time,
+            payload.end_time,
+            business_slot_unit(db, business.id),
+            enquiry_id=enquiry.id,
+            customer_email=enquiry.email,
+            status="confirmed",
+        )
+    except IntegrityError:
+        db.rollback()
+        booking = None
+
+    if booking is None:
+        raise HTTPException(400, "Time slot unavailable")
+
+    update_enquiry_state(db, enquiry, status="in_progress")
+
+    send_booking_confirmed_customer(
+        db=db,
+        customer_email=enquiry.email,
+        business_name=business.name,
+        business_email=business.email,
+        start_time=booking.start_time,
     )
 
-    db.add(booking)
-    enquiry.status = "in_progress"
     db.commit()
     db.refresh(booking)
+    notify_booking_changed(booking)
+    invalidate_availability(business.id)
 
     log_action(
         db=db,
@@ -199,13 +253,6 @@ def create_booking_from_enquiry(
         details=f"booking_id={booking.id},enquiry_id={enquiry.id}",
     )
 
-    send_booking_confirmed_customer(
-        customer_email=enquiry.email,
-        business_name=business.name,
-        business_email=business.email,
-        start_time=booking.start_time,
-    )
-
     return {"success": True, "booking_id": booking.id}
 
 
@@ -215,7 +262,7 @@ def update_booking_notes(
     booking_id: int,
     payload: BookingNotesUpdate,
     db: Session = Depends(get_db),
-    business: Business = Depends(get_current_business),
+    business: BusinessPrincipal = Depends(get_current_principal),
 ):
     booking = (
         db.query(Booking)
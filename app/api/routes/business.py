@@ -8,8 +8,11 @@ from app.schemas.business import (
     BusinessOut,
     BusinessTierUpdate,
 )
-from app.api.deps import get_current_admin
+from app.api.deps import AdminPrincipal, get_current_admin, get_read_db
 from app.services.audit import log_action
+from app.services.stripe_events import STRIPE_EVENT_ADMIN_REPLAY_LIMIT, replay_stripe_events
+from app.core.config import bump_entitlements_version
+from app.core.utils import invalidate_cached_principal, revoke_business_tokens
 
 router = APIRouter(
     prefix="/businesses",
@@ -22,14 +25,15 @@ router = APIRouter(
 BUSINESS ROUTES => ADMIN MANAGEMENT
 
 Admin-only routes for viewing, modifying,
-activating, suspending, or deleting businesses.
+activating, suspending, or deleting businesses,
+and replaying their stored Stripe events.
 """
 
 
 #List all registered businesses for administrative overview
 @router.get("/", response_model=List[BusinessOut])
 def list_businesses(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
     return db.query(Business).order_by(Business.id).all()
 
@@ -47,7 +51,9 @@ def update_business_tier(
         raise HTTPException(status_code=404, detail="Business not found")
 
     business.tier = payload.tier
+    bump_entitlements_version(business)
     db.commit()
+    invalidate_cached_principal(business.id)
 
     log_action(
         db=db,
@@ -72,7 +78,9 @@ def suspend_business(
         raise HTTPException(status_code=404, detail="Business not found")
 
     business.is_active = False
+    revoke_business_tokens(business)
     db.commit()
+    invalidate_cached_principal(business.id)
 
     log_action(
         db=db,
@@ -98,6 +106,7 @@ def activate_business(
 
     business.is_active = True
     db.commit()
+    invalidate_cached_principal(business.id)
 
     log_action(
         db=db,
@@ -123,6 +132,7 @@ def delete_business(
 
     db.delete(business)
     db.commit()
+    invalidate_cached_principal(business_id)
 
     log_action(
         db=db,
@@ -132,4 +142,31 @@ def delete_business(
         details=f"business_id={business_id}",
     )
 
-    return {"success": True}
\ No newline at end of file
+    return {"success": True}
+
+
+#Replay a business's most recent stored Stripe webhook events to rebuild its subscription state.
+#Capped to keep the request short; full histories go through `python -m app.cli replay-stripe-events`.
+@router.post("/{business_id}/stripe-events/replay", response_model=dict)
+def replay_business_stripe_events(
+    business_id: int,
+    notify: bool = False,
+    db: Session = Depends(get_db),
+    admin: AdminPrincipal = Depends(get_current_admin),
+):
+    if not db.get(Business, business_id):
+        raise HTTPException(status_code=404, detail="Business not found")
+
+    result = replay_stripe_events(business_id=business_id, notify=notify, limit=STRIPE_EVENT_ADMIN_REPLAY_LIMIT)
+    invalidate_cached_principal(business_id)
+
+    log_action(
+        db=db,
+        actor_type="admin",
+        actor_id=admin.id,
+        action="business.stripe_events_replayed",
+        details=f"business_id={business_id},events={result['events']},skipped={result['skipped']}",
+    )
+    db.commit()
+
+    return result
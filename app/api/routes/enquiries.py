@@ -1,12 +1,14 @@
-from fastapi import APIRouter, Depends, Query, HTTPException
+from fastapi import APIRouter, Depends, Query, HTTPException, Response
 from sqlalchemy.orm import Session
 from typing import List, Optional, Literal
 
 from app.db.session import get_db
-from app.db.models import Enquiry, Business, Visit
+from app.db.models import Enquiry
 from app.schemas.enquirys import EnquiryOut, EnquiryStatusUpdate
-from app.api.deps import get_current_business, require_feature
+from app.api.deps import BusinessPrincipal, get_current_principal, get_read_db, require_feature
 from app.services.audit import log_action
+from app.core.utils import keyset_page
+from app.services.stats import delete_enquiry_counted, get_business_stats, update_enquiry_state
 
 router = APIRouter(
     prefix="/enquiries",
@@ -22,16 +24,28 @@ Handles incoming customer enquiries,
 status updates, and enquiry analytics.
 """
 
-#Retrieve enquiries with filtering, sorting, and pagination
+#Keyset order per sort mode; id breaks ties so cursors are stable
+ENQUIRY_SORT_ORDERS = {
+    "newest": ((Enquiry.created_at, True), (Enquiry.id, True)),
+    "oldest": ((Enquiry.created_at, False), (Enquiry.id, False)),
+    "unread": ((Enquiry.is_read, False), (Enquiry.created_at, True), (Enquiry.id, True)),
+    "status": ((Enquiry.status, False), (Enquiry.created_at, True), (Enquiry.id, True)),
+}
+
+
+#Retrieve enquiries with filtering, sorting, and pagination.
+#Pass the X-Next-Cursor response header back as ?cursor= for the next page.
 @router.get("/", response_model=List[EnquiryOut])
 def get_enquiries(
+    response: Response,
     is_read: Optional[bool] = Query(None),
     status: Optional[Literal["new", "in_progress", "resolved"]] = Query(None),
     sort: Literal["newest", "oldest", "unread", "status"] = Query("newest"),
-    limit: int = Query(20, le=100),
+    limit: int = Query(20, ge=1, le=100),
     offset: int = Query(0, ge=0),
-    db: Session = Depends(get_db),
-    business: Business = Depends(get_current_business),
+    cursor: Optional[str] = Query(None),
+    db: Session = Depends(get_read_db),
+    business: BusinessPrincipal = Depends(get_current_principal),
 ):
     query = db.query(Enquiry).filter(Enquiry.business_id == business.id)
 
@@ -41,22 +55,15 @@ def get_enquiries(
     if status is not None:
         query = query.filter(Enquiry.status == status)
 
-    if sort == "oldest":
-        query = query.order_by(Enquiry.created_at.asc())
-    elif sort == "unread":
-        query = query.order_by(
-            Enquiry.is_read.asc(),
-            Enquiry.created_at.desc(),
-        )
-    elif sort == "status":
-        query = query.order_by(
-            Enquiry.status.asc(),
-            Enquiry.created_at.desc(),
-        )
-    else:
-        query = query.order_by(Enquiry.created_at.desc())
+    try:
+        rows, next_cursor = keyset_page(query, ENQUIRY_SORT_ORDERS[sort], sort, limit, cursor, offset)
+    except ValueError:
+        raise HTTPException(400, "Invalid cursor")
+
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
 
-    return query.offset(offset).limit(limit).all()
+    return rows
 
 
 #Mark an enquiry as read without modifying its status
@@ -64,7 +71,7 @@ def get_enquiries(
 def mark_enquiry_read(
     enquiry_id: int,
     db: Session = Depends(get_db),
-    business: Business = Depends(get_current_business),
+    business: BusinessPrincipal = Depends(get_current_principal),
 ):
     enquiry = (
         db.query(Enquiry)
@@ -78,7 +85,9 @@ def mark_enquiry_read(
     if not enquiry:
         raise HTTPException(404, "Enquiry not found")
 
-    enquiry.is_read = True
+    if not update_enquiry_state(db, enquiry, is_read=True):
+        raise HTTPException(404, "Enquiry not found")
+
     db.commit()
 
     log_action(
@@ -98,7 +107,7 @@ def update_enquiry_status(
     enquiry_id: int,
     payload: EnquiryStatusUpdate,
     db: Session = Depends(get_db),
-    business: Business = Depends(get_current_business),
+    business: BusinessPrincipal = Depends(get_current_principal),
 ):
     enquiry = (
         db.query(Enquiry)
@@ -112,7 +121,9 @@ def update_enquiry_status(
     if not enquiry:
         raise HTTPException(404, "Enquiry not found")
 
-    enquiry.status = payload.status
+    if not update_enquiry_state(db, enquiry, status=payload.status):
+        raise HTTPException(404, "Enquiry not found")
+
     db.commit()
 
     log_action(
@@ -131,7 +142,7 @@ def update_enquiry_status(
 def delete_enquiry(
     enquiry_id: int,
     db: Session = Depends(get_db),
-    business: Business = Depends(get_current_business),
+    business: BusinessPrincipal = Depends(get_current_principal),
 ):
     enquiry = (
         db.query(Enquiry)
@@ -151,7 +162,9 @@ def delete_enquiry(
             "Cannot delete enquiry with existing booking",
         )
 
-    db.delete(enquiry)
+    if not delete_enquiry_counted(db, enquiry):
+        raise HTTPException(404, "Enquiry not found")
+
     db.commit()
 
     log_action(
@@ -165,32 +178,17 @@ def delete_enquiry(
     return {"success": True}
 
 
-#Return enquiry and visit statistics for dashboard insights
+#Return enquiry and visit statistics for dashboard insights, from the per-business counters
 @router.get("/stats")
 def enquiry_stats(
-    db: Session = Depends(get_db),
-    business: Business = Depends(get_current_business),
+    db: Session = Depends(get_read_db),
+    business: BusinessPrincipal = Depends(get_current_principal),
 ):
-    return {
-        "total": db.query(Enquiry)
-        .filter(Enquiry.business_id == business.id)
-        .count(),
-
-        "unread": db.query(Enquiry)
-        .filter(
-            Enquiry.business_id == business.id,
-            Enquiry.is_read.is_(False),
-        )
-        .count(),
+    stats = get_business_stats(db, business.id)
 
-        "new": db.query(Enquiry)
-        .filter(
-            Enquiry.business_id == business.id,
-            Enquiry.status == "new",
-        )
-        .count(),
-
-        "visits": db.query(Visit)
-        .filter(Visit.business_id == business.id)
-        .count(),
-    }
\ No newline at end of file
+    return {
+        "total": stats["enquiries_total"],
+        "unread": stats["enquiries_unread"],
+        "new": stats["enquiries_new"],
+        "visits": stats["visits_total"],
+    }
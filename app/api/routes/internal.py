@@ -0,0 +1,27 @@
+from fastapi import APIRouter, Depends
+import os
+
+from app.api.deps import get_current_admin
+from app.db.session import pool_metrics
+
+router = APIRouter(
+    prefix="/internal",
+    tags=["Internal"],
+    dependencies=[Depends(get_current_admin)],
+)
+
+
+"""
+INTERNAL ROUTES => OPERATIONAL METRICS
+
+Admin-only diagnostics for the worker process serving the request.
+"""
+
+
+#Database connection pool usage for this worker process
+@router.get("/db-pool", response_model=dict)
+def get_db_pool_metrics():
+    return {
+        "pid": os.getpid(),
+        **pool_metrics(),
+    }
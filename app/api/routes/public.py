@@ -1,8 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
-from sqlalchemy.orm import Session
-
-from app.db.models import Business, Enquiry, Visit, Booking
-from app.db.session import get_db
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional
+
+from app.db.models import Business, Enquiry, Visit, BusinessAvailability
+from app.db.session import get_async_db, get_async_read_db
 from app.core.config import RESERVED_SLUGS, RATE_LIMITS
 from app.schemas.public import (
     PublicBusinessOut,
@@ -10,6 +15,7 @@ from app.schemas.public import (
     PublicVisitCreate,
     PublicBookingCreate,
     PublicSuccessOut,
+    PublicAvailabilityOut,
 )
 from app.services.email import (
     send_enquiry_notification,
@@ -17,8 +23,18 @@ from app.services.email import (
     send_booking_pending_customer,
 )
 from app.services.audit import log_action
+from app.services.stats import adjust_business_stats
 from app.core.security import rate_limit
-from app.core.utils import get_cached_business, set_cached_business
+from app.core.utils import (
+    get_cached_business,
+    set_cached_business,
+    get_cached_availability,
+    set_cached_availability,
+    invalidate_availability,
+)
+from app.services.availability import AVAILABILITY_MAX_DAYS, availability_rules, load_free_slots
+from app.services.bookings import claim_booking_slot
+from app.services.slot_bitmap import SLOT_BITMAP_HORIZON_DAYS, slot_unit_minutes
 
 router = APIRouter(
     prefix="/public",
@@ -30,13 +46,29 @@ PUBLIC ROUTES => ANONYMOUS WEBSITE INTERACTIONS
 
 Public endpoints used by customer-facing websites
 for rendering, enquiries, bookings, and analytics.
+Served on the event loop with async sessions; the sync
+email and audit helpers run on the session via run_sync.
 """
 
+
+#Load an active business by slug, optionally with its customisation
+async def _get_active_business(db: AsyncSession, slug: str, with_customisation: bool = False) -> Business | None:
+    query = select(Business).where(
+        Business.slug == slug,
+        Business.is_active.is_(True),
+    )
+
+    if with_customisation:
+        query = query.options(selectinload(Business.customisation))
+
+    result = await db.execute(query)
+    return result.scalars().first()
+
 #Return cached public website data for a business
 @router.get("/business", response_model=PublicBusinessOut)
-def get_public_business(
+async def get_public_business(
     slug: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_read_db),
 ):
     if slug in RESERVED_SLUGS:
         raise HTTPException(status_code=404, detail="Business not found")
@@ -45,14 +77,7 @@ def get_public_business(
     if cached:
         return cached
 
-    business = (
-        db.query(Business)
-        .filter(
-            Business.slug == slug,
-            Business.is_active.is_(True),
-        )
-        .first()
-    )
+    business = await _get_active_business(db, slug, with_customisation=True)
 
     if not business:
         raise HTTPException(status_code=404, detail="Business not found")
@@ -112,13 +137,57 @@ def get_public_business(
     return response_data
 
 
+#Return free booking slots for a range of dates, cached briefly per business
+@router.get("/availability", response_model=PublicAvailabilityOut)
+async def get_public_availability(
+    slug: str,
+    request: Request,
+    start: Optional[date] = Query(None),
+    days: int = Query(7, ge=1, le=AVAILABILITY_MAX_DAYS),
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    ip = request.client.host if request.client else "unknown"
+    key = f"public:availability:{ip}"
+
+    limit, window = RATE_LIMITS["availability"]
+    if not rate_limit(key, limit, window):
+        raise HTTPException(status_code=429, detail="Too many requests")
+
+    if slug in RESERVED_SLUGS:
+        raise HTTPException(status_code=404, detail="Business not found")
+
+    #Only dates that can hold bookings are served, so callers can't fill the cache with arbitrary ranges.
+    #The lower bound allows a day's slack for businesses whose local date is behind UTC.
+    if start is not None:
+        today = datetime.now(timezone.utc).date()
+        start = min(max(start, today - timedelta(days=1)), today + timedelta(days=SLOT_BITMAP_HORIZON_DAYS))
+
+    cached_business = get_cached_business(slug)
+    if cached_business:
+        business_id = cached_business["id"]
+    else:
+        business = await _get_active_business(db, slug)
+        if not business:
+            raise HTTPException(status_code=404, detail="Business not found")
+        business_id = business.id
+
+    cache_key = (start.isoformat() if start else None, days)
+    cached = get_cached_availability(business_id, cache_key)
+    if cached:
+        return cached
+
+    availability = await load_free_slots(db, business_id, start, days)
+    set_cached_availability(business_id, cache_key, availability)
+    return availability
+
+
 #Create a customer enquiry with rate limiting applied
 @router.post("/enquiry", response_model=PublicSuccessOut)
-def create_public_enquiry(
+async def create_public_enquiry(
     slug: str,
     payload: PublicEnquiryCreate,
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
 
     ip = request.client.host if request.client else "unknown"
@@ -128,14 +197,7 @@ def create_public_enquiry(
     if not rate_limit(key, limit, window):
         raise HTTPException(status_code=429, detail="Too many enquiries")
 
-    business = (
-        db.query(Business)
-        .filter(
-            Business.slug == slug,
-            Business.is_active.is_(True),
-        )
-        .first()
-    )
+    business = await _get_active_business(db, slug, with_customisation=True)
 
     if not business:
         raise HTTPException(status_code=404, detail="Business not found")
@@ -153,22 +215,39 @@ def create_public_enquiry(
     )
 
     db.add(enquiry)
-    db.commit()
-    db.refresh(enquiry)
-
-    log_action(
-        db=db,
-        actor_type="system",
-        actor_id=business.id,
-        action="public.enquiry_created",
-        details=f"enquiry_id={enquiry.id}",
+    await db.run_sync(
+        lambda session: adjust_business_stats(
+            session,
+            business.id,
+            enquiries_total=1,
+            enquiries_unread=1,
+            enquiries_new=1,
+        )
     )
 
-    send_enquiry_notification(
-        business_email=business.email,
-        customer_name=payload.name,
-        customer_email=payload.email,
-        message=payload.message,
+    #Businesses in digest mode are notified by the scheduled digest job instead
+    if not business.enquiry_digest_minutes:
+        await db.run_sync(
+            lambda session: send_enquiry_notification(
+                db=session,
+                business_email=business.email,
+                customer_name=payload.name,
+                customer_email=payload.email,
+                message=payload.message,
+            )
+        )
+
+    await db.commit()
+    await db.refresh(enquiry)
+
+    await db.run_sync(
+        lambda session: log_action(
+            db=session,
+            actor_type="system",
+            actor_id=business.id,
+            action="public.enquiry_created",
+            details=f"enquiry_id={enquiry.id}",
+        )
     )
 
     return {"success": True}
@@ -176,10 +255,10 @@ def create_public_enquiry(
 
 #Track anonymous website visits for analytics purposes
 @router.post("/visit", response_model=PublicSuccessOut)
-def track_visit(
+async def track_visit(
     payload: PublicVisitCreate,
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     ip = request.client.host if request.client else "unknown"
     key = f"public:visit:{ip}"
@@ -188,14 +267,7 @@ def track_visit(
     if not rate_limit(key, limit, window):
         return {"success": True}
 
-    business = (
-        db.query(Business)
-        .filter(
-            Business.slug == payload.slug,
-            Business.is_active.is_(True),
-        )
-        .first()
-    )
+    business = await _get_active_business(db, payload.slug)
 
     if not business:
         return {"success": True}
@@ -208,18 +280,19 @@ def track_visit(
     )
 
     db.add(visit)
-    db.commit()
+    await db.run_sync(lambda session: adjust_business_stats(session, business.id, visits_total=1))
+    await db.commit()
 
     return {"success": True}
 
 
 #Create a public booking request with conflict detection
 @router.post("/booking", response_model=PublicSuccessOut)
-def create_public_booking(
+async def create_public_booking(
     slug: str,
     payload: PublicBookingCreate,
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     ip = request.client.host if request.client else "unknown"
     key = f"public:booking:{ip}:{slug}"
@@ -228,61 +301,68 @@ def create_public_booking(
     if not rate_limit(key, limit, window):
         raise HTTPException(status_code=429, detail="Too many booking attempts")
 
-    business = (
-        db.query(Business)
-        .filter(
-            Business.slug == slug,
-            Business.is_active.is_(True),
-        )
-        .first()
-    )
+    business = await _get_active_business(db, slug)
 
     if not business:
         raise HTTPException(status_code=404, detail="Business not found")
 
-    conflict = (
-        db.query(Booking)
-        .filter(
-            Booking.business_id == business.id,
-            Booking.start_time < payload.end_time,
-            Booking.end_time > payload.start_time,
+    availability = (
+        await db.execute(select(BusinessAvailability).where(BusinessAvailability.business_id == business.id))
+    ).scalars().first()
+    unit = slot_unit_minutes(availability_rules(availability))
+
+    #Check and insert under the business's booking lock, so concurrent requests cannot double-book.
+    #The exclusion constraint rejects an overlap the lock did not see (a writer outside the service).
+    try:
+        booking = await db.run_sync(
+            lambda session: claim_booking_slot(
+                session,
+                business.id,
+                payload.start_time,
+                payload.end_time,
+                unit,
+                customer_email=payload.customer_email,
+                status="pending",
+            )
         )
-        .first()
-    )
+    except IntegrityError:
+        await db.rollback()
+        booking = None
 
-    if conflict:
+    if booking is None:
         raise HTTPException(status_code=400, detail="Time slot unavailable")
 
-    booking = Booking(
-        business_id=business.id,
-        start_time=payload.start_time,
-        end_time=payload.end_time,
-        status="pending",
-    )
+    #Queue both notifications in the booking's transaction
+    def queue_booking_emails(session):
+        send_booking_pending_business(
+            db=session,
+            business_email=business.email,
+            business_name=business.name,
+            customer_email=payload.customer_email,
+            start_time=payload.start_time,
+        )
 
-    db.add(booking)
-    db.commit()
-    db.refresh(booking)
+        send_booking_pending_customer(
+            db=session,
+            customer_email=payload.customer_email,
+            business_name=business.name,
+            start_time=payload.start_time,
+        )
 
-    log_action(
-        db=db,
-        actor_type="system",
-        actor_id=business.id,
-        action="public.booking_requested",
-        details=f"booking_id={booking.id}",
-    )
+    await db.run_sync(queue_booking_emails)
 
-    send_booking_pending_business(
-        business_email=business.email,
-        business_name=business.name,
-        customer_email=payload.customer_email,
-        start_time=payload.start_time,
-    )
+    await db.commit()
+    await db.refresh(booking)
+    invalidate_availability(business.id)
 
-    send_booking_pending_customer(
-        customer_email=payload.customer_email,
-        business_name=business.name,
-        start_time=payload.start_time,
+    await db.run_sync(
+        lambda session: log_action(
+            db=session,
+            actor_type="system",
+            actor_id=business.id,
+            action="public.booking_requested",
+            details=f"booking_id={booking.id}",
+        )
     )
 
     return {"success": True}
\ No newline at end of file
@@ -1,6 +1,122 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+from datetime import datetime, timezone
+
+from app.db.session import get_db
+from app.db.models import Business, BusinessAvailability
+from app.api.deps import get_current_business
+from app.schemas.settings import (
+    NotificationSettingsOut,
+    NotificationSettingsUpdate,
+    AvailabilitySettingsOut,
+    AvailabilitySettingsUpdate,
+)
+from app.services.audit import log_action
+from app.services.digest import flush_enquiry_digest
+from app.services.availability import AVAILABILITY_MAX_DAYS, availability_rules
+from app.services.slot_bitmap import ensure_slot_days, slot_unit_minutes
+from app.core.utils import invalidate_availability
+
+router = APIRouter(
+    prefix="/settings",
+    tags=["Settings"],
+    dependencies=[Depends(get_current_business)],
+)
+
+
 """
-SETTINGS PLACEHOLDER
+SETTINGS ROUTES => BUSINESS CONFIGURATION
 
-Reserved for future business configuration such as
-availability, booking rules, timezones, and account preferences.
+Account preferences such as notification delivery,
+and booking availability rules and timezone.
 """
+
+
+#Return notification preferences for the current business
+@router.get("/notifications", response_model=NotificationSettingsOut)
+def get_notification_settings(
+    business: Business = Depends(get_current_business),
+):
+    return business
+
+
+#Enable, change or disable the enquiry notification digest
+@router.patch("/notifications", response_model=NotificationSettingsOut)
+def update_notification_settings(
+    payload: NotificationSettingsUpdate,
+    db: Session = Depends(get_db),
+    business: Business = Depends(get_current_business),
+):
+    #Start a fresh window so earlier enquiries (already notified individually) aren't repeated
+    if payload.enquiry_digest_minutes and not business.enquiry_digest_minutes:
+        business.enquiry_digest_sent_at = datetime.now(timezone.utc)
+
+    #Enquiries since the last digest would otherwise never be announced
+    if not payload.enquiry_digest_minutes and business.enquiry_digest_minutes:
+        flush_enquiry_digest(db, business)
+
+    business.enquiry_digest_minutes = payload.enquiry_digest_minutes
+    db.commit()
+
+    log_action(
+        db=db,
+        actor_type="business",
+        actor_id=business.id,
+        action="settings.notifications_updated",
+        details=f"enquiry_digest_minutes={payload.enquiry_digest_minutes}",
+    )
+
+    return business
+
+
+#Return booking availability rules for the current business, or the defaults if unset
+@router.get("/availability", response_model=AvailabilitySettingsOut)
+def get_availability_settings(
+    db: Session = Depends(get_db),
+    business: Business = Depends(get_current_business),
+):
+    row = db.query(BusinessAvailability).filter(BusinessAvailability.business_id == business.id).first()
+    return availability_rules(row)
+
+
+#Replace booking availability rules; cached public availability is dropped
+@router.put("/availability", response_model=AvailabilitySettingsOut)
+def update_availability_settings(
+    payload: AvailabilitySettingsUpdate,
+    db: Session = Depends(get_db),
+    business: Business = Depends(get_current_business),
+):
+    row = db.query(BusinessAvailability).filter(BusinessAvailability.business_id == business.id).first()
+    previous_unit = slot_unit_minutes(availability_rules(row))
+    if not row:
+        row = BusinessAvailability(business_id=business.id)
+        db.add(row)
+
+    row.opening_hours = {
+        day: hours.model_dump() if hours else None
+        for day, hours in payload.opening_hours.items()
+    }
+    row.slot_length_minutes = payload.slot_length_minutes
+    row.buffer_minutes = payload.buffer_minutes
+    row.auto_confirm = payload.auto_confirm
+    row.closed = payload.closed
+    row.timezone = payload.timezone
+
+    #Rows with the old unit only fall back to the exact query, so just the bookable window is rebuilt here;
+    #the slot-bitmaps job brings the rest of the horizon over
+    unit = slot_unit_minutes(availability_rules(row))
+    if unit != previous_unit:
+        ensure_slot_days(db, business.id, unit, datetime.now(timezone.utc).date(), AVAILABILITY_MAX_DAYS)
+
+    db.commit()
+    invalidate_availability(business.id)
+
+    log_action(
+        db=db,
+        actor_type="business",
+        actor_id=business.id,
+        action="settings.availability_updated",
+        details=f"slot_length_minutes={payload.slot_length_minutes},timezone={payload.timezone}",
+    )
+
+    return availability_rules(row)
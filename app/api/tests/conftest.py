@@ -0,0 +1,184 @@
+import os
+import tempfile
+
+#Settings are read at import time, so the environment is prepared before the app loads
+_TEST_DIR = tempfile.mkdtemp(prefix="flotrafic-tests-")
+
+#The app serves and writes ./uploads, so run from the scratch directory
+os.makedirs(os.path.join(_TEST_DIR, "uploads"))
+os.chdir(_TEST_DIR)
+
+#Always a scratch database: the suite seeds and writes freely
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_TEST_DIR, 'test.db')}"
+os.environ.pop("DATABASE_REPLICA_URLS", None)
+os.environ.setdefault("JWT_SECRET_KEY", "test-secret")
+os.environ.setdefault("STRIPE_SECRET_KEY", "sk_test_dummy")
+os.environ.setdefault("STRIPE_WEBHOOK_SECRET", "whsec_test")
+os.environ.setdefault("STRIPE_PRO_PRICE_ID", "price_test")
+os.environ.setdefault("TURNSTILE_SECRET_KEY", "turnstile-test")
+os.environ.setdefault("ADMIN_PASSWORD", "admin-test")
+os.environ["EMAIL_WORKERS_ENABLED"] = "false"
+os.environ["STRIPE_EVENT_WORKERS_ENABLED"] = "false"
+os.environ["SCHEDULED_JOBS_ENABLED"] = "false"
+
+from datetime import datetime, timedelta, timezone
+import random
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event, text
+
+from app.main import app
+from app.db.session import SessionLocal, engine, async_engine
+from app.db.models import Business, Booking, Enquiry, Visit
+from app.core.security import create_business_token
+
+"""
+TEST FIXTURES
+
+A throwaway SQLite database seeded with several businesses' worth of
+enquiries, bookings and visits, a client for the app and a recorder
+for the SQL each request runs.
+"""
+
+SEED_BUSINESSES = 5
+SEED_ENQUIRIES_PER_BUSINESS = 400
+SEED_BOOKINGS_PER_BUSINESS = 300
+SEED_VISITS_PER_BUSINESS = 600
+
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+#Seed the database once per run; returns the business the tests act as
+@pytest.fixture(scope="session")
+def seeded(client):
+    rng = random.Random(46)
+    now = datetime.now(timezone.utc)
+    db = SessionLocal()
+
+    try:
+        businesses = [
+            Business(
+                name=f"Seed {i}",
+                slug=f"seed{i}",
+                email=f"seed{i}@example.com",
+                hashed_password="!",
+                is_active=True,
+                email_verified=True,
+                tier="pro",
+                stripe_subscription_status="active",
+            )
+            for i in range(SEED_BUSINESSES)
+        ]
+        db.add_all(businesses)
+        db.flush()
+
+        for business in businesses:
+            for n in range(SEED_ENQUIRIES_PER_BUSINESS):
+                db.add(Enquiry(
+                    business_id=business.id,
+                    name=f"Customer {n}",
+                    email=f"customer{n}@example.com",
+                    message="Seeded enquiry",
+                    status=rng.choice(["new", "in_progress", "resolved"]),
+                    is_read=rng.random() < 0.6,
+                    created_at=now - timedelta(minutes=rng.randint(0, 60 * 24 * 365)),
+                ))
+
+            for n in range(SEED_BOOKINGS_PER_BUSINESS):
+                start = now + timedelta(minutes=30 * rng.randint(-5000, 5000))
+                db.add(Booking(
+                    business_id=business.id,
+                    start_time=start,
+                    end_time=start + timedelta(minutes=30),
+                    status=rng.choice(["pending", "confirmed", "cancelled"]),
+                    created_at=start - timedelta(days=rng.randint(1, 30)),
+                ))
+
+            for n in range(SEED_VISITS_PER_BUSINESS):
+                db.add(Visit(
+                    business_id=business.id,
+                    path="/",
+                    created_at=now - timedelta(minutes=rng.randint(0, 60 * 24 * 90)),
+                ))
+
+        db.commit()
+        db.execute(text("ANALYZE"))
+        db.commit()
+
+        business = businesses[0]
+        return {
+            "business_id": business.id,
+            "slug": business.slug,
+            "headers": {"Authorization": f"Bearer {create_business_token(business)}"},
+        }
+
+    finally:
+        db.close()
+
+
+#A session for tests that work on the database directly
+@pytest.fixture
+def db(client):
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+#Factory for a fresh pro business, so tests that write never share state; subscribed adds its own Stripe subscription id
+@pytest.fixture
+def make_business(db):
+    def make(subscribed: bool = False, **fields):
+        key = uuid.uuid4().hex[:8]
+        values = {
+            "name": f"Test {key}",
+            "slug": f"test-{key}",
+            "email": f"test-{key}@example.com",
+            "hashed_password": "!",
+            "is_active": True,
+            "email_verified": True,
+            "tier": "pro",
+            "stripe_subscription_status": "active",
+        }
+        if subscribed:
+            values["stripe_subscription_id"] = f"sub_{key}"
+        business = Business(**{**values, **fields})
+        db.add(business)
+        db.commit()
+        return business
+
+    return make
+
+
+#Request headers authenticating as a business, built the same way as the seeded ones
+@pytest.fixture
+def auth_headers():
+    def headers(business) -> dict:
+        return {"Authorization": f"Bearer {create_business_token(business)}"}
+
+    return headers
+
+
+#Record every statement sent to the database (sync and async engines) while the test runs
+@pytest.fixture
+def captured_queries():
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    targets = [engine, async_engine.sync_engine]
+    for target in targets:
+        event.listen(target, "before_cursor_execute", record)
+
+    yield statements
+
+    for target in targets:
+        event.remove(target, "before_cursor_execute", record)
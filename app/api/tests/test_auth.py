@@ -0,0 +1,25 @@
+from app.db.models import Business
+
+"""
+AUTH TESTS
+"""
+
+
+#A revoke handled by another worker leaves this process's cached epoch behind the fresh token
+def test_token_issued_after_a_revoke_elsewhere_is_accepted(client, db, make_business, auth_headers):
+    business = make_business()
+    old_headers = auth_headers(business)
+    assert client.get("/settings/notifications", headers=old_headers).status_code == 200
+
+    db.query(Business).filter(Business.id == business.id).update(
+        {"token_version": Business.token_version + 1}, synchronize_session=False
+    )
+    db.commit()
+    db.refresh(business)
+
+    res = client.get("/settings/notifications", headers=auth_headers(business))
+    assert res.status_code == 200
+
+    res = client.get("/settings/notifications", headers=old_headers)
+    assert res.status_code == 401
+    assert res.json()["detail"] == "Token revoked"
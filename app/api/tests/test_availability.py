@@ -0,0 +1,154 @@
+from datetime import date, datetime, timedelta, timezone
+from unittest import mock
+
+from app.db.models import Booking, BookingSlotDay, DEFAULT_OPENING_HOURS
+from app.core import utils
+from app.core.config import _AVAILABILITY_CACHE, AVAILABILITY_CACHE_MAX_RANGES
+from app.db.session import SessionLocal
+from app.services.availability import AVAILABILITY_MAX_DAYS, DEFAULT_AVAILABILITY, compute_free_slots
+from app.services.bookings import claim_booking_slot
+from app.services.slot_bitmap import SLOT_BITMAP_HORIZON_DAYS, check_slot_interval, interval_masks
+
+"""
+SLOT ENGINE TESTS
+"""
+
+PAST = datetime(2000, 1, 1, tzinfo=timezone.utc)
+
+
+def _starts(day: dict) -> list[str]:
+    return [slot["start"].strftime("%H:%M") for slot in day["slots"]]
+
+
+def test_default_rules_on_a_weekday():
+    days = compute_free_slots(DEFAULT_AVAILABILITY, [], date(2026, 11, 2), 1, now=PAST)
+
+    assert _starts(days[0]) == ["09:00", "10:30", "12:00", "13:30", "15:00"]
+
+
+def test_weekend_is_closed():
+    days = compute_free_slots(DEFAULT_AVAILABILITY, [], date(2026, 10, 31), 2, now=PAST)
+
+    assert [day["slots"] for day in days] == [[], []]
+
+
+def test_booking_blocks_overlapping_slots_including_buffer():
+    booking = (datetime(2026, 11, 2, 10, 45, tzinfo=timezone.utc), datetime(2026, 11, 2, 11, 15, tzinfo=timezone.utc))
+
+    days = compute_free_slots(DEFAULT_AVAILABILITY, [booking], date(2026, 11, 2), 1, now=PAST)
+
+    #10:30 overlaps directly; 09:00 and 12:00 clear the 30-minute buffer either side
+    assert _starts(days[0]) == ["09:00", "12:00", "13:30", "15:00"]
+
+
+def test_slots_follow_local_time_across_dst_change():
+    #British Summer Time ends on 25 October 2026
+    days = compute_free_slots(DEFAULT_AVAILABILITY, [], date(2026, 10, 23), 4, now=PAST)
+
+    friday, monday = days[0], days[3]
+    assert _starts(friday)[0] == "09:00" and friday["slots"][0]["start"].utcoffset().total_seconds() == 3600
+    assert _starts(monday)[0] == "09:00" and monday["slots"][0]["start"].utcoffset().total_seconds() == 0
+
+
+def test_past_slots_are_not_offered():
+    now = datetime(2026, 11, 2, 12, 30, tzinfo=timezone.utc)
+
+    days = compute_free_slots(DEFAULT_AVAILABILITY, [], date(2026, 11, 2), 1, now=now)
+
+    assert _starts(days[0]) == ["13:30", "15:00"]
+
+
+def test_interval_masks_split_at_utc_midnight():
+    start = datetime(2026, 11, 2, 23, 0, tzinfo=timezone.utc)
+    end = datetime(2026, 11, 3, 1, 0, tzinfo=timezone.utc)
+
+    masks = interval_masks(start, end, 30)
+
+    assert masks == {date(2026, 11, 2): 0b11 << 46, date(2026, 11, 3): 0b11}
+
+
+def test_bitmap_decides_covered_units_and_defers_partial_ones():
+    day = date(2026, 11, 2)
+    #One booking touching the 10:30-11:00 unit only
+    rows = {day: BookingSlotDay(day=day, unit_minutes=30, bits=format(1 << 21, "x"))}
+    at = lambda h, m: datetime(2026, 11, 2, h, m, tzinfo=timezone.utc)
+
+    assert check_slot_interval(rows, at(10, 0), at(11, 30), 30) is True
+    assert check_slot_interval(rows, at(11, 0), at(12, 0), 30) is False
+    assert check_slot_interval(rows, at(10, 45), at(11, 30), 30) is None
+    assert check_slot_interval({}, at(11, 0), at(12, 0), 30) is None
+
+
+def test_claim_rejects_overlaps_but_not_cancelled_bookings(seeded):
+    business_id = seeded["business_id"]
+    start = (datetime.now(timezone.utc) + timedelta(days=500)).replace(minute=0, second=0, microsecond=0)
+    end = start + timedelta(hours=1)
+
+    db = SessionLocal()
+    try:
+        #No bitmap rows this far ahead, so the overlap query decides
+        db.add(Booking(business_id=business_id, start_time=start, end_time=end, customer_email="old@example.com", status="cancelled"))
+        db.commit()
+
+        first = claim_booking_slot(db, business_id, start, end, 30, customer_email="a@example.com", status="pending")
+        db.commit()
+        second = claim_booking_slot(db, business_id, start + timedelta(minutes=30), end, 30, customer_email="b@example.com", status="pending")
+        db.rollback()
+
+        assert first is not None
+        assert second is None
+    finally:
+        db.close()
+
+
+def test_settings_rebuild_bitmaps_only_when_the_unit_changes(client, db, make_business, auth_headers):
+    business = make_business()
+    headers = auth_headers(business)
+    settings = {
+        "opening_hours": DEFAULT_OPENING_HOURS,
+        "slot_length_minutes": 60,
+        "buffer_minutes": 30,
+        "auto_confirm": True,
+        "closed": False,
+        "timezone": "Europe/London",
+    }
+    day_units = lambda: [row.unit_minutes for row in db.query(BookingSlotDay).filter(BookingSlotDay.business_id == business.id)]
+
+    #Same 30-minute unit as the defaults: nothing to rebuild
+    assert client.put("/settings/availability", json=settings, headers=headers).status_code == 200
+    assert day_units() == []
+
+    #45 + 15 gives a 15-minute unit; only the bookable window is rebuilt in the request
+    res = client.put("/settings/availability", json={**settings, "slot_length_minutes": 45, "buffer_minutes": 15}, headers=headers)
+    assert res.status_code == 200, res.text
+    assert day_units() == [15] * AVAILABILITY_MAX_DAYS
+
+
+def test_public_availability_clamps_start_and_bounds_the_cache(client, make_business):
+    business = make_business()
+    today = datetime.now(timezone.utc).date()
+
+    with mock.patch("app.api.routes.public.rate_limit", return_value=True):
+        far = client.get("/public/availability", params={"slug": business.slug, "start": "2999-01-01", "days": 1})
+        assert far.status_code == 200
+        assert date.fromisoformat(far.json()["days"][0]["date"]) == today + timedelta(days=SLOT_BITMAP_HORIZON_DAYS)
+
+        for offset in range(AVAILABILITY_CACHE_MAX_RANGES + 10):
+            start = today + timedelta(days=offset % 60)
+            client.get("/public/availability", params={"slug": business.slug, "start": start.isoformat(), "days": 1 + offset // 60})
+
+    assert len(_AVAILABILITY_CACHE[business.id]) <= AVAILABILITY_CACHE_MAX_RANGES
+
+    with mock.patch.object(utils, "AVAILABILITY_CACHE_MAX_BUSINESSES", 1):
+        utils.set_cached_availability(-1, (None, 1), {})
+    assert list(_AVAILABILITY_CACHE) == [-1]
+    utils.invalidate_availability(-1)
+
+
+def test_public_availability_is_rate_limited(client, make_business):
+    business = make_business()
+
+    with mock.patch("app.api.routes.public.rate_limit", return_value=False):
+        res = client.get("/public/availability", params={"slug": business.slug})
+
+    assert res.status_code == 429
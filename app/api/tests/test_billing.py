@@ -0,0 +1,296 @@
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+import json
+import time
+import uuid
+
+import stripe
+
+from app.core.config import apply_subscription_state
+from app.db.models import Business, StripeEvent
+from app.services.fake_stripe import FakeStripeServer, fake_subscription
+from app.services import expiry, reconcile, stripe_events
+from app.services.reconcile import reconcile_subscriptions
+from app.services.scheduler import claim_job_run
+from app.services.stripe_events import (
+    STRIPE_EVENT_BACKOFF_BASE_SECONDS,
+    claim_due_stripe_events,
+    enqueue_stripe_event,
+    replay_stripe_events,
+    run_stripe_event_group,
+)
+
+"""
+BILLING TESTS
+"""
+
+
+def test_entitlement_epoch_only_moves_on_a_real_change(db, make_business):
+    business = make_business()
+    version = business.entitlements_version
+
+    apply_subscription_state(business)
+    db.commit()
+    assert business.entitlements_version == version
+
+    business.stripe_subscription_status = "canceled"
+    apply_subscription_state(business)
+    db.commit()
+    assert business.tier == "free"
+    assert business.entitlements_version == version + 1
+
+
+def _subscription_event(event_id: str, sub_id: str, created: int, status: str = "active", items: bool = True) -> dict:
+    obj = {"id": sub_id, "object": "subscription", "status": status}
+    if items:
+        obj["items"] = {"data": [{"current_period_end": created + 30 * 24 * 60 * 60}]}
+    return {"id": event_id, "type": "customer.subscription.updated", "created": created, "data": {"object": obj}}
+
+
+def _enqueue(*events: dict):
+    for event in events:
+        assert enqueue_stripe_event(event["id"], event["type"], json.dumps(event))
+
+
+#Claim everything due and return the group (event id -> claimed attempts) holding this subscription's events
+def _claim_group(db, sub_id: str) -> dict[str, int]:
+    ours = {row.event_id for row in db.query(StripeEvent.event_id).filter(StripeEvent.subscription_key == sub_id)}
+    groups = [group for group in claim_due_stripe_events(50) if ours & set(group)]
+    assert len(groups) == 1
+    return groups[0]
+
+
+def _make_due(db, event_id: str):
+    db.query(StripeEvent).filter(StripeEvent.event_id == event_id).update(
+        {"next_attempt_at": datetime.now(timezone.utc) - timedelta(seconds=1)}
+    )
+    db.commit()
+
+
+def test_burst_is_claimed_together_and_refreshed_once(db, make_business):
+    business = make_business(subscribed=True, tier="free", stripe_subscription_status=None)
+    sub_id = business.stripe_subscription_id
+    now = int(time.time())
+
+    #Incomplete payloads, so the merged burst needs one live refresh
+    events = [_subscription_event(f"evt_{sub_id}_{n}", sub_id, now + n, items=False) for n in range(4)]
+    _enqueue(*events)
+
+    #Only the first event's hold has run out; the rest of the burst is still held
+    _make_due(db, events[0]["id"])
+
+    with FakeStripeServer() as fake:
+        group = _claim_group(db, sub_id)
+        assert sorted(group) == sorted(event["id"] for event in events)
+
+        run_stripe_event_group(group)
+        assert fake.requests.get("v1/subscriptions") == 1
+
+    db.expire_all()
+    assert business.tier == "pro"
+    assert business.stripe_subscription_status == "active"
+    statuses = {row.status for row in db.query(StripeEvent.status).filter(StripeEvent.subscription_key == sub_id)}
+    assert statuses == {"processed"}
+
+
+def test_burst_is_applied_in_stripe_order(db, make_business):
+    business = make_business(subscribed=True)
+    sub_id = business.stripe_subscription_id
+    now = int(time.time())
+
+    #Stripe's later event arrives first
+    _enqueue(
+        _subscription_event(f"evt_{sub_id}_late", sub_id, now + 5, status="past_due"),
+        _subscription_event(f"evt_{sub_id}_early", sub_id, now, status="active"),
+    )
+    _make_due(db, f"evt_{sub_id}_late")
+
+    with FakeStripeServer() as fake:
+        run_stripe_event_group(_claim_group(db, sub_id))
+        assert fake.request_count == 0
+
+    db.expire_all()
+    assert business.stripe_subscription_status == "past_due"
+
+
+def test_failed_burst_is_retried_with_backoff(db, make_business):
+    sub_id = make_business(subscribed=True).stripe_subscription_id
+    event = _subscription_event(f"evt_{sub_id}", sub_id, int(time.time()), items=False)
+    _enqueue(event)
+    _make_due(db, event["id"])
+
+    #Every fake Stripe call is rate limited, so the refresh fails
+    with FakeStripeServer(rate_limit_every=1), mock.patch.object(stripe, "max_network_retries", 0):
+        run_stripe_event_group(_claim_group(db, sub_id))
+
+    record = db.get(StripeEvent, event["id"])
+    next_attempt_at = record.next_attempt_at.replace(tzinfo=timezone.utc)
+    assert record.status == "pending"
+    assert record.attempts == 1
+    assert record.last_error
+    assert next_attempt_at > datetime.now(timezone.utc) + timedelta(seconds=STRIPE_EVENT_BACKOFF_BASE_SECONDS - 5)
+
+
+def test_reclaimed_events_are_left_to_the_new_claimant(db, make_business):
+    business = make_business(subscribed=True)
+    sub_id = business.stripe_subscription_id
+    event = _subscription_event(f"evt_{sub_id}", sub_id, int(time.time()), status="past_due")
+    _enqueue(event)
+    _make_due(db, event["id"])
+    group = _claim_group(db, sub_id)
+
+    #The group sat in the pool past its lease and another worker claimed the event again
+    db.query(StripeEvent).filter(StripeEvent.event_id == event["id"]).update({"attempts": StripeEvent.attempts + 1})
+    db.commit()
+
+    with FakeStripeServer():
+        run_stripe_event_group(group)
+
+    db.expire_all()
+    assert business.stripe_subscription_status == "active"
+    record = db.get(StripeEvent, event["id"])
+    assert (record.status, record.attempts) == ("pending", 2)
+
+
+def test_outcome_is_dropped_when_the_lease_is_lost_mid_run(db, make_business):
+    sub_id = make_business(subscribed=True).stripe_subscription_id
+    event = _subscription_event(f"evt_{sub_id}", sub_id, int(time.time()))
+    _enqueue(event)
+    _make_due(db, event["id"])
+    group = _claim_group(db, sub_id)
+
+    real_process = stripe_events.process_stripe_events
+
+    #A slow run: the lease expires and the event is re-claimed before the outcome is written
+    def slow_process(session, events):
+        outcomes = real_process(session, events)
+        db.query(StripeEvent).filter(StripeEvent.event_id == event["id"]).update({"attempts": StripeEvent.attempts + 1})
+        db.commit()
+        return outcomes
+
+    with FakeStripeServer(), mock.patch.object(stripe_events, "process_stripe_events", side_effect=slow_process):
+        run_stripe_event_group(group)
+
+    db.expire_all()
+    record = db.get(StripeEvent, event["id"])
+    assert (record.status, record.attempts) == ("pending", 2)
+    assert record.processed_at is None
+
+
+#A renewal that only moves the period end must outdate the token's expiry
+def test_period_extension_keeps_access_for_existing_tokens(client, db, make_business, auth_headers):
+    now = datetime.now(timezone.utc)
+    business = make_business(
+        subscribed=True,
+        stripe_current_period_end=now - timedelta(minutes=1),
+        latest_paid_period_end=now + timedelta(days=1),
+    )
+    sub_id = business.stripe_subscription_id
+    headers = auth_headers(business)
+    assert client.get("/enquiries/stats", headers=headers).status_code == 402
+
+    event = _subscription_event(f"evt_{sub_id}", sub_id, int(now.timestamp()))
+    _enqueue(event)
+    _make_due(db, event["id"])
+    with FakeStripeServer():
+        run_stripe_event_group(_claim_group(db, sub_id))
+
+    res = client.get("/enquiries/stats", headers=headers)
+    assert res.status_code == 200
+    assert res.headers["X-Entitlements-Stale"] == "1"
+
+
+def test_reconcile_fixes_drift_and_then_finds_none(db, make_business):
+    lapsed_here = make_business(subscribed=True, tier="free", stripe_subscription_status="canceled")
+    cancelled_there = make_business(subscribed=True)
+
+    #Built once, so the second listing is identical to the first
+    active = fake_subscription(lapsed_here.stripe_subscription_id)
+    canceled = {**fake_subscription(cancelled_there.stripe_subscription_id, status="canceled"), "ended_at": int(time.time()), "latest_invoice": None}
+
+    with FakeStripeServer(subscriptions=[active, canceled]):
+        first = reconcile_subscriptions(db)
+        second = reconcile_subscriptions(db)
+
+    db.expire_all()
+    assert first["drifted"] >= 2 and first["updated"] == first["drifted"]
+    assert (lapsed_here.tier, lapsed_here.stripe_subscription_status) == ("pro", "active")
+    assert (cancelled_there.tier, cancelled_there.stripe_subscription_status) == ("free", "canceled")
+    assert second["drifted"] == 0 and second["updated"] == 0
+
+
+def test_reconcile_keeps_state_a_webhook_applied_during_the_listing(db, make_business):
+    business = make_business(subscribed=True, stripe_subscription_status="past_due")
+    real_iter = reconcile._iter_subscriptions
+
+    #The cancellation webhook lands while the (stale) listing is still being paged
+    def listing_overtaken_by_a_webhook():
+        yield from real_iter()
+        db.query(Business).filter(Business.id == business.id).update(
+            {"stripe_subscription_status": "canceled", "stripe_state_updated_at": datetime.now(timezone.utc)}
+        )
+        db.commit()
+
+    listing = [fake_subscription(business.stripe_subscription_id)]
+    with FakeStripeServer(subscriptions=listing), mock.patch.object(reconcile, "_iter_subscriptions", listing_overtaken_by_a_webhook):
+        result = reconcile_subscriptions(db)
+
+    db.expire_all()
+    assert result["skipped"] >= 1
+    assert business.stripe_subscription_status == "canceled"
+
+
+def test_single_runner_job_runs_once_per_interval(db):
+    name = f"test-job-{uuid.uuid4().hex[:8]}"
+    now = datetime.now(timezone.utc)
+
+    assert claim_job_run(db, name, 60, now=now)
+    assert not claim_job_run(db, name, 60, now=now + timedelta(seconds=30))
+    assert claim_job_run(db, name, 60, now=now + timedelta(seconds=61))
+
+
+def test_sweep_refreshes_a_lapsed_subscription_still_marked_active(db, make_business):
+    lapsed = datetime.now(timezone.utc) - timedelta(hours=1)
+    #The cancellation webhook never arrived, so the stored status still says active
+    business = make_business(
+        subscribed=True,
+        latest_paid_period_end=lapsed,
+        stripe_current_period_end=lapsed,
+    )
+    canceled = {**fake_subscription(business.stripe_subscription_id, status="canceled"), "ended_at": int(lapsed.timestamp()), "latest_invoice": None}
+
+    #Stripe is unreachable for the first sweep, so the stored state stands
+    with FakeStripeServer(rate_limit_every=1), mock.patch.object(stripe, "max_network_retries", 0):
+        expiry.sweep_expired_subscriptions(db)
+
+    db.expire_all()
+    assert business.tier == "pro"
+
+    #The business is still due, so the next sweep picks it up again
+    with FakeStripeServer(subscriptions=[canceled]):
+        assert expiry.sweep_expired_subscriptions(db) >= 1
+
+    db.expire_all()
+    assert business.stripe_subscription_status == "canceled"
+    assert business.tier == "free"
+
+
+def test_capped_replay_takes_the_most_recent_events(db, make_business):
+    business = make_business(subscribed=True)
+    sub_id = business.stripe_subscription_id
+    now = int(time.time())
+    _enqueue(*[_subscription_event(f"evt_{sub_id}_{n}", sub_id, now + n) for n in range(3)])
+
+    #Arrival times have one-second resolution on SQLite, so spread them out
+    for n in range(3):
+        db.query(StripeEvent).filter(StripeEvent.event_id == f"evt_{sub_id}_{n}").update(
+            {"received_at": datetime.now(timezone.utc) - timedelta(minutes=3 - n)}
+        )
+    db.commit()
+
+    with FakeStripeServer():
+        result = replay_stripe_events(business_id=business.id, limit=2)
+
+    assert (result["events"], result["skipped"]) == (2, 1)
+    replayed = db.query(StripeEvent.event_id).filter(StripeEvent.status == "processed", StripeEvent.subscription_key == sub_id)
+    assert {row.event_id for row in replayed} == {f"evt_{sub_id}_1", f"evt_{sub_id}_2"}
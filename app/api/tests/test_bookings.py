@@ -0,0 +1,49 @@
+from unittest.mock import MagicMock
+
+import pytest
+from sqlalchemy.exc import DBAPIError
+
+from app.core.config import settings
+from app.services import bookings
+from app.services.bookings import BookingExclusionError, ensure_booking_exclusion
+
+"""
+BOOKING SERVICE TESTS
+"""
+
+
+#A PostgreSQL-looking engine whose install fails, e.g. on existing overlapping bookings
+def _postgres_engine_failing_install() -> MagicMock:
+    engine = MagicMock()
+    engine.dialect.name = "postgresql"
+    engine.begin.return_value.__enter__.return_value.execute.side_effect = DBAPIError(
+        "ALTER TABLE", {}, Exception("conflicting key value violates exclusion constraint")
+    )
+    return engine
+
+
+def test_exclusion_is_skipped_off_postgres(db):
+    assert ensure_booking_exclusion(db.get_bind()) is False
+
+
+def test_missing_exclusion_stops_startup_on_postgres(monkeypatch):
+    monkeypatch.setattr(bookings, "_booking_exclusion_installed", lambda engine: False)
+
+    with pytest.raises(BookingExclusionError, match="conflicting key value"):
+        ensure_booking_exclusion(_postgres_engine_failing_install())
+
+
+def test_missing_exclusion_is_reported_when_not_required(monkeypatch, capsys):
+    monkeypatch.setattr(settings, "BOOKING_EXCLUSION_REQUIRED", False)
+    monkeypatch.setattr(bookings, "_booking_exclusion_installed", lambda engine: False)
+
+    assert ensure_booking_exclusion(_postgres_engine_failing_install()) is False
+    assert "❌" in capsys.readouterr().out
+
+
+def test_installed_exclusion_is_confirmed(monkeypatch):
+    engine = MagicMock()
+    engine.dialect.name = "postgresql"
+    monkeypatch.setattr(bookings, "_booking_exclusion_installed", lambda engine: True)
+
+    assert ensure_booking_exclusion(engine) is True
@@ -0,0 +1,109 @@
+import asyncio
+import uuid
+
+import pytest
+
+from app.core import captcha
+from app.core.captcha import CircuitBreaker, FakeTurnstileVerifier, set_captcha_verifier
+
+"""
+CAPTCHA VERIFIER TESTS
+"""
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(captcha, "monotonic", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def fake_verifier():
+    previous = captcha._VERIFIER
+    verifier = FakeTurnstileVerifier()
+    set_captcha_verifier(verifier)
+    yield verifier
+    set_captcha_verifier(previous)
+
+
+def _open_breaker(clock) -> CircuitBreaker:
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=30)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    return breaker
+
+
+def test_breaker_opens_after_the_failure_threshold(clock):
+    breaker = _open_breaker(clock)
+
+    assert not breaker.allow()
+    clock[0] += 29
+    assert not breaker.allow()
+
+
+def test_half_open_breaker_lets_one_probe_through(clock):
+    breaker = _open_breaker(clock)
+    clock[0] += 30
+
+    assert breaker.allow()
+    assert not breaker.allow()
+
+    breaker.record_success()
+    assert breaker.allow()
+    assert breaker.allow()
+
+
+def test_failed_probe_reopens_the_breaker(clock):
+    breaker = _open_breaker(clock)
+    clock[0] += 30
+
+    assert breaker.allow()
+    breaker.record_failure()
+
+    assert not breaker.allow()
+    clock[0] += 30
+    assert breaker.allow()
+
+
+def test_lost_probe_is_replaced_after_the_cool_down(clock):
+    breaker = _open_breaker(clock)
+    clock[0] += 30
+    assert breaker.allow()
+
+    clock[0] += 29
+    assert not breaker.allow()
+    clock[0] += 1
+    assert breaker.allow()
+
+
+def test_fake_verifier_rejects_empty_and_prefixed_tokens():
+    verifier = FakeTurnstileVerifier()
+
+    assert verifier.verify("ok-token")["success"]
+    assert not verifier.verify("fail-token")["success"]
+    assert not verifier.verify("")["success"]
+    assert not asyncio.run(verifier.averify("fail-token"))["success"]
+    assert asyncio.run(verifier.averify("ok-token"))["success"]
+    assert verifier.calls == 5
+
+
+def test_captcha_routes_verify_asynchronously(client, fake_verifier):
+    email = f"{uuid.uuid4().hex[:8]}@example.com"
+
+    res = client.post(
+        "/auth/reset-password",
+        json={"email": email, "code": "123456", "new_password": "Sup3r-secret!", "captcha_token": "fail-token"},
+    )
+    assert res.status_code == 400
+    assert "Captcha" in res.json()["detail"]
+
+    res = client.post(
+        "/auth/verify-email-code",
+        json={"email": email, "code": "123456", "captcha_token": "fail-token"},
+    )
+    assert res.status_code == 400
+    assert "Captcha" in res.json()["detail"]
+
+    assert fake_verifier.calls == 2
@@ -0,0 +1,57 @@
+import asyncio
+
+from sqlalchemy import create_engine, inspect, text, update
+
+from app.db.models import Business
+from app.db.session import AsyncSessionLocal, _SQLITE_WRITE_LOCK
+from app.db.upgrade import upgrade_schema
+
+"""
+DATABASE SESSION AND SCHEMA TESTS
+"""
+
+
+def test_async_writer_queues_on_the_process_write_lock(db, make_business):
+    business = make_business()
+
+    async def async_write():
+        async with AsyncSessionLocal() as session:
+            await session.execute(update(Business).where(Business.id == business.id).values(name="async"))
+            await session.commit()
+
+    async def scenario():
+        #Held as another writer in this process would hold it; SQLite itself is not locked
+        assert _SQLITE_WRITE_LOCK.acquire(timeout=1)
+        try:
+            writer = asyncio.create_task(async_write())
+            await asyncio.sleep(0.2)
+            assert not writer.done()
+        finally:
+            _SQLITE_WRITE_LOCK.release()
+
+        await asyncio.wait_for(writer, 5)
+
+    asyncio.run(scenario())
+
+    db.expire_all()
+    assert business.name == "async"
+    assert not _SQLITE_WRITE_LOCK.locked()
+
+
+#A stripe_events table as deployed before the queue columns existed
+def test_schema_upgrade_adds_missing_columns_and_indexes_once(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE stripe_events (event_id VARCHAR PRIMARY KEY, received_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP)"))
+        conn.execute(text("INSERT INTO stripe_events (event_id) VALUES ('evt_old')"))
+
+    applied = upgrade_schema(engine)
+
+    assert "column stripe_events.status" in applied
+    assert "index ix_stripe_event_status_next_attempt" in applied
+    assert {index["name"] for index in inspect(engine).get_indexes("stripe_events")} >= {"ix_stripe_event_status_next_attempt"}
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT status, attempts, payload FROM stripe_events")).one() == ("processed", 0, None)
+
+    assert upgrade_schema(engine) == []
+    engine.dispose()
@@ -0,0 +1,152 @@
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+import pytest
+
+from app.db.models import BusinessStats, EmailOutbox, Enquiry, Visit
+from app.services import stats
+from app.services.stats import STATS_FIELDS, adjust_business_stats, delete_enquiry_counted, update_enquiry_state
+
+"""
+ENQUIRY COUNTER TESTS
+
+Every route that changes an enquiry or records a visit must leave the
+business_stats row equal to a recount of the tables.
+"""
+
+
+@pytest.fixture(autouse=True)
+def _no_rate_limits():
+    with mock.patch("app.api.routes.public.rate_limit", return_value=True):
+        yield
+
+
+def _counters(db, business_id: int) -> dict:
+    db.expire_all()
+    row = db.get(BusinessStats, business_id)
+    return {field: getattr(row, field) for field in STATS_FIELDS}
+
+
+def _enquiry_ids(db, business_id: int) -> list[int]:
+    return [row.id for row in db.query(Enquiry.id).filter(Enquiry.business_id == business_id).order_by(Enquiry.id)]
+
+
+#Submit enquiries through the public form, as a customer would
+def _post_enquiries(client, business, count: int):
+    for n in range(count):
+        res = client.post(
+            "/public/enquiry",
+            params={"slug": business.slug},
+            json={"name": f"Customer {n}", "email": f"customer{n}@example.com", "message": "Hello"},
+        )
+        assert res.status_code == 200, res.text
+
+
+def test_counters_follow_every_enquiry_route(client, db, make_business, auth_headers):
+    business = make_business()
+    headers = auth_headers(business)
+
+    _post_enquiries(client, business, 3)
+    client.post("/public/visit", json={"slug": business.slug})
+
+    assert _counters(db, business.id) == stats._count_business_stats(db, business.id)
+    assert _counters(db, business.id) == {"enquiries_total": 3, "enquiries_unread": 3, "enquiries_new": 3, "visits_total": 1}
+
+    first, second, third = _enquiry_ids(db, business.id)
+    start = (datetime.now(timezone.utc) + timedelta(days=600)).replace(minute=0, second=0, microsecond=0)
+
+    steps = [
+        ("PATCH", f"/enquiries/{first}/read", None),
+        ("PATCH", f"/enquiries/{first}/read", None),
+        ("PATCH", f"/enquiries/{second}/status", {"status": "resolved"}),
+        ("POST", f"/bookings/from-enquiry/{third}", {"start_time": start.isoformat(), "end_time": (start + timedelta(hours=1)).isoformat()}),
+        ("DELETE", f"/enquiries/{first}", None),
+        ("DELETE", f"/enquiries/{second}", None),
+    ]
+    for method, path, body in steps:
+        res = client.request(method, path, json=body, headers=headers)
+        assert res.status_code == 200, f"{method} {path}: {res.text}"
+        assert _counters(db, business.id) == stats._count_business_stats(db, business.id), f"{method} {path}"
+
+    assert _counters(db, business.id) == {"enquiries_total": 1, "enquiries_unread": 1, "enquiries_new": 0, "visits_total": 1}
+
+    res = client.get("/enquiries/stats", headers=headers)
+    assert res.json() == {"total": 1, "unread": 1, "new": 0, "visits": 1}
+
+
+def test_first_change_survives_a_concurrently_created_row(db, make_business):
+    business = make_business()
+    real_insert = stats._insert_stats_ignoring_duplicates
+
+    #Another transaction wins the insert with counts taken before this visit existed
+    def lose_the_race(session, values):
+        real_insert(session, {**values, "visits_total": values["visits_total"] - 1})
+        return False
+
+    db.add(Visit(business_id=business.id, path="/"))
+    with mock.patch.object(stats, "_insert_stats_ignoring_duplicates", side_effect=lose_the_race):
+        adjust_business_stats(db, business.id, visits_total=1)
+    db.commit()
+
+    assert _counters(db, business.id)["visits_total"] == 1
+
+
+#A double-click: the second request read the enquiry before the first one committed
+def test_repeated_change_from_a_stale_read_counts_once(client, db, make_business, auth_headers):
+    business = make_business()
+    headers = auth_headers(business)
+    _post_enquiries(client, business, 3)
+
+    stale = [db.get(Enquiry, enquiry_id) for enquiry_id in _enquiry_ids(db, business.id)]
+    assert all(not enquiry.is_read and enquiry.status == "new" for enquiry in stale)
+
+    assert client.patch(f"/enquiries/{stale[0].id}/read", headers=headers).status_code == 200
+    assert client.patch(f"/enquiries/{stale[1].id}/status", json={"status": "resolved"}, headers=headers).status_code == 200
+    assert client.delete(f"/enquiries/{stale[2].id}", headers=headers).status_code == 200
+
+    assert update_enquiry_state(db, stale[0], is_read=True)
+    assert update_enquiry_state(db, stale[1], status="resolved")
+    assert not delete_enquiry_counted(db, stale[2])
+    db.commit()
+
+    assert _counters(db, business.id) == stats._count_business_stats(db, business.id)
+    assert _counters(db, business.id) == {"enquiries_total": 2, "enquiries_unread": 1, "enquiries_new": 1, "visits_total": 0}
+
+
+#The counters row is first created by the booking, so it must count the enquiry as already moved on
+def test_booking_from_enquiry_creates_counters_after_the_status_change(client, db, make_business, auth_headers):
+    business = make_business()
+    headers = auth_headers(business)
+    enquiry = Enquiry(business_id=business.id, name="Customer", email="customer@example.com", message="Hello")
+    db.add(enquiry)
+    db.commit()
+    assert db.get(BusinessStats, business.id) is None
+
+    start = (datetime.now(timezone.utc) + timedelta(days=610)).replace(minute=0, second=0, microsecond=0)
+    res = client.post(
+        f"/bookings/from-enquiry/{enquiry.id}",
+        json={"start_time": start.isoformat(), "end_time": (start + timedelta(hours=1)).isoformat()},
+        headers=headers,
+    )
+    assert res.status_code == 200, res.text
+
+    assert _counters(db, business.id) == {"enquiries_total": 1, "enquiries_unread": 1, "enquiries_new": 0, "visits_total": 0}
+
+
+def test_switching_the_digest_off_flushes_the_pending_window(client, db, make_business, auth_headers):
+    now = datetime.now(timezone.utc)
+    business = make_business(enquiry_digest_minutes=60, enquiry_digest_sent_at=now - timedelta(minutes=10))
+    headers = auth_headers(business)
+    db.add(Enquiry(business_id=business.id, name="Customer", email="customer@example.com", message="Hello", created_at=now - timedelta(minutes=5)))
+    db.commit()
+
+    #An empty body no longer switches the digest off by omission
+    assert client.patch("/settings/notifications", json={}, headers=headers).status_code == 422
+
+    res = client.patch("/settings/notifications", json={"enquiry_digest_minutes": None}, headers=headers)
+    assert res.status_code == 200
+    assert res.json() == {"enquiry_digest_minutes": None}
+
+    digests = db.query(EmailOutbox).filter(EmailOutbox.to_email == business.email, EmailOutbox.template_id == 22).all()
+    assert len(digests) == 1
+    assert digests[0].params["ENQUIRY_COUNT"] == 1
@@ -0,0 +1,102 @@
+from datetime import datetime, timedelta, timezone
+import asyncio
+import uuid
+
+from app.db.models import EmailOutbox
+from app.services.outbox import (
+    EMAIL_BACKOFF_BASE_SECONDS,
+    EMAIL_MAX_ATTEMPTS,
+    EmailOutboxWorker,
+    claim_due_emails,
+    mark_email_failed,
+    mark_email_sent,
+    queue_email,
+)
+
+"""
+EMAIL OUTBOX TESTS
+"""
+
+
+def _queue(db) -> int:
+    row = queue_email(db, to=f"{uuid.uuid4().hex[:8]}@example.com", template_id=1, params={})
+    db.commit()
+    return row.id
+
+
+#Claim everything due and return this email's claim, if it was taken
+def _claim(email_id: int) -> dict | None:
+    return next((email for email in claim_due_emails(500) if email["id"] == email_id), None)
+
+
+def _expire_lease(db, email_id: int):
+    db.query(EmailOutbox).filter(EmailOutbox.id == email_id).update(
+        {"next_attempt_at": datetime.now(timezone.utc) - timedelta(seconds=1)}
+    )
+    db.commit()
+
+
+def test_claim_leases_the_email(db):
+    email_id = _queue(db)
+
+    claim = _claim(email_id)
+    assert claim["attempts"] == 1
+    assert _claim(email_id) is None
+
+    assert mark_email_sent(email_id, claim["attempts"])
+    row = db.get(EmailOutbox, email_id)
+    assert (row.status, row.last_error) == ("sent", None)
+
+
+def test_failure_backs_off_then_dead_letters(db):
+    email_id = _queue(db)
+
+    claim = _claim(email_id)
+    assert mark_email_failed(email_id, claim["attempts"], "boom")
+    row = db.get(EmailOutbox, email_id)
+    retry_at = row.next_attempt_at.replace(tzinfo=timezone.utc)
+    assert row.status == "pending"
+    assert retry_at > datetime.now(timezone.utc) + timedelta(seconds=EMAIL_BACKOFF_BASE_SECONDS - 5)
+
+    for _ in range(EMAIL_MAX_ATTEMPTS - 1):
+        _expire_lease(db, email_id)
+        claim = _claim(email_id)
+        mark_email_failed(email_id, claim["attempts"], "boom")
+
+    db.expire_all()
+    row = db.get(EmailOutbox, email_id)
+    assert (row.status, row.attempts) == ("dead", EMAIL_MAX_ATTEMPTS)
+
+
+def test_stale_worker_cannot_overwrite_a_reclaimed_email(db):
+    email_id = _queue(db)
+    stale = _claim(email_id)
+
+    #The lease runs out and another worker claims the email again
+    _expire_lease(db, email_id)
+    current = _claim(email_id)
+    assert current["attempts"] == stale["attempts"] + 1
+
+    assert not mark_email_failed(email_id, stale["attempts"], "late failure")
+    assert not mark_email_sent(email_id, stale["attempts"])
+
+    db.expire_all()
+    row = db.get(EmailOutbox, email_id)
+    assert (row.status, row.last_error) == ("pending", None)
+
+    assert mark_email_sent(email_id, current["attempts"])
+
+
+def test_worker_hands_back_a_claim_too_close_to_its_lease_end(db):
+    email_id = _queue(db)
+    claim = _claim(email_id)
+
+    #Queued behind other sends until the lease is nearly over
+    claim["lease_until"] = datetime.now(timezone.utc) + timedelta(seconds=5)
+    worker = EmailOutboxWorker(concurrency=1, poll_seconds=1)
+    asyncio.run(worker._deliver(claim, asyncio.Semaphore(1)))
+
+    db.expire_all()
+    row = db.get(EmailOutbox, email_id)
+    assert (row.status, row.attempts) == ("pending", 0)
+    assert _claim(email_id)["attempts"] == 1
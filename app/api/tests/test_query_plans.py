@@ -0,0 +1,135 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.core.config import _PUBLIC_BUSINESS_CACHE
+from app.core.utils import invalidate_availability
+from app.db.base import Base
+from app.db.session import engine
+
+"""
+QUERY PLAN REGRESSION SUITE
+
+Runs each hot route against the seeded database, captures the SELECTs
+it issues and checks their SQLite query plans: every table access must
+be an index search, and no query may sort through a temporary b-tree.
+A missing or unusable index shows up here before it shows up in latency.
+"""
+
+TABLES = set(Base.metadata.tables)
+
+
+#(method, path, query params, follow the first page's cursor)
+ROUTE_REQUESTS = [
+    ("GET", "/enquiries/", {"sort": "newest"}, False),
+    ("GET", "/enquiries/", {"sort": "oldest"}, False),
+    ("GET", "/enquiries/", {"sort": "unread"}, False),
+    ("GET", "/enquiries/", {"sort": "status"}, False),
+    ("GET", "/enquiries/", {"sort": "newest", "is_read": "false"}, False),
+    ("GET", "/enquiries/", {"sort": "newest", "status": "new"}, False),
+    ("GET", "/enquiries/", {"sort": "newest"}, True),
+    ("GET", "/enquiries/", {"sort": "oldest"}, True),
+    ("GET", "/enquiries/", {"sort": "unread"}, True),
+    ("GET", "/enquiries/", {"sort": "status"}, True),
+    ("GET", "/enquiries/stats", {}, False),
+    ("GET", "/bookings/", {"sort": "upcoming"}, False),
+    ("GET", "/bookings/", {"sort": "past"}, False),
+    ("GET", "/bookings/", {"sort": "created"}, False),
+    ("GET", "/bookings/", {"sort": "upcoming", "status": "confirmed"}, False),
+    ("GET", "/bookings/", {"sort": "past", "status": "pending"}, False),
+    ("GET", "/bookings/", {"sort": "upcoming"}, True),
+    ("GET", "/bookings/", {"sort": "past"}, True),
+    ("GET", "/bookings/", {"sort": "created"}, True),
+]
+
+
+#Plan rows that read a whole table or sort outside an index
+def _plan_problems(statement: str, parameters) -> list[str]:
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+
+    problems = []
+    for row in rows:
+        detail = row[-1]
+        words = detail.split()
+
+        if words[0] == "SCAN" and words[1] in TABLES:
+            problems.append(detail)
+        elif "TEMP B-TREE" in detail:
+            problems.append(detail)
+
+    return problems
+
+
+#Every captured SELECT with its problems; an empty result means the route is index-only
+def _check_plans(captured_queries) -> dict[str, list[str]]:
+    selects = [(s, p) for s, p in captured_queries if s.lstrip().upper().startswith("SELECT")]
+    assert selects, "route issued no SELECTs"
+
+    failures = {}
+    for statement, parameters in selects:
+        problems = _plan_problems(statement, parameters)
+        if problems:
+            failures[statement] = problems
+    return failures
+
+
+def _request_id(request):
+    method, path, params, follow = request
+    query = "&".join(f"{k}={v}" for k, v in params.items())
+    return f"{method} {path}?{query}{' (cursor)' if follow else ''}"
+
+
+@pytest.mark.parametrize("request_spec", ROUTE_REQUESTS, ids=_request_id)
+def test_dashboard_route_plans(client, seeded, captured_queries, request_spec):
+    method, path, params, follow = request_spec
+    headers = seeded["headers"]
+
+    if follow:
+        first = client.request(method, path, params={**params, "limit": 20}, headers=headers)
+        assert first.status_code == 200, first.text
+        cursor = first.headers.get("X-Next-Cursor")
+        assert cursor, "seeded data should span more than one page"
+        params = {**params, "limit": 20, "cursor": cursor}
+        captured_queries.clear()
+
+    res = client.request(method, path, params=params, headers=headers)
+    assert res.status_code == 200, res.text
+
+    assert _check_plans(captured_queries) == {}
+
+
+def test_public_business_plans(client, seeded, captured_queries):
+    _PUBLIC_BUSINESS_CACHE.pop(seeded["slug"], None)
+
+    res = client.get("/public/business", params={"slug": seeded["slug"]})
+    assert res.status_code == 200, res.text
+
+    assert _check_plans(captured_queries) == {}
+
+
+def test_public_availability_plans(client, seeded, captured_queries):
+    _PUBLIC_BUSINESS_CACHE.pop(seeded["slug"], None)
+    invalidate_availability(seeded["business_id"])
+
+    res = client.get("/public/availability", params={"slug": seeded["slug"], "days": 14})
+    assert res.status_code == 200, res.text
+
+    assert _check_plans(captured_queries) == {}
+
+
+def test_public_booking_plans(client, seeded, captured_queries):
+    start = (datetime.now(timezone.utc) + timedelta(days=400)).replace(microsecond=0)
+
+    res = client.post(
+        "/public/booking",
+        params={"slug": seeded["slug"]},
+        json={
+            "start_time": start.isoformat(),
+            "end_time": (start + timedelta(minutes=30)).isoformat(),
+            "customer_email": "plan@example.com",
+        },
+    )
+    assert res.status_code == 200, res.text
+
+    assert _check_plans(captured_queries) == {}
@@ -0,0 +1,125 @@
+from dotenv import load_dotenv
+load_dotenv()
+
+from datetime import datetime
+import argparse
+import json
+
+"""
+MANAGEMENT CLI
+
+Operational commands run against the configured database:
+
+    python -m app.cli replay-stripe-events [--business-id ID] [--since ISO] [--notify]
+    python -m app.cli bench-stripe-webhooks [--events N] [--subscriptions N]
+    python -m app.cli bench-bookings [--clients N] [--attempts N] [--slots N]
+    python -m app.cli reconcile-stripe [--dry-run]
+    python -m app.cli rebuild-business-stats [--business-id ID]
+"""
+
+
+#Replay stored Stripe events in arrival order, in bulk or for one business
+def _replay_stripe_events(args):
+    from app.services.stripe_events import replay_stripe_events
+
+    since = datetime.fromisoformat(args.since) if args.since else None
+    result = replay_stripe_events(business_id=args.business_id, since=since, notify=args.notify)
+    print(json.dumps(result, indent=2))
+
+
+#Benchmark webhook ingest and processing against a local fake Stripe API
+def _bench_stripe_webhooks(args):
+    from app.services.stripe_bench import run_webhook_benchmark
+
+    result = run_webhook_benchmark(
+        events=args.events,
+        subscriptions=args.subscriptions,
+        concurrency=args.concurrency,
+        stripe_latency=args.stripe_latency_ms / 1000,
+        keep=args.keep,
+    )
+    print(json.dumps(result, indent=2))
+
+
+#Benchmark concurrent booking claims and check for double-bookings
+def _bench_bookings(args):
+    from app.services.booking_bench import run_booking_benchmark
+
+    result = run_booking_benchmark(
+        clients=args.clients,
+        attempts=args.attempts,
+        slots=args.slots,
+        keep=args.keep,
+    )
+    print(json.dumps(result, indent=2))
+
+
+#Compare every Stripe subscription with the database and fix drift
+def _reconcile_stripe(args):
+    from app.db.session import SessionLocal
+    from app.services.reconcile import reconcile_subscriptions
+
+    db = SessionLocal()
+    try:
+        result = reconcile_subscriptions(db, dry_run=args.dry_run)
+    finally:
+        db.close()
+    print(json.dumps(result, indent=2))
+
+
+#Recompute the dashboard counters from the enquiries and visits tables
+def _rebuild_business_stats(args):
+    from app.db.session import SessionLocal
+    from app.services.stats import rebuild_business_stats
+
+    db = SessionLocal()
+    try:
+        rebuilt = rebuild_business_stats(db, business_id=args.business_id)
+    finally:
+        db.close()
+    print(json.dumps({"rebuilt": rebuilt}, indent=2))
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="Flotrafic management commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    replay = commands.add_parser("replay-stripe-events", help="Re-run stored Stripe webhook events")
+    replay.add_argument("--business-id", type=int, default=None, help="Only replay events for this business")
+    replay.add_argument("--since", default=None, help="Only replay events received at or after this ISO timestamp")
+    replay.add_argument("--notify", action="store_true", help="Send the emails the events would trigger")
+    replay.set_defaults(func=_replay_stripe_events)
+
+    bench = commands.add_parser("bench-stripe-webhooks", help="Benchmark webhook throughput against a fake Stripe API")
+    bench.add_argument("--events", type=int, default=1000)
+    bench.add_argument("--subscriptions", type=int, default=50)
+    bench.add_argument("--concurrency", type=int, default=4)
+    bench.add_argument("--stripe-latency-ms", type=float, default=0.0, help="Artificial latency per fake Stripe call")
+    bench.add_argument("--keep", action="store_true", help="Keep the benchmark rows afterwards")
+    bench.set_defaults(func=_bench_stripe_webhooks)
+
+    bench_bookings = commands.add_parser("bench-bookings", help="Hammer booking slots from concurrent clients")
+    bench_bookings.add_argument("--clients", type=int, default=16)
+    bench_bookings.add_argument("--attempts", type=int, default=20, help="Claims per client")
+    bench_bookings.add_argument("--slots", type=int, default=1, help="Slots the clients compete for")
+    bench_bookings.add_argument("--keep", action="store_true", help="Keep the benchmark rows afterwards")
+    bench_bookings.set_defaults(func=_bench_bookings)
+
+    reconcile = commands.add_parser("reconcile-stripe", help="Repair subscription state missed by webhooks")
+    reconcile.add_argument("--dry-run", action="store_true", help="Report drift without writing it")
+    reconcile.set_defaults(func=_reconcile_stripe)
+
+    stats = commands.add_parser("rebuild-business-stats", help="Recompute dashboard counters from the tables")
+    stats.add_argument("--business-id", type=int, default=None, help="Only rebuild this business's counters")
+    stats.set_defaults(func=_rebuild_business_stats)
+
+    return parser
+
+
+def main(argv: list[str] | None = None):
+    args = build_parser().parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
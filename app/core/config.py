@@ -1,7 +1,9 @@
 from pydantic_settings import BaseSettings
 from pydantic import Field
 import re
+from collections import OrderedDict
 from datetime import datetime, timedelta, timezone
+from sqlalchemy import inspect
 
 """
 API CONFIGURATION
@@ -22,10 +24,56 @@ class Settings(BaseSettings):
     STRIPE_PRO_PRICE_ID: str
 
     TURNSTILE_SECRET_KEY: str
+    TURNSTILE_CONNECT_TIMEOUT: float = 1.5
+    TURNSTILE_READ_TIMEOUT: float = 3.0
+    CAPTCHA_BACKEND: str = "turnstile"
 
     ADMIN_PASSWORD: str
 
     DATABASE_URL: str | None = None
+    DATABASE_REPLICA_URLS: str | None = None
+    READ_YOUR_WRITES_SECONDS: float = 5.0
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_TIMEOUT_MS: int = 15_000
+
+    SQLITE_JOURNAL_MODE: str = "WAL"
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024
+    SQLITE_BUSY_TIMEOUT_MS: int = 10_000
+    SQLITE_CACHE_SIZE_KB: int = 64 * 1024
+    SQLITE_SERIALIZE_WRITES: bool = True
+
+    EMAIL_TRANSPORT: str = "brevo"
+    EMAIL_FILE_PATH: str = "outbox.jsonl"
+    EMAIL_SMTP_HOST: str = "localhost"
+    EMAIL_SMTP_PORT: int = 1025
+    EMAIL_FROM: str = "no-reply@flotrafic.co.uk"
+
+    EMAIL_WORKERS_ENABLED: bool = True
+    EMAIL_WORKER_CONCURRENCY: int = 8
+    EMAIL_OUTBOX_POLL_SECONDS: float = 2.0
+
+    STRIPE_EVENT_WORKERS_ENABLED: bool = True
+    STRIPE_EVENT_WORKER_CONCURRENCY: int = 4
+    STRIPE_EVENT_POLL_SECONDS: float = 2.0
+    STRIPE_APPLY_EVENT_PAYLOADS: bool = True
+    STRIPE_EVENT_COALESCE_SECONDS: float = 2.0
+    STRIPE_EVENT_DEDUP_CACHE_SIZE: int = 10_000
+    STRIPE_EVENT_RETENTION_DAYS: int = 30
+    STRIPE_RECONCILE_INTERVAL_SECONDS: int = 6 * 60 * 60
+    STRIPE_RECONCILE_PAGE_INTERVAL_SECONDS: float = 0.1
+    SUBSCRIPTION_SWEEP_INTERVAL_SECONDS: int = 300
+
+    SCHEDULED_JOBS_ENABLED: bool = True
+    ENQUIRY_DIGEST_INTERVAL_SECONDS: int = 60
+    BOOKING_REMINDER_LEAD_MINUTES: int = 24 * 60
+    BOOKING_REMINDER_TICK_SECONDS: int = 30
+    BOOKING_REMINDER_REFRESH_SECONDS: int = 600
+    BOOKING_EXCLUSION_REQUIRED: bool = True
 
     class Config:
         env_file = ".env"
@@ -36,6 +84,43 @@ settings = Settings()
 
 STRIPE_GRACE_PERIOD_DAYS = 7
 
+
+#Bump the entitlement epoch so tokens carrying older entitlement claims are re-derived
+def bump_entitlements_version(business):
+    business.entitlements_version = (business.entitlements_version or 0) + 1
+
+
+#Columns whose change can alter a business's entitlements
+ENTITLEMENT_STATE_FIELDS = (
+    "tier",
+    "is_active",
+    "stripe_subscription_status",
+    "stripe_current_period_end",
+    "latest_paid_period_end",
+    "stripe_ended_at",
+)
+
+
+def _comparable(value):
+    #SQLite hands back naive timestamps; they are stored as UTC
+    if isinstance(value, datetime) and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+#Whether any entitlement column differs from its last loaded or flushed value
+def entitlement_state_changed(business) -> bool:
+    attrs = inspect(business).attrs
+    for field in ENTITLEMENT_STATE_FIELDS:
+        history = attrs[field].history
+        if not history.added:
+            continue
+        #Set while expired, so the old value was never loaded: assume it changed
+        if not history.deleted or _comparable(history.deleted[0]) != _comparable(history.added[0]):
+            return True
+    return False
+
+
 def apply_subscription_state(business, stripe_status: str | None = None):
     # Canonical Access Logic
     now = datetime.now(timezone.utc)
@@ -43,7 +128,11 @@ def apply_subscription_state(business, stripe_status: str | None = None):
     # 1. Access Rule: Invoice-Driven
     # If the user has paid for time that covers now, they have access.
     invoice_covers_now = False
-    if business.latest_paid_period_end and business.latest_paid_period_end > now:
+    paid_end = business.latest_paid_period_end
+    if paid_end and paid_end.tzinfo is None:
+        # SQLite hands back naive timestamps; they are stored as UTC
+        paid_end = paid_end.replace(tzinfo=timezone.utc)
+    if paid_end and paid_end > now:
         invoice_covers_now = True
 
     # 2. Fallback Rule: Subscription Status
@@ -68,6 +157,9 @@ def apply_subscription_state(business, stripe_status: str | None = None):
         business.is_active = True
         business.grace_period_ends_at = None
 
+    #Webhooks, replays and sweeps that change nothing must not invalidate issued claims
+    if entitlement_state_changed(business):
+        bump_entitlements_version(business)
 
 
 #Acccount subscription tiers
@@ -87,6 +179,15 @@ TIERS = {
 }
 
 
+#Stable bit assigned to each feature in the entitlements token claim
+FEATURE_BITS = {
+    "enquiries": 1 << 0,
+    "bookings": 1 << 1,
+    "customisation": 1 << 2,
+    "autopilot": 1 << 3,
+}
+
+
 #Slugs reserved for business logic 
 RESERVED_SLUGS = {
 
@@ -138,12 +239,35 @@ RATE_LIMITS = {
     "enquiry": (5, 600),
     "booking": (5, 600),
     "visit": (30, 60),
+    "availability": (60, 60),
 }
 
 
 _PUBLIC_BUSINESS_CACHE = {}
 TIME_TO_LIVE = 60
 
+
+#Short-lived cache of authenticated principals keyed by token subject
+_PRINCIPAL_CACHE = {}
+PRINCIPAL_TIME_TO_LIVE = 30
+
+
+#Cached per-business token epochs used to reject revoked tokens in memory
+_TOKEN_EPOCH_CACHE = {}
+TOKEN_EPOCH_TIME_TO_LIVE = 5
+
+
+#Enquiry stats computed from the tables for businesses without counters yet
+_ENQUIRY_STATS_CACHE = {}
+ENQUIRY_STATS_TIME_TO_LIVE = 15
+
+
+#Computed public availability per business, keyed by (start date, days); least recently used first
+_AVAILABILITY_CACHE = OrderedDict()
+AVAILABILITY_TIME_TO_LIVE = 30
+AVAILABILITY_CACHE_MAX_BUSINESSES = 1_000
+AVAILABILITY_CACHE_MAX_RANGES = 32
+
 PASSWORD_REGEX = re.compile(
     r"^(?=.*[0-9])(?=.*[!@#$%^&*()_+\-=\[\]{};':\"\\|,.<>\/?]).{8,}$"
 )
\ No newline at end of file
@@ -0,0 +1,163 @@
+from abc import ABC, abstractmethod
+from collections import deque
+from email.message import EmailMessage
+from typing import Any
+import asyncio
+import json
+import smtplib
+import httpx
+
+from app.core.config import settings
+
+"""
+EMAIL TRANSPORTS
+
+Delivery backends used by the email outbox workers. Brevo sends
+templated mail over a pooled keep-alive HTTP client; the memory,
+file and SMTP sinks let the notification path run without the network.
+"""
+
+BREVO_API_BASE = "https://api.brevo.com/v3"
+
+
+#Raised when a transport fails to hand an email to its backend
+class EmailDeliveryError(RuntimeError):
+    pass
+
+
+#Interface implemented by every email transport
+class EmailTransport(ABC):
+    @abstractmethod
+    async def asend(self, *, to: str, template_id: int, params: dict[str, Any]) -> None:
+        ...
+
+    async def aclose(self) -> None:
+        pass
+
+
+#Brevo transactional template API over a pooled async HTTP client
+class BrevoTransport(EmailTransport):
+    def __init__(self, api_key: str | None, max_connections: int = 20, timeout: float = 10.0):
+        self.api_key = api_key
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self._client = None
+
+    #Create the client lazily so it binds to the worker's event loop
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=BREVO_API_BASE,
+                headers={"api-key": self.api_key, "accept": "application/json"},
+                timeout=httpx.Timeout(self.timeout, connect=3.0),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+            )
+        return self._client
+
+    async def asend(self, *, to: str, template_id: int, params: dict[str, Any]) -> None:
+        if not self.api_key:
+            raise EmailDeliveryError("BREVO_API_KEY is not set")
+
+        try:
+            res = await self._get_client().post(
+                "/smtp/email",
+                json={
+                    "to": [{"email": to}],
+                    "templateId": template_id,
+                    "params": params,
+                },
+            )
+        except httpx.HTTPError as e:
+            raise EmailDeliveryError(f"Brevo email failed (template {template_id})") from e
+
+        if res.status_code >= 400:
+            raise EmailDeliveryError(
+                f"Brevo email failed (template {template_id}): {res.status_code} {res.text[:200]}"
+            )
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+#Keeps sent emails in memory, for tests and benchmarks
+class MemoryTransport(EmailTransport):
+    def __init__(self, max_messages: int = 10_000):
+        self.messages = deque(maxlen=max_messages)
+        self.sent_count = 0
+
+    async def asend(self, *, to: str, template_id: int, params: dict[str, Any]) -> None:
+        self.messages.append({"to": to, "template_id": template_id, "params": params})
+        self.sent_count += 1
+
+
+#Appends each email as a JSON line to a local file
+class FileTransport(EmailTransport):
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = asyncio.Lock()
+
+    def _write(self, line: str):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+    async def asend(self, *, to: str, template_id: int, params: dict[str, Any]) -> None:
+        line = json.dumps({"to": to, "template_id": template_id, "params": params}, default=str)
+        async with self._lock:
+            await asyncio.to_thread(self._write, line)
+
+
+#Sends a plain rendering of the template parameters to a local SMTP sink (e.g. MailHog)
+class SmtpTransport(EmailTransport):
+    def __init__(self, host: str, port: int, sender: str):
+        self.host = host
+        self.port = port
+        self.sender = sender
+
+    def _send(self, to: str, template_id: int, params: dict[str, Any]):
+        msg = EmailMessage()
+        msg["From"] = self.sender
+        msg["To"] = to
+        msg["Subject"] = f"[template {template_id}]"
+        msg.set_content(json.dumps(params, indent=2, default=str))
+
+        with smtplib.SMTP(self.host, self.port, timeout=10) as smtp:
+            smtp.send_message(msg)
+
+    async def asend(self, *, to: str, template_id: int, params: dict[str, Any]) -> None:
+        try:
+            await asyncio.to_thread(self._send, to, template_id, params)
+        except (OSError, smtplib.SMTPException) as e:
+            raise EmailDeliveryError(f"SMTP email failed (template {template_id})") from e
+
+
+_TRANSPORT = None
+
+
+#Return the process-wide email transport selected by EMAIL_TRANSPORT
+def get_email_transport() -> EmailTransport:
+    global _TRANSPORT
+
+    if _TRANSPORT is None:
+        backend = settings.EMAIL_TRANSPORT
+
+        if backend == "memory":
+            _TRANSPORT = MemoryTransport()
+        elif backend == "file":
+            _TRANSPORT = FileTransport(settings.EMAIL_FILE_PATH)
+        elif backend == "smtp":
+            _TRANSPORT = SmtpTransport(settings.EMAIL_SMTP_HOST, settings.EMAIL_SMTP_PORT, settings.EMAIL_FROM)
+        else:
+            _TRANSPORT = BrevoTransport(settings.BREVO_API_KEY)
+
+    return _TRANSPORT
+
+
+#Swap the process-wide transport, e.g. for a memory sink in tests
+def set_email_transport(transport: EmailTransport):
+    global _TRANSPORT
+    _TRANSPORT = transport
@@ -1,11 +1,11 @@
 from passlib.context import CryptContext
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from jose import jwt
-import requests
 from fastapi import HTTPException
 from time import time
 
-from app.core.config import settings
+from app.core.config import settings, TIERS, FEATURE_BITS
+from app.core.captcha import get_captcha_verifier, CaptchaUnavailableError
 
 """
 API SECURITY
@@ -47,26 +47,75 @@ def create_access_token(data: dict) -> str:
     )
 
 
-#Verify cloudflare turnstile CAPTCHA token
-def verify_captcha(token: str):
-    res = requests.post(
-        "https://challenges.cloudflare.com/turnstile/v0/siteverify",
-        json={
-            "secret": settings.TURNSTILE_SECRET_KEY,
-            "response": token,
-        },
-        timeout=5,
+#Derive the compact entitlements claim (feature bitmask, payment flag, expiry) for a business
+def build_entitlements_claim(business) -> dict:
+    features = TIERS.get(business.tier, {})
+    mask = 0
+    for feature, bit in FEATURE_BITS.items():
+        if features.get(feature):
+            mask |= bit
+
+    payment_required = 0
+    expires = 0
+
+    if business.tier != "free":
+        if business.stripe_subscription_status not in ("active", "trialing"):
+            payment_required = 1
+
+        period_end = business.stripe_current_period_end
+        if period_end:
+            if period_end.tzinfo is None:
+                period_end = period_end.replace(tzinfo=timezone.utc)
+            expires = int(period_end.timestamp())
+
+    return {
+        "v": business.entitlements_version,
+        "f": mask,
+        "pay": payment_required,
+        "exp": expires,
+    }
+
+
+#Create a business access token carrying its token epoch and entitlements
+def create_business_token(business) -> str:
+    return create_access_token(
+        {
+            "sub": str(business.id),
+            "ver": business.token_version,
+            "ent": build_entitlements_claim(business),
+        }
     )
 
-    data = res.json()
 
+#Raise a 400 unless the provider accepted the captcha token
+def _check_captcha_result(data: dict):
     if not data.get("success"):
         raise HTTPException(
             status_code=400,
-            detail=f"Captcha verification failed: {data}",
+            detail=f"Captcha verification failed: {data.get('error-codes', [])}",
         )
 
 
+#Verify cloudflare turnstile CAPTCHA token using the pooled client
+def verify_captcha(token: str):
+    try:
+        data = get_captcha_verifier().verify(token)
+    except CaptchaUnavailableError:
+        raise HTTPException(status_code=503, detail="Captcha verification unavailable")
+
+    _check_captcha_result(data)
+
+
+#Verify cloudflare turnstile CAPTCHA token without blocking the event loop
+async def verify_captcha_async(token: str):
+    try:
+        data = await get_captcha_verifier().averify(token)
+    except CaptchaUnavailableError:
+        raise HTTPException(status_code=503, detail="Captcha verification unavailable")
+
+    _check_captcha_result(data)
+
+
 #Simple in-memory rate limiter
 def rate_limit(key: str, max_requests: int, window_seconds: int) -> bool:
     now = time()
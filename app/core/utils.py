@@ -1,22 +1,27 @@
+from collections import OrderedDict
+from threading import Lock
 from time import time
 from datetime import datetime, timezone, timedelta
-from sib_api_v3_sdk.rest import ApiException
-from typing import Any
-import re, secrets, stripe
-import sib_api_v3_sdk
-
-from app.core.config import _PUBLIC_BUSINESS_CACHE, TIME_TO_LIVE, settings, apply_subscription_state
+import base64, binascii, json, re, secrets, stripe
+
+from sqlalchemy import DateTime, and_, literal, or_, tuple_
+
+from app.core.config import (
+    _PUBLIC_BUSINESS_CACHE,
+    TIME_TO_LIVE,
+    _PRINCIPAL_CACHE,
+    PRINCIPAL_TIME_TO_LIVE,
+    _TOKEN_EPOCH_CACHE,
+    TOKEN_EPOCH_TIME_TO_LIVE,
+    _AVAILABILITY_CACHE,
+    AVAILABILITY_TIME_TO_LIVE,
+    AVAILABILITY_CACHE_MAX_BUSINESSES,
+    AVAILABILITY_CACHE_MAX_RANGES,
+    settings,
+    apply_subscription_state,
+)
 from app.db.models import Business
 
-if not settings.BREVO_API_KEY:
-    raise RuntimeError("BREVO_API_KEY is not set")
-
-config = sib_api_v3_sdk.Configuration()
-config.api_key["api-key"] = settings.BREVO_API_KEY
-
-client = sib_api_v3_sdk.ApiClient(config)
-brevo = sib_api_v3_sdk.TransactionalEmailsApi(client)
-
 
 #Convert business name to URL safe slug
 def slugify(name: str) -> str:
@@ -44,6 +49,97 @@ def set_cached_business(slug: str, data: dict):
     _PUBLIC_BUSINESS_CACHE[slug] = (data, time())
 
 
+#Retrieve a cached auth principal for a token subject if fresh
+def get_cached_principal(key: str):
+    entry = _PRINCIPAL_CACHE.get(key)
+    if not entry:
+        return None
+
+    value, timestamp = entry
+    if time() - timestamp > PRINCIPAL_TIME_TO_LIVE:
+        _PRINCIPAL_CACHE.pop(key, None)
+        return None
+
+    return value
+
+
+#Store an auth principal snapshot for a token subject
+def set_cached_principal(key: str, principal):
+    _PRINCIPAL_CACHE[key] = (principal, time())
+
+
+#Retrieve the cached (token_version, entitlements_version) epoch for a business if fresh
+def get_cached_token_epoch(business_id: int) -> tuple[int, int] | None:
+    entry = _TOKEN_EPOCH_CACHE.get(business_id)
+    if not entry:
+        return None
+
+    value, timestamp = entry
+    if time() - timestamp > TOKEN_EPOCH_TIME_TO_LIVE:
+        _TOKEN_EPOCH_CACHE.pop(business_id, None)
+        return None
+
+    return value
+
+
+#Store the current (token_version, entitlements_version) epoch for a business
+def set_cached_token_epoch(business_id: int, epoch: tuple[int, int]):
+    _TOKEN_EPOCH_CACHE[business_id] = (epoch, time())
+
+
+#Drop the cached principal and token epoch after auth-relevant business fields change
+def invalidate_cached_principal(business_id: int):
+    _PRINCIPAL_CACHE.pop(f"business:{business_id}", None)
+    _TOKEN_EPOCH_CACHE.pop(business_id, None)
+
+
+#Guards the availability LRU, which the event loop and worker threads both touch
+_AVAILABILITY_CACHE_LOCK = Lock()
+
+
+#Retrieve cached availability for a business and date range if fresh
+def get_cached_availability(business_id: int, key: tuple):
+    with _AVAILABILITY_CACHE_LOCK:
+        ranges = _AVAILABILITY_CACHE.get(business_id)
+        entry = ranges.get(key) if ranges else None
+        if not entry:
+            return None
+
+        value, timestamp = entry
+        if time() - timestamp > AVAILABILITY_TIME_TO_LIVE:
+            ranges.pop(key, None)
+            return None
+
+        _AVAILABILITY_CACHE.move_to_end(business_id)
+        ranges.move_to_end(key)
+        return value
+
+
+#Store computed availability for a business and date range, evicting the least recently used beyond the caps
+def set_cached_availability(business_id: int, key: tuple, data):
+    with _AVAILABILITY_CACHE_LOCK:
+        ranges = _AVAILABILITY_CACHE.setdefault(business_id, OrderedDict())
+        ranges[key] = (data, time())
+        ranges.move_to_end(key)
+        _AVAILABILITY_CACHE.move_to_end(business_id)
+
+        while len(ranges) > AVAILABILITY_CACHE_MAX_RANGES:
+            ranges.popitem(last=False)
+        while len(_AVAILABILITY_CACHE) > AVAILABILITY_CACHE_MAX_BUSINESSES:
+            _AVAILABILITY_CACHE.popitem(last=False)
+
+
+#Drop every cached availability range after a booking or the business's rules change
+def invalidate_availability(business_id: int):
+    with _AVAILABILITY_CACHE_LOCK:
+        _AVAILABILITY_CACHE.pop(business_id, None)
+
+
+#Bump the token epoch so every previously issued access token is rejected
+def revoke_business_tokens(business: Business):
+    business.token_version = (business.token_version or 0) + 1
+
+
 #Generate a secure 6 digit recovery code and its expiry time
 def generate_verification_code(minutes_valid: int = 10) -> tuple[str, datetime]:
     code = f"{secrets.randbelow(1_000_000):06d}"
@@ -152,28 +248,155 @@ def _safe_stripe_subscription_refresh(business: Business):
     # The caller should do it to update the tier/is_active derived flags.
 
 
+#Period end from a subscription payload, at subscription level or on its first item
+def _subscription_period_end(sub: dict) -> int | None:
+    if sub.get("current_period_end"):
+        return sub["current_period_end"]
+
+    items = (sub.get("items") or {}).get("data") or []
+    if items:
+        return items[0].get("current_period_end")
+
+    return None
+
+
+#Apply a subscription object from a verified event; returns False if the payload is stale or incomplete
+def _apply_stripe_subscription_payload(business: Business, sub: dict, event_created: int | None) -> bool:
+    created = _ts_to_dt(event_created)
+    last = business.stripe_state_updated_at
+    if last and last.tzinfo is None:
+        last = last.replace(tzinfo=timezone.utc)
+
+    #Same-second events can arrive in either order, so only strictly newer payloads are trusted
+    if not created or (last and created <= last):
+        return False
+
+    period_end = _subscription_period_end(sub)
+    if not sub.get("status") or not period_end:
+        return False
+
+    business.stripe_subscription_status = sub["status"]
+    business.stripe_cancel_at_period_end = bool(sub.get("cancel_at_period_end"))
+    business.stripe_ended_at = _ts_to_dt(sub.get("ended_at"))
+    business.stripe_current_period_end = _ts_to_dt(period_end)
+    business.stripe_state_updated_at = created
+    return True
+
+
+#Extend paid access from a verified invoice event; returns False if the payload is incomplete
+def _apply_stripe_invoice_payload(business: Business, invoice: dict) -> bool:
+    lines = invoice.get("lines") or {}
+    if invoice.get("status") != "paid" or lines.get("has_more") or not lines.get("data"):
+        return False
+
+    max_end = 0
+    for line in lines["data"]:
+        max_end = max(max_end, (line.get("period") or {}).get("end") or 0)
+
+    if not max_end:
+        return False
+
+    #Paid coverage only moves forward, so out-of-order invoices are harmless
+    paid_end = _ts_to_dt(max_end)
+    current = business.latest_paid_period_end
+    if current and current.tzinfo is None:
+        current = current.replace(tzinfo=timezone.utc)
+
+    if not current or paid_end > current:
+        business.latest_paid_period_end = paid_end
+
+    return True
+
+
+#Record that the live subscription state has been applied up to this event
+def _mark_stripe_state_applied(business: Business, event_created: int | None):
+    created = _ts_to_dt(event_created)
+    last = business.stripe_state_updated_at
+    if last and last.tzinfo is None:
+        last = last.replace(tzinfo=timezone.utc)
+
+    if created and (not last or created > last):
+        business.stripe_state_updated_at = created
 
-    
 
-#Send a transactional email via Brevo using a predefined template
-def _send_email(*, to: str, template_id: int, params: dict[str, Any]) -> None:
-    try:
-        email = sib_api_v3_sdk.SendSmtpEmail(
-            to=[{"email": to}],
-            template_id=template_id,
-            params=params,
-        )
-        brevo.send_transac_email(email)
 
-    except ApiException as e:
-        raise RuntimeError(
-            f"Brevo email failed (template {template_id})"
-        ) from e
-    
     
+
 #Format booking date and time consistently for email templates
 def _format_booking_time(start_time: datetime) -> tuple[str, str]:
     return (
         start_time.strftime("%A, %d %B %Y"),
         start_time.strftime("%H:%M"),
-    )
\ No newline at end of file
+    )
+
+
+#Opaque pagination cursor: the sort mode plus the sort key of the last row returned
+def encode_cursor(sort: str, values: list) -> str:
+    key = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    raw = json.dumps({"s": sort, "k": key}, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+#Decode a cursor issued for this sort mode; raises ValueError for anything else
+def decode_cursor(cursor: str, sort: str, order) -> list:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError("Invalid cursor")
+
+    if not isinstance(data, dict) or data.get("s") != sort:
+        raise ValueError("Cursor does not match sort")
+
+    key = data.get("k")
+    if not isinstance(key, list) or len(key) != len(order):
+        raise ValueError("Invalid cursor")
+
+    values = []
+    for (column, _), value in zip(order, key):
+        if not isinstance(value, (str, int, float, bool)):
+            raise ValueError("Invalid cursor")
+        if isinstance(column.type, DateTime):
+            if not isinstance(value, str):
+                raise ValueError("Invalid cursor")
+            value = datetime.fromisoformat(value)
+        values.append(value)
+    return values
+
+
+#Rows strictly after the cursor row in the given (column, descending) order
+def _keyset_after(order, values):
+    directions = {descending for _, descending in order}
+    #Bound with each column's type so booleans and datetimes compare like the stored values
+    values = [literal(value, column.type) for (column, _), value in zip(order, values)]
+
+    #Uniform direction compares the whole key as a row value, which maps onto the index
+    if len(directions) == 1:
+        columns = tuple_(*[column for column, _ in order])
+        key = tuple_(*values)
+        return columns < key if directions == {True} else columns > key
+
+    clauses = []
+    for i, (column, descending) in enumerate(order):
+        prefix = [order[j][0] == values[j] for j in range(i)]
+        clauses.append(and_(*prefix, column < values[i] if descending else column > values[i]))
+    return or_(*clauses)
+
+
+#One page of a query in keyset order; returns the rows and the cursor for the next page, if any.
+#Offset mode is kept for older clients and ignored once a cursor is given.
+def keyset_page(query, order, sort: str, limit: int, cursor: str | None = None, offset: int = 0):
+    query = query.order_by(*[column.desc() if descending else column.asc() for column, descending in order])
+
+    if cursor:
+        query = query.filter(_keyset_after(order, decode_cursor(cursor, sort, order)))
+    elif offset:
+        query = query.offset(offset)
+
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(sort, [getattr(last, column.key) for column, _ in order])
@@ -3,6 +3,7 @@ from sqlalchemy import (
     Integer,
     String,
     ForeignKey,
+    Date,
     DateTime,
     Boolean,
     Enum,
@@ -11,6 +12,7 @@ from sqlalchemy import (
     CheckConstraint,
     UniqueConstraint,
     Text,
+    desc,
 )
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship, backref
@@ -51,6 +53,16 @@ BookingStatusEnum = Enum(
 )
 
 
+#Processing state for received Stripe webhook events
+StripeEventStatusEnum = Enum(
+    "pending", "processed", "ignored", "failed", name="stripe_event_status_enum"
+)
+
+
+#Delivery state for queued transactional emails
+EmailStatusEnum = Enum("pending", "sent", "dead", name="email_status_enum")
+
+
 # =========================================================
 # BUSINESS (core account entity):
 # =========================================================
@@ -70,17 +82,27 @@ class Business(Base):
     tier = Column(TierEnum, nullable=False, default="free")
     hashed_password = Column(String, nullable=False)
     is_active = Column(Boolean, nullable=False, default=True)
-    grace_period_ends_at = Column(DateTime(timezone=True), nullable=True)
+    grace_period_ends_at = Column(DateTime(timezone=True), nullable=True, index=True)
+
+    #Token epoch embedded in access tokens, bumped to revoke every issued token
+    token_version = Column(Integer, nullable=False, default=0, server_default="0")
+
+    #Entitlement epoch embedded in access tokens, bumped whenever tier or subscription state changes
+    entitlements_version = Column(Integer, nullable=False, default=0, server_default="0")
 
     #Stripe subscription metadata
     stripe_customer_id = Column(String, nullable=True, index=True)
     stripe_subscription_id = Column(String, nullable=True, index=True)
-    stripe_current_period_end = Column(DateTime(timezone=True), nullable=True)
+    stripe_subscription_status = Column(String, nullable=True)
+    stripe_current_period_end = Column(DateTime(timezone=True), nullable=True, index=True)
     stripe_cancel_at_period_end = Column(Boolean, default=False)
     stripe_ended_at = Column(DateTime(timezone=True), nullable=True)
 
+    #Stripe `created` time of the newest event whose subscription state was applied
+    stripe_state_updated_at = Column(DateTime(timezone=True), nullable=True)
+
     # Authoritative access expiry from invoices
-    latest_paid_period_end = Column(DateTime(timezone=True), nullable=True)
+    latest_paid_period_end = Column(DateTime(timezone=True), nullable=True, index=True)
 
     #Email verification state
     email_verified = Column(Boolean, nullable=False, default=False)
@@ -91,6 +113,10 @@ class Business(Base):
     password_reset_code = Column(String, nullable=True, index=True)
     password_reset_expires = Column(DateTime(timezone=True), nullable=True)
 
+    #Enquiry notification digest window in minutes (None sends one email per enquiry)
+    enquiry_digest_minutes = Column(Integer, nullable=True)
+    enquiry_digest_sent_at = Column(DateTime(timezone=True), nullable=True)
+
     #Relationships to dependent resources
     enquiries = relationship("Enquiry", back_populates="business", cascade="all, delete-orphan")
     bookings = relationship("Booking", back_populates="business", cascade="all, delete-orphan")
@@ -137,6 +163,13 @@ class Enquiry(Base):
     #Bookings optionally created from this enquiry
     bookings = relationship("Booking", back_populates="enquiry", cascade="all, delete-orphan")
 
+    #Composite indexes matching the dashboard's sort orders and pagination cursors
+    __table_args__ = (
+        Index("ix_enquiry_business_created", "business_id", "created_at", "id"),
+        Index("ix_enquiry_business_read_created", "business_id", "is_read", desc("created_at"), desc("id")),
+        Index("ix_enquiry_business_status_created", "business_id", "status", desc("created_at"), desc("id")),
+    )
+
 
 # =========================================================
 # BOOKINGS (appointments / scheduling):
@@ -155,10 +188,16 @@ class Booking(Base):
     start_time = Column(DateTime(timezone=True), nullable=False)
     end_time = Column(DateTime(timezone=True), nullable=False)
 
+    #Customer contact captured with public booking requests
+    customer_email = Column(String, nullable=True)
+
     #Optional notes for internal and customer use
     business_note = Column(Text, nullable=True)
     customer_note = Column(Text, nullable=True)
 
+    #Set once the reminder emails for this booking have been queued
+    reminder_sent_at = Column(DateTime(timezone=True), nullable=True)
+
     #Booking lifecycle status
     status = Column(BookingStatusEnum, nullable=False, default="pending")
 
@@ -171,6 +210,10 @@ class Booking(Base):
     #Constraints to ensure booking validity and prevent duplicates
     __table_args__ = (
         Index("ix_booking_business_time", "business_id", "start_time", "end_time"),
+        Index("ix_booking_status_start", "status", "start_time"),
+        Index("ix_booking_business_start_id", "business_id", "start_time", "id"),
+        Index("ix_booking_business_status_start", "business_id", "status", "start_time", "id"),
+        Index("ix_booking_business_created", "business_id", "created_at", "id"),
         CheckConstraint("end_time > start_time", name="ck_booking_time_valid"),
     )
 
@@ -246,6 +289,30 @@ class Visit(Base):
 
     created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
 
+    #Per-business visit counts and date ranges
+    __table_args__ = (
+        Index("ix_visit_business_created", "business_id", "created_at"),
+    )
+
+
+# =========================================================
+# BUSINESS STATS (dashboard counters):
+# =========================================================
+
+
+#Running per-business dashboard counts, kept in step with enquiries and visits in the same transaction
+class BusinessStats(Base):
+    __tablename__ = "business_stats"
+
+    business_id = Column(Integer, ForeignKey("businesses.id", ondelete="CASCADE"), primary_key=True)
+
+    enquiries_total = Column(Integer, nullable=False, default=0)
+    enquiries_unread = Column(Integer, nullable=False, default=0)
+    enquiries_new = Column(Integer, nullable=False, default=0)
+    visits_total = Column(Integer, nullable=False, default=0)
+
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
 
 # =========================================================
 # BUSINESS CUSTOMISATION (public website settings):
@@ -321,6 +388,18 @@ class BusinessCustomisation(Base):
 # =========================================================
 
 
+#Weekday ("0" = Monday) opening hours used until a business configures its own
+DEFAULT_OPENING_HOURS = {
+    "0": {"start": "09:00", "end": "17:00"},
+    "1": {"start": "09:00", "end": "17:00"},
+    "2": {"start": "09:00", "end": "17:00"},
+    "3": {"start": "09:00", "end": "17:00"},
+    "4": {"start": "09:00", "end": "17:00"},
+    "5": None,
+    "6": None,
+}
+
+
 #Defines availability and scheduling rules for a business
 class BusinessAvailability(Base):
     __tablename__ = "business_availability"
@@ -332,15 +411,7 @@ class BusinessAvailability(Base):
     opening_hours = Column(
         JSON,
         nullable=False,
-        default=lambda: {
-            "0": {"start": "09:00", "end": "17:00"},
-            "1": {"start": "09:00", "end": "17:00"},
-            "2": {"start": "09:00", "end": "17:00"},
-            "3": {"start": "09:00", "end": "17:00"},
-            "4": {"start": "09:00", "end": "17:00"},
-            "5": None,
-            "6": None,
-        },
+        default=lambda: {day: dict(hours) if hours else None for day, hours in DEFAULT_OPENING_HOURS.items()},
     )
 
     #Slot configuration and automation behaviour
@@ -355,14 +426,103 @@ class BusinessAvailability(Base):
     business = relationship("Business", backref=backref("availability", uselist=False))
 
 
+# =========================================================
+# BOOKING SLOT BITMAPS (occupied time units per day):
+# =========================================================
+
+
+#Bitset of the time units touched by non-cancelled bookings on one UTC day, stored as hex
+class BookingSlotDay(Base):
+    __tablename__ = "booking_slot_days"
+
+    id = Column(Integer, primary_key=True)
+    business_id = Column(Integer, ForeignKey("businesses.id", ondelete="CASCADE"), nullable=False)
+    day = Column(Date, nullable=False)
+
+    #Minutes per bit; bit 0 starts at 00:00 UTC
+    unit_minutes = Column(Integer, nullable=False)
+    bits = Column(String, nullable=False, default="0")
+
+    __table_args__ = (
+        UniqueConstraint("business_id", "day", name="uq_booking_slot_day"),
+    )
+
+
 # =========================================================
 # STRIPE EVENTS (webhook deduplication)
 # =========================================================
 
 
-#Tracks processed Stripe webhook events to ensure idempotency
+#Stores received Stripe webhook events for idempotency and background processing
 class StripeEvent(Base):
     __tablename__ = "stripe_events"
 
     event_id = Column(String, primary_key=True)
-    received_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
\ No newline at end of file
+    received_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    #Verified event body as received from Stripe
+    event_type = Column(String, nullable=True)
+    payload = Column(Text, nullable=True)
+
+    #Subscription the event belongs to; events sharing it are processed serially
+    subscription_key = Column(String, nullable=True, index=True)
+
+    #Stripe customer the event belongs to, used to replay one business's events
+    customer_key = Column(String, nullable=True, index=True)
+
+    #Processing state, retry schedule and last failure
+    status = Column(StripeEventStatusEnum, nullable=False, default="pending")
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime(timezone=True), nullable=True)
+    processed_at = Column(DateTime(timezone=True), nullable=True)
+    last_error = Column(Text, nullable=True)
+
+    #Workers poll for due pending events
+    __table_args__ = (
+        Index("ix_stripe_event_status_next_attempt", "status", "next_attempt_at"),
+    )
+
+
+# =========================================================
+# EMAIL OUTBOX (transactional email delivery queue)
+# =========================================================
+
+
+#Transactional email written alongside the business change and delivered by background workers
+class EmailOutbox(Base):
+    __tablename__ = "email_outbox"
+
+    id = Column(Integer, primary_key=True)
+
+    #Brevo template and its parameters
+    to_email = Column(String, nullable=False)
+    template_id = Column(Integer, nullable=False)
+    params = Column(JSON, nullable=False, default=dict)
+
+    #Delivery state, retry schedule and last failure
+    status = Column(EmailStatusEnum, nullable=False, default="pending")
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    last_error = Column(Text, nullable=True)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    sent_at = Column(DateTime(timezone=True), nullable=True)
+
+    #Workers poll for due pending rows
+    __table_args__ = (
+        Index("ix_email_outbox_status_next_attempt", "status", "next_attempt_at"),
+    )
+
+
+# =========================================================
+# SCHEDULED JOB RUNS (single-runner leases)
+# =========================================================
+
+
+#Next due time of a cluster-wide job; the worker that moves it forward runs the tick
+class ScheduledJobRun(Base):
+    __tablename__ = "scheduled_job_runs"
+
+    name = Column(String, primary_key=True)
+    next_run_at = Column(DateTime(timezone=True), nullable=False)
+    last_started_at = Column(DateTime(timezone=True), nullable=True)
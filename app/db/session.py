@@ -1,16 +1,182 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-import os
+from itertools import cycle
+from threading import Lock
+from time import perf_counter, time
+import asyncio
+
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.util import await_only
 
 from app.core.config import settings
 
 db_url = settings.DATABASE_URL
+replica_urls = [url.strip() for url in (settings.DATABASE_REPLICA_URLS or "").split(",") if url.strip()]
+
+
+#Queue pool that records how long checkouts wait for a free connection
+class TimedQueuePool(QueuePool):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = Lock()
+        self.checkouts = 0
+        self.checkout_timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def _do_get(self):
+        started = perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            with self._stats_lock:
+                self.checkout_timeouts += 1
+            raise
+        finally:
+            waited = perf_counter() - started
+            with self._stats_lock:
+                self.checkouts += 1
+                self.wait_seconds_total += waited
+                self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+
+#Process-wide lock letting one session at a time write to SQLite
+_SQLITE_WRITE_LOCK = Lock()
+
+
+#Apply the SQLite production profile to every new connection
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        #WAL lets readers run alongside the single writer
+        cursor.execute(f"PRAGMA journal_mode={settings.SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+        cursor.execute(f"PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE)}")
+        #Negative cache_size is in KiB rather than pages
+        cursor.execute(f"PRAGMA cache_size=-{int(settings.SQLITE_CACHE_SIZE_KB)}")
+        cursor.execute("PRAGMA foreign_keys=ON")
+    finally:
+        cursor.close()
+
+
+#Sync session behind an AsyncSession; it waits for the write lock without blocking the event loop
+class AsyncBackedSession(Session):
+    pass
+
+
+#Wait for the write lock on an executor thread, so the event loop keeps serving while it queues
+async def _acquire_sqlite_write_lock_async() -> bool:
+    waiting = asyncio.get_running_loop().run_in_executor(
+        None, lambda: _SQLITE_WRITE_LOCK.acquire(timeout=settings.SQLITE_BUSY_TIMEOUT_MS / 1000)
+    )
+    try:
+        return await asyncio.shield(waiting)
+    except asyncio.CancelledError:
+        #The thread may still get the lock after the request is gone; hand it straight back
+        waiting.add_done_callback(lambda f: f.result() and _SQLITE_WRITE_LOCK.release())
+        raise
+
+
+#Take the write lock before a session's first write, queueing writers in this process
+def _acquire_sqlite_write_lock(session):
+    if session.info.get("sqlite_write_lock"):
+        return
+
+    #Bounded by the busy timeout so a nested writer can never deadlock; SQLite's own locking still applies.
+    #Async sessions run this inside their greenlet, where await_only suspends just the calling request.
+    if isinstance(session, AsyncBackedSession):
+        acquired = await_only(_acquire_sqlite_write_lock_async())
+    else:
+        acquired = _SQLITE_WRITE_LOCK.acquire(timeout=settings.SQLITE_BUSY_TIMEOUT_MS / 1000)
+
+    if acquired:
+        session.info["sqlite_write_lock"] = True
+
+
+def _sqlite_before_flush(session, flush_context, instances):
+    _acquire_sqlite_write_lock(session)
+
+
+def _sqlite_do_orm_execute(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        _acquire_sqlite_write_lock(orm_execute_state.session)
+
+
+#Release the write lock when the session's outermost transaction commits, rolls back or closes
+def _sqlite_after_transaction_end(session, transaction):
+    if transaction.parent is None and session.info.pop("sqlite_write_lock", False):
+        _SQLITE_WRITE_LOCK.release()
+
+
+#Engine arguments for the configured database dialect
+def _engine_options(url: str) -> dict:
+    parsed = make_url(url)
+    options = {}
+
+    if parsed.get_backend_name() == "sqlite":
+        #Connections are shared between the threadpool's threads
+        options["connect_args"] = {"check_same_thread": False}
+
+        #In-memory databases need SQLAlchemy's single-connection pool
+        if parsed.database in (None, "", ":memory:"):
+            return options
+
+    else:
+        options["pool_pre_ping"] = settings.DB_POOL_PRE_PING
+        options["pool_recycle"] = settings.DB_POOL_RECYCLE
+
+        if parsed.get_backend_name() == "postgresql" and settings.DB_STATEMENT_TIMEOUT_MS:
+            options["connect_args"] = {"options": f"-c statement_timeout={settings.DB_STATEMENT_TIMEOUT_MS}"}
+
+    options["poolclass"] = TimedQueuePool
+    options["pool_size"] = settings.DB_POOL_SIZE
+    options["max_overflow"] = settings.DB_MAX_OVERFLOW
+    options["pool_timeout"] = settings.DB_POOL_TIMEOUT
+    return options
+
+
+#Async driver URL for the configured database (aiosqlite / asyncpg)
+def _async_url(url: str):
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+
+    if backend == "sqlite":
+        return parsed.set(drivername="sqlite+aiosqlite")
+    if backend == "postgresql":
+        return parsed.set(drivername="postgresql+asyncpg")
+
+    raise ValueError(f"No async driver configured for {backend}")
+
+
+#Async engine arguments mirroring the sync pool configuration
+def _async_engine_options(url: str) -> dict:
+    parsed = make_url(url)
+    options = {}
+
+    if parsed.get_backend_name() == "sqlite":
+        if parsed.database in (None, "", ":memory:"):
+            return options
+    else:
+        options["pool_pre_ping"] = settings.DB_POOL_PRE_PING
+        options["pool_recycle"] = settings.DB_POOL_RECYCLE
+
+        if parsed.get_backend_name() == "postgresql" and settings.DB_STATEMENT_TIMEOUT_MS:
+            options["connect_args"] = {"server_settings": {"statement_timeout": str(settings.DB_STATEMENT_TIMEOUT_MS)}}
+
+    options["pool_size"] = settings.DB_POOL_SIZE
+    options["max_overflow"] = settings.DB_MAX_OVERFLOW
+    options["pool_timeout"] = settings.DB_POOL_TIMEOUT
+    return options
+
 
 #create db engine
-engine = create_engine(
-    db_url,
-    connect_args={"check_same_thread": False},
-)
+engine = create_engine(db_url, **_engine_options(db_url))
+
+#create async db engine for routes served on the event loop
+async_engine = create_async_engine(_async_url(db_url), **_async_engine_options(db_url))
 
 #db connection manager
 SessionLocal = sessionmaker(
@@ -19,10 +185,163 @@ SessionLocal = sessionmaker(
     autoflush=False,
 )
 
+#async db connection manager; attributes stay loaded after commit so responses can use them
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    sync_session_class=AsyncBackedSession,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
+#SQLite profile: tuned pragmas on connect and writes serialized per process, sync and async sessions alike
+if engine.dialect.name == "sqlite" and engine.url.database not in (None, "", ":memory:"):
+    event.listen(engine, "connect", _apply_sqlite_pragmas)
+    event.listen(async_engine.sync_engine, "connect", _apply_sqlite_pragmas)
+
+    if settings.SQLITE_SERIALIZE_WRITES:
+        for target in (SessionLocal, AsyncBackedSession):
+            event.listen(target, "before_flush", _sqlite_before_flush)
+            event.listen(target, "do_orm_execute", _sqlite_do_orm_execute)
+            event.listen(target, "after_transaction_end", _sqlite_after_transaction_end)
+
+#read replica engines and sessions, used round-robin for read-only routes
+replica_engines = [create_engine(url, **_engine_options(url)) for url in replica_urls]
+async_replica_engines = [create_async_engine(_async_url(url), **_async_engine_options(url)) for url in replica_urls]
+
+_REPLICA_SESSIONS = cycle([sessionmaker(bind=e, autocommit=False, autoflush=False) for e in replica_engines]) if replica_engines else None
+_ASYNC_REPLICA_SESSIONS = cycle([
+    async_sessionmaker(bind=e, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+    for e in async_replica_engines
+]) if async_replica_engines else None
+_REPLICA_LOCK = Lock()
+
+#Subjects that wrote recently, mapped to when their reads may return to the replicas
+_PRIMARY_PINS: dict[str, float] = {}
+_PRIMARY_PINS_MAX = 10_000
+
+
+#Keep a subject's reads on the primary for the read-your-writes window
+def pin_to_primary(pin_key: str):
+    now = time()
+
+    with _REPLICA_LOCK:
+        if len(_PRIMARY_PINS) >= _PRIMARY_PINS_MAX:
+            for key in [k for k, until in _PRIMARY_PINS.items() if until <= now]:
+                del _PRIMARY_PINS[key]
+
+        _PRIMARY_PINS[pin_key] = now + settings.READ_YOUR_WRITES_SECONDS
+
+
+#Whether a subject wrote within the read-your-writes window
+def is_pinned_to_primary(pin_key: str | None) -> bool:
+    if not pin_key:
+        return False
+
+    until = _PRIMARY_PINS.get(pin_key)
+    return until is not None and until > time()
+
+
+#Note that the session wrote, so its commit pins the subject to the primary
+def _track_flush_writes(session, flush_context, instances):
+    session.info["has_writes"] = True
+
+
+def _track_execute_writes(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info["has_writes"] = True
+
+
+def _pin_after_commit(session):
+    if session.info.pop("has_writes", False) and session.info.get("pin_key"):
+        pin_to_primary(session.info["pin_key"])
+
+
+#Writes committed by an authenticated subject pin its reads to the primary
+if replica_engines:
+    event.listen(SessionLocal, "before_flush", _track_flush_writes)
+    event.listen(SessionLocal, "do_orm_execute", _track_execute_writes)
+    event.listen(SessionLocal, "after_commit", _pin_after_commit)
+
+
+#Session for read-only work: a replica, or the primary while the subject is pinned
+def open_read_session(pin_key: str | None = None):
+    if _REPLICA_SESSIONS is None or is_pinned_to_primary(pin_key):
+        return SessionLocal()
+
+    with _REPLICA_LOCK:
+        factory = next(_REPLICA_SESSIONS)
+    return factory()
+
+
+#Async counterpart of open_read_session
+def open_async_read_session(pin_key: str | None = None):
+    if _ASYNC_REPLICA_SESSIONS is None or is_pinned_to_primary(pin_key):
+        return AsyncSessionLocal()
+
+    with _REPLICA_LOCK:
+        factory = next(_ASYNC_REPLICA_SESSIONS)
+    return factory()
+
+
+#Replica reads carry no subject, e.g. anonymous public pages
+async def get_async_read_db():
+    async with open_async_read_session() as db:
+        yield db
+
+
 #access database
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+#access database without holding a threadpool slot
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+#Current pool usage for this process, for sizing workers against the database
+def pool_metrics() -> dict:
+    pool = engine.pool
+    metrics = {
+        "dialect": engine.dialect.name,
+        "pool": type(pool).__name__,
+    }
+
+    if isinstance(pool, QueuePool):
+        metrics.update({
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+            "max_overflow": pool._max_overflow,
+            "timeout_seconds": pool.timeout(),
+        })
+
+    if isinstance(pool, TimedQueuePool):
+        with pool._stats_lock:
+            metrics.update({
+                "checkouts": pool.checkouts,
+                "checkout_timeouts": pool.checkout_timeouts,
+                "checkout_wait_avg_ms": round(pool.wait_seconds_total / pool.checkouts * 1000, 3) if pool.checkouts else 0.0,
+                "checkout_wait_max_ms": round(pool.wait_seconds_max * 1000, 3),
+            })
+
+    metrics["replicas"] = len(replica_engines)
+
+    async_pool = async_engine.pool
+    if isinstance(async_pool, QueuePool):
+        metrics["async"] = {
+            "pool": type(async_pool).__name__,
+            "size": async_pool.size(),
+            "checked_out": async_pool.checkedout(),
+            "checked_in": async_pool.checkedin(),
+            "overflow": max(async_pool.overflow(), 0),
+        }
+
+    return metrics
@@ -0,0 +1,92 @@
+from sqlalchemy import Enum, inspect, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.schema import Column, Table
+
+from app.db.base import Base
+
+"""
+SCHEMA UPGRADES => IDEMPOTENT STARTUP MIGRATION
+
+create_all only creates missing tables; it never alters one that
+already exists. Run after it at startup, this adds the columns and
+indexes the models gained since a database was created, backfilling
+existing rows where a new column needs a value. Every step checks the
+live schema first, so running it again is a no-op.
+"""
+
+#Value for existing rows when a NOT NULL column without a server default is added
+COLUMN_BACKFILLS = {
+    #Rows stored before the queue existed were only kept for de-duplication and are already handled
+    ("stripe_events", "status"): "'processed'",
+    ("stripe_events", "attempts"): "0",
+}
+
+#Data fixes run once, in the same transaction that adds the column they depend on
+COLUMN_FOLLOW_UPS = {
+    #Pro access with a subscription was live before the status was stored; the reconciler corrects any drift
+    ("businesses", "stripe_subscription_status"): (
+        "UPDATE businesses SET stripe_subscription_status = 'active' "
+        "WHERE tier = 'pro' AND stripe_subscription_id IS NOT NULL"
+    ),
+}
+
+
+#ALTER TABLE ... ADD COLUMN for a model column missing from the live table
+def _add_column(conn: Connection, table: Table, column: Column):
+    dialect = conn.dialect
+    ddl = dialect.ddl_compiler(dialect, None)
+
+    #Native enum types are only created alongside a new table
+    if isinstance(column.type, Enum):
+        column.type.create(conn, checkfirst=True)
+
+    default = COLUMN_BACKFILLS.get((table.name, column.name)) or ddl.get_column_default_string(column)
+    if not column.nullable and default is None:
+        raise RuntimeError(f"{table.name}.{column.name} is NOT NULL and needs a backfill value in COLUMN_BACKFILLS")
+
+    spec = f"{dialect.identifier_preparer.quote(column.name)} {column.type.compile(dialect=dialect)}"
+    if default is not None:
+        spec += f" DEFAULT {default}"
+    if not column.nullable:
+        spec += " NOT NULL"
+
+    table_name = dialect.identifier_preparer.format_table(table)
+    conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {spec}"))
+
+    #The backfill is for existing rows only; new rows take the model's default. SQLite can't drop a default.
+    if (table.name, column.name) in COLUMN_BACKFILLS and dialect.name != "sqlite":
+        conn.execute(text(f"ALTER TABLE {table_name} ALTER COLUMN {dialect.identifier_preparer.quote(column.name)} DROP DEFAULT"))
+
+    follow_up = COLUMN_FOLLOW_UPS.get((table.name, column.name))
+    if follow_up:
+        conn.execute(text(follow_up))
+
+
+#Bring existing tables up to the models; returns a description of each change made
+def upgrade_schema(engine: Engine) -> list[str]:
+    applied = []
+
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        existing_tables = set(inspector.get_table_names())
+
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+
+            columns = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in columns:
+                    _add_column(conn, table, column)
+                    applied.append(f"column {table.name}.{column.name}")
+
+            indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in sorted(table.indexes, key=lambda index: index.name):
+                if index.name not in indexes:
+                    index.create(conn)
+                    applied.append(f"index {index.name}")
+
+    for change in applied:
+        print("🛠️ Schema upgraded:", change)
+
+    return applied
@@ -5,11 +5,17 @@ from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.db.session import engine, SessionLocal
+from app.db.session import engine, async_engine, SessionLocal
 from app.db.base import Base
 from app.db import models  # noqa: F401 (ensures models are registered)
 from app.api.router import api_router
 from app.db.seed import seed_admin
+from app.db.upgrade import upgrade_schema
+from app.services.outbox import start_email_workers, stop_email_workers
+from app.services.scheduler import start_scheduled_jobs, stop_scheduled_jobs
+from app.services.stripe_events import start_stripe_event_workers, stop_stripe_event_workers
+from app.services.bookings import ensure_booking_exclusion
+from app.core.captcha import close_captcha_verifier
 
 
 #Create application instance
@@ -33,14 +39,17 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 
-#Create all database tables on application startup
+#Create all database tables on application startup, then add columns and indexes existing tables lack
 Base.metadata.create_all(bind=engine)
+upgrade_schema(engine)
+ensure_booking_exclusion(engine)
 
 
-#Seed initial admin account when the application starts
+#Seed initial admin account and start background workers when the application starts
 @app.on_event("startup")
 def startup():
     db = SessionLocal()
@@ -49,6 +58,30 @@ def startup():
     finally:
         db.close()
 
+    start_email_workers()
+    start_stripe_event_workers()
+    start_scheduled_jobs()
+
+
+#Stop background workers, letting in-flight work finish
+@app.on_event("shutdown")
+def shutdown():
+    stop_scheduled_jobs()
+    stop_stripe_event_workers()
+    stop_email_workers()
+
+
+#Close pooled async connections on shutdown
+@app.on_event("shutdown")
+async def dispose_async_engine():
+    await async_engine.dispose()
+
+
+#Close the captcha verifier's pooled HTTP clients on shutdown
+@app.on_event("shutdown")
+async def close_http_clients():
+    await close_captcha_verifier()
+
 
 #Register all API routes under the main application
 app.include_router(api_router)
\ No newline at end of file
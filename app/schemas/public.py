@@ -1,6 +1,6 @@
 from pydantic import BaseModel, EmailStr, Field
 from typing import Optional, List, Literal
-from datetime import datetime
+from datetime import date, datetime
 
 """
 PUBLIC ROUTE SCHEMA
@@ -93,4 +93,23 @@ class PublicVisitCreate(BaseModel):
 class PublicBookingCreate(BaseModel):
     start_time: datetime
     end_time: datetime
-    customer_email: EmailStr
\ No newline at end of file
+    customer_email: EmailStr
+
+
+#Bookable time slot, in the business's timezone
+class PublicAvailabilitySlot(BaseModel):
+    start: datetime
+    end: datetime
+
+
+#Free slots on one local date
+class PublicAvailabilityDay(BaseModel):
+    date: date
+    slots: List[PublicAvailabilitySlot] = Field(default_factory=list)
+
+
+#Free booking slots for a range of dates
+class PublicAvailabilityOut(BaseModel):
+    timezone: str
+    slot_length_minutes: int
+    days: List[PublicAvailabilityDay]
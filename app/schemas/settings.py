@@ -0,0 +1,73 @@
+from pydantic import BaseModel, Field, field_validator, model_validator
+from typing import Dict, Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+"""
+SETTINGS ROUTE SCHEMA
+"""
+
+
+#Notification preferences returned for the current business
+class NotificationSettingsOut(BaseModel):
+    enquiry_digest_minutes: Optional[int] = None
+
+    model_config = {"from_attributes": True}
+
+
+#Payload used to switch enquiry notifications between immediate and digest mode.
+#Required, so only an explicit null switches the digest off
+class NotificationSettingsUpdate(BaseModel):
+    enquiry_digest_minutes: Optional[int] = Field(ge=15, le=1440)
+
+
+WEEKDAYS = ("0", "1", "2", "3", "4", "5", "6")
+
+
+#Opening and closing time for one weekday, as HH:MM in the business timezone
+class OpeningHours(BaseModel):
+    start: str = Field(pattern=r"^([01][0-9]|2[0-3]):[0-5][0-9]$")
+    end: str = Field(pattern=r"^([01][0-9]|2[0-3]):[0-5][0-9]$")
+
+    @model_validator(mode="after")
+    def closes_after_opening(self):
+        if self.end <= self.start:
+            raise ValueError("Closing time must be after opening time")
+        return self
+
+
+#Booking availability rules returned for the current business
+class AvailabilitySettingsOut(BaseModel):
+    opening_hours: Dict[str, Optional[OpeningHours]]
+    slot_length_minutes: int
+    buffer_minutes: int
+    auto_confirm: bool
+    closed: bool
+    timezone: str
+
+    model_config = {"from_attributes": True}
+
+
+#Payload replacing the booking availability rules; a null day is closed ("0" = Monday)
+class AvailabilitySettingsUpdate(BaseModel):
+    opening_hours: Dict[str, Optional[OpeningHours]]
+    slot_length_minutes: int = Field(ge=5, le=480)
+    buffer_minutes: int = Field(default=0, ge=0, le=240)
+    auto_confirm: bool = True
+    closed: bool = False
+    timezone: str = "Europe/London"
+
+    @field_validator("opening_hours")
+    @classmethod
+    def every_weekday(cls, v: dict):
+        if set(v) != set(WEEKDAYS):
+            raise ValueError("Opening hours must list weekdays 0 (Monday) to 6 (Sunday)")
+        return v
+
+    @field_validator("timezone")
+    @classmethod
+    def known_timezone(cls, v: str):
+        try:
+            ZoneInfo(v)
+        except (ZoneInfoNotFoundError, ValueError):
+            raise ValueError("Unknown timezone")
+        return v
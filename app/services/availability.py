@@ -0,0 +1,220 @@
+from datetime import date, datetime, time as dt_time, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.db.models import Booking, BookingSlotDay, BusinessAvailability, DEFAULT_OPENING_HOURS
+from app.services.slot_bitmap import check_slot_interval, slot_unit_minutes
+
+"""
+AVAILABILITY => FREE BOOKING SLOTS
+
+Turns a business's weekly opening hours into candidate slots in its own
+timezone and sweeps them against the business's bookings, merged into
+sorted busy intervals (each widened by the buffer), in a single pass.
+Slots are computed in UTC, so they keep their length across DST changes.
+Where the per-day slot bitmaps decide every slot, bookings are not read.
+"""
+
+AVAILABILITY_MAX_DAYS = 31
+
+#Rules applied to businesses that have not saved availability settings
+DEFAULT_AVAILABILITY = {
+    "opening_hours": DEFAULT_OPENING_HOURS,
+    "slot_length_minutes": 60,
+    "buffer_minutes": 30,
+    "auto_confirm": True,
+    "closed": False,
+    "timezone": "Europe/London",
+}
+
+
+#Normalise a possibly naive database timestamp to UTC
+def _as_utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+#Effective rules for a business, from its availability row or the defaults
+def availability_rules(row: BusinessAvailability | None) -> dict:
+    if row is None:
+        return dict(DEFAULT_AVAILABILITY)
+
+    return {
+        "opening_hours": row.opening_hours or {},
+        "slot_length_minutes": row.slot_length_minutes,
+        "buffer_minutes": row.buffer_minutes,
+        "auto_confirm": row.auto_confirm,
+        "closed": row.closed,
+        "timezone": row.timezone,
+    }
+
+
+#UTC opening window for one local date, or None when closed that day
+def _opening_window(rules: dict, day: date, tz: ZoneInfo) -> tuple[datetime, datetime] | None:
+    hours = (rules["opening_hours"] or {}).get(str(day.weekday()))
+    if not hours:
+        return None
+
+    opens = datetime.combine(day, dt_time.fromisoformat(hours["start"]), tzinfo=tz)
+    closes = datetime.combine(day, dt_time.fromisoformat(hours["end"]), tzinfo=tz)
+    return opens.astimezone(timezone.utc), closes.astimezone(timezone.utc)
+
+
+#UTC bounds covering every slot (and its buffer) on the given local dates
+def availability_window(rules: dict, start_date: date, days: int) -> tuple[datetime, datetime]:
+    tz = ZoneInfo(rules["timezone"])
+    buffer = timedelta(minutes=rules["buffer_minutes"])
+
+    window_start = datetime.combine(start_date, dt_time.min, tzinfo=tz).astimezone(timezone.utc)
+    window_end = datetime.combine(start_date + timedelta(days=days), dt_time.min, tzinfo=tz).astimezone(timezone.utc)
+    return window_start - buffer, window_end + buffer
+
+
+#Bookings as sorted, disjoint busy intervals, each widened by the buffer on both sides
+def _busy_intervals(bookings: list[tuple[datetime, datetime]], buffer: timedelta) -> list[list[datetime]]:
+    busy = []
+    for start, end in sorted((_as_utc(s) - buffer, _as_utc(e) + buffer) for s, e in bookings):
+        if busy and start <= busy[-1][1]:
+            busy[-1][1] = max(busy[-1][1], end)
+        else:
+            busy.append([start, end])
+    return busy
+
+
+#Candidate (start, end) UTC slots per local date from the opening hours, before bookings are considered
+def _candidate_slots(rules: dict, start_date: date, days: int, now: datetime) -> list[tuple[date, list]]:
+    tz = ZoneInfo(rules["timezone"])
+    slot = timedelta(minutes=rules["slot_length_minutes"])
+    step = slot + timedelta(minutes=rules["buffer_minutes"])
+    result = []
+
+    for offset in range(days):
+        day = start_date + timedelta(days=offset)
+        candidates = []
+        window = None if rules["closed"] else _opening_window(rules, day, tz)
+
+        if window:
+            opens, closes = window
+            slot_start = opens
+            while slot_start + slot <= closes:
+                if slot_start > now:
+                    candidates.append((slot_start, slot_start + slot))
+                slot_start += step
+
+        result.append((day, candidates))
+
+    return result
+
+
+def _slot_out(start: datetime, end: datetime, tz: ZoneInfo) -> dict:
+    return {"start": start.astimezone(tz), "end": end.astimezone(tz)}
+
+
+#Free slots per local date; bookings are (start, end) pairs of every non-cancelled booking in the window
+def compute_free_slots(
+    rules: dict,
+    bookings: list[tuple[datetime, datetime]],
+    start_date: date,
+    days: int,
+    now: datetime | None = None,
+) -> list[dict]:
+    tz = ZoneInfo(rules["timezone"])
+    busy = _busy_intervals(bookings, timedelta(minutes=rules["buffer_minutes"]))
+    k = 0
+    result = []
+
+    #Candidate slots and busy intervals are both ascending, so one pointer covers the range
+    for day, candidates in _candidate_slots(rules, start_date, days, now or datetime.now(timezone.utc)):
+        slots = []
+        for slot_start, slot_end in candidates:
+            while k < len(busy) and busy[k][1] <= slot_start:
+                k += 1
+
+            if k == len(busy) or busy[k][0] >= slot_end:
+                slots.append(_slot_out(slot_start, slot_end, tz))
+
+        result.append({"date": day, "slots": slots})
+
+    return result
+
+
+#Free slots decided from the day bitmaps alone, or None if any slot needs the exact booking sweep
+def free_slots_from_bitmaps(
+    rules: dict,
+    rows: dict,
+    start_date: date,
+    days: int,
+    now: datetime | None = None,
+) -> list[dict] | None:
+    tz = ZoneInfo(rules["timezone"])
+    buffer = timedelta(minutes=rules["buffer_minutes"])
+    unit = slot_unit_minutes(rules)
+    result = []
+
+    for day, candidates in _candidate_slots(rules, start_date, days, now or datetime.now(timezone.utc)):
+        slots = []
+        for slot_start, slot_end in candidates:
+            busy = check_slot_interval(rows, slot_start - buffer, slot_end + buffer, unit)
+            if busy is None:
+                return None
+            if not busy:
+                slots.append(_slot_out(slot_start, slot_end, tz))
+
+        result.append({"date": day, "slots": slots})
+
+    return result
+
+
+#Minutes per bitmap unit for a business, from its availability row or the defaults
+def business_slot_unit(db: Session, business_id: int) -> int:
+    row = db.query(BusinessAvailability).filter(BusinessAvailability.business_id == business_id).first()
+    return slot_unit_minutes(availability_rules(row))
+
+
+#Load the rules for a business and compute its free slots, from the day bitmaps where they decide every slot
+async def load_free_slots(db: AsyncSession, business_id: int, start_date: date | None, days: int) -> dict:
+    row = (
+        await db.execute(select(BusinessAvailability).where(BusinessAvailability.business_id == business_id))
+    ).scalars().first()
+    rules = availability_rules(row)
+    tz = ZoneInfo(rules["timezone"])
+
+    start_date = start_date or datetime.now(tz).date()
+    window_start, window_end = availability_window(rules, start_date, days)
+
+    bitmap_rows = (
+        await db.execute(
+            select(BookingSlotDay).where(
+                BookingSlotDay.business_id == business_id,
+                BookingSlotDay.day >= window_start.date(),
+                BookingSlotDay.day <= window_end.date(),
+            )
+        )
+    ).scalars().all()
+
+    slots = free_slots_from_bitmaps(rules, {r.day: r for r in bitmap_rows}, start_date, days)
+
+    if slots is None:
+        bookings = (
+            await db.execute(
+                select(Booking.start_time, Booking.end_time)
+                .where(
+                    Booking.business_id == business_id,
+                    Booking.status != "cancelled",
+                    Booking.start_time < window_end,
+                    Booking.end_time > window_start,
+                )
+                .order_by(Booking.start_time)
+            )
+        ).all()
+        slots = compute_free_slots(rules, [tuple(b) for b in bookings], start_date, days)
+
+    return {
+        "timezone": rules["timezone"],
+        "slot_length_minutes": rules["slot_length_minutes"],
+        "days": slots,
+    }
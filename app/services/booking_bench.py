@@ -0,0 +1,146 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from threading import Barrier
+import time
+import uuid
+
+from sqlalchemy.exc import DBAPIError
+
+from app.db.session import SessionLocal
+from app.db.models import Booking, BookingSlotDay, Business
+from app.services.availability import DEFAULT_AVAILABILITY
+from app.services.bookings import claim_booking_slot
+from app.services.slot_bitmap import slot_unit_minutes
+
+"""
+BOOKING CONCURRENCY BENCHMARK
+
+Starts many clients at once, each with its own session, all claiming
+the same slot (or a few slots) of one scratch business through the
+booking service. Reports claim throughput and verifies that no two
+non-cancelled bookings overlap. Intended for a scratch database.
+"""
+
+
+#One client's claims; returns (succeeded, rejected, errors)
+def _run_client(client: int, business_id: int, slot_times: list, attempts: int, unit: int, barrier: Barrier) -> tuple[int, int, int]:
+    succeeded = rejected = errors = 0
+    barrier.wait()
+
+    db = SessionLocal()
+    try:
+        for n in range(attempts):
+            start, end = slot_times[(client + n) % len(slot_times)]
+            try:
+                booking = claim_booking_slot(
+                    db,
+                    business_id,
+                    start,
+                    end,
+                    unit,
+                    customer_email=f"client-{client}@example.com",
+                    status="pending",
+                )
+                if booking is None:
+                    db.rollback()
+                    rejected += 1
+                else:
+                    db.commit()
+                    succeeded += 1
+            except DBAPIError:
+                #A lock timeout or a constraint violation; either way nothing was booked
+                db.rollback()
+                errors += 1
+    finally:
+        db.close()
+
+    return succeeded, rejected, errors
+
+
+#Pairs of non-cancelled bookings that overlap, in start order
+def _count_double_bookings(db, business_id: int) -> int:
+    bookings = (
+        db.query(Booking.start_time, Booking.end_time)
+        .filter(Booking.business_id == business_id, Booking.status != "cancelled")
+        .order_by(Booking.start_time)
+        .all()
+    )
+
+    overlaps = 0
+    latest_end = None
+    for start, end in bookings:
+        if latest_end is not None and start < latest_end:
+            overlaps += 1
+        latest_end = end if latest_end is None else max(latest_end, end)
+    return overlaps
+
+
+#Run the benchmark and return throughput and correctness figures
+def run_booking_benchmark(
+    clients: int = 16,
+    attempts: int = 20,
+    slots: int = 1,
+    keep: bool = False,
+) -> dict:
+    run_id = uuid.uuid4().hex[:8]
+    unit = slot_unit_minutes(DEFAULT_AVAILABILITY)
+    db = SessionLocal()
+
+    try:
+        business = Business(
+            name=f"Bench {run_id}",
+            slug=f"bench-{run_id}",
+            email=f"bench-{run_id}@example.invalid",
+            hashed_password="!",
+            is_active=True,
+            email_verified=True,
+        )
+        db.add(business)
+        db.commit()
+
+        #Well clear of real bookings; one hour each with a gap between
+        base = (datetime.now(timezone.utc) + timedelta(days=365)).replace(minute=0, second=0, microsecond=0)
+        slot_times = [(base + timedelta(hours=2 * i), base + timedelta(hours=2 * i + 1)) for i in range(slots)]
+
+        barrier = Barrier(clients)
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=clients) as pool:
+            results = list(
+                pool.map(
+                    lambda client: _run_client(client, business.id, slot_times, attempts, unit, barrier),
+                    range(clients),
+                )
+            )
+        seconds = time.perf_counter() - started
+
+        total = clients * attempts
+        succeeded = sum(r[0] for r in results)
+
+        return {
+            "run_id": run_id,
+            "clients": clients,
+            "slots": slots,
+            "attempts": total,
+            "succeeded": succeeded,
+            "rejected": sum(r[1] for r in results),
+            "errors": sum(r[2] for r in results),
+            "seconds": round(seconds, 3),
+            "attempts_per_second": round(total / seconds, 1) if seconds else None,
+            "double_bookings": _count_double_bookings(db, business.id),
+        }
+
+    finally:
+        if not keep:
+            _cleanup_benchmark(db, run_id)
+        db.close()
+
+
+#Remove every row the benchmark created
+def _cleanup_benchmark(db, run_id: str):
+    db.rollback()
+    business = db.query(Business).filter(Business.slug == f"bench-{run_id}").first()
+    if business:
+        db.query(Booking).filter(Booking.business_id == business.id).delete(synchronize_session=False)
+        db.query(BookingSlotDay).filter(BookingSlotDay.business_id == business.id).delete(synchronize_session=False)
+        db.delete(business)
+    db.commit()
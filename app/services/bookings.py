@@ -0,0 +1,130 @@
+from datetime import datetime
+
+from sqlalchemy import func, select, text, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.models import Booking, BookingSlotDay, Business
+from app.services.slot_bitmap import check_slot_interval, interval_days, record_booking_slots
+
+"""
+BOOKING CREATION => ATOMIC SLOT CLAIMS
+
+The overlap check and the insert run under a per-business lock, so two
+requests for the same slot cannot both pass the check: a transaction
+advisory lock on PostgreSQL, and the SQLite write lock (taken with a
+no-op UPDATE before anything is read) elsewhere. On PostgreSQL an
+exclusion constraint on (business_id, tstzrange) backs this up for
+writers that bypass the service, and startup fails without it unless
+BOOKING_EXCLUSION_REQUIRED is off. Cancelled bookings never conflict.
+"""
+
+#First key of the two-part advisory lock, so booking locks never collide with other users
+BOOKING_LOCK_NAMESPACE = 4_100
+
+BOOKING_EXCLUSION_NAME = "ex_booking_no_overlap"
+
+
+#Serialise booking writes for one business until the transaction ends
+def lock_business_bookings(db: Session, business_id: int):
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(select(func.pg_advisory_xact_lock(BOOKING_LOCK_NAMESPACE, business_id)))
+    else:
+        #Takes the database write lock; concurrent claimants wait in busy_timeout
+        db.execute(update(Business).where(Business.id == business_id).values(id=Business.id))
+
+
+#Whether a non-cancelled booking overlaps [start, end); the day bitmaps answer first
+def has_booking_conflict(db: Session, business_id: int, start: datetime, end: datetime, unit: int) -> bool:
+    rows = db.execute(
+        select(BookingSlotDay).where(
+            BookingSlotDay.business_id == business_id,
+            BookingSlotDay.day.in_(interval_days(start, end)),
+        )
+    ).scalars().all()
+
+    conflict = check_slot_interval({row.day: row for row in rows}, start, end, unit)
+    if conflict is not None:
+        return conflict
+
+    return db.execute(
+        select(Booking.id)
+        .where(
+            Booking.business_id == business_id,
+            Booking.status != "cancelled",
+            Booking.start_time < end,
+            Booking.end_time > start,
+        )
+        .limit(1)
+    ).first() is not None
+
+
+#Lock, check and insert a booking in the caller's transaction; returns None when the slot is taken
+def claim_booking_slot(
+    db: Session,
+    business_id: int,
+    start: datetime,
+    end: datetime,
+    unit: int,
+    **fields,
+) -> Booking | None:
+    lock_business_bookings(db, business_id)
+
+    if has_booking_conflict(db, business_id, start, end, unit):
+        return None
+
+    booking = Booking(business_id=business_id, start_time=start, end_time=end, **fields)
+    db.add(booking)
+    record_booking_slots(db, business_id, start, end, unit)
+    db.flush()
+    return booking
+
+
+#Raised at startup when PostgreSQL lacks the booking exclusion constraint
+class BookingExclusionError(RuntimeError):
+    pass
+
+
+def _booking_exclusion_installed(engine: Engine) -> bool:
+    with engine.connect() as conn:
+        return conn.execute(
+            text("SELECT 1 FROM pg_constraint WHERE conname = :name"),
+            {"name": BOOKING_EXCLUSION_NAME},
+        ).first() is not None
+
+
+#Add the PostgreSQL exclusion constraint once and confirm it is in place.
+#Without it PostgreSQL refuses to start unless BOOKING_EXCLUSION_REQUIRED is off,
+#e.g. while existing overlapping bookings are cleaned up; returns whether it is installed
+def ensure_booking_exclusion(engine: Engine) -> bool:
+    if engine.dialect.name != "postgresql":
+        return False
+
+    error = None
+    try:
+        with engine.begin() as conn:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS btree_gist"))
+            conn.execute(text(f"""
+                DO $$
+                BEGIN
+                    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = '{BOOKING_EXCLUSION_NAME}') THEN
+                        ALTER TABLE bookings ADD CONSTRAINT {BOOKING_EXCLUSION_NAME}
+                        EXCLUDE USING gist (business_id WITH =, tstzrange(start_time, end_time) WITH &&)
+                        WHERE (status <> 'cancelled');
+                    END IF;
+                END $$;
+            """))
+    except DBAPIError as e:
+        error = e.orig
+
+    if error is None and _booking_exclusion_installed(engine):
+        return True
+
+    message = f"Booking exclusion constraint {BOOKING_EXCLUSION_NAME} is not installed: {error or 'not found after install'}"
+    if settings.BOOKING_EXCLUSION_REQUIRED:
+        raise BookingExclusionError(message)
+
+    print("❌", message, "- double bookings are prevented by the advisory lock only")
+    return False
@@ -0,0 +1,114 @@
+from datetime import datetime, timezone, timedelta
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from app.db.models import Business, Enquiry
+from app.services.email import send_enquiry_digest
+
+"""
+ENQUIRY DIGESTS => COALESCED ENQUIRY NOTIFICATIONS
+
+Businesses with a digest window receive one summary email per window
+instead of one email per enquiry. Switching the digest off flushes the
+pending window first, so no enquiry goes unannounced.
+"""
+
+DIGEST_PREVIEW_LIMIT = 10
+DIGEST_MESSAGE_PREVIEW_CHARS = 200
+
+
+#Normalise a possibly naive database timestamp to UTC
+def _as_utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+#Queue one digest email for every business whose digest window has elapsed
+def send_enquiry_digests(db: Session, now: datetime | None = None) -> int:
+    now = now or datetime.now(timezone.utc)
+    sent = 0
+
+    candidates = (
+        db.query(
+            Business.id,
+            Business.name,
+            Business.email,
+            Business.enquiry_digest_minutes,
+            Business.enquiry_digest_sent_at,
+        )
+        .filter(
+            Business.enquiry_digest_minutes.isnot(None),
+            Business.is_active.is_(True),
+        )
+        .all()
+    )
+
+    for business in candidates:
+        window_start = business.enquiry_digest_sent_at
+        if window_start and _as_utc(window_start) + timedelta(minutes=business.enquiry_digest_minutes) > now:
+            continue
+
+        sent += _send_digest_window(db, business, now)
+
+    return sent
+
+
+#Claim a business's current window and queue its digest; returns 1 if an email was queued
+def _send_digest_window(db: Session, business, now: datetime) -> int:
+    window_start = business.enquiry_digest_sent_at
+    if window_start is None:
+        window_start = now - timedelta(minutes=business.enquiry_digest_minutes)
+
+    #Claim this window so concurrent workers don't send the same digest twice
+    claimed = db.execute(
+        update(Business)
+        .where(
+            Business.id == business.id,
+            Business.enquiry_digest_sent_at.is_(None)
+            if business.enquiry_digest_sent_at is None
+            else Business.enquiry_digest_sent_at == business.enquiry_digest_sent_at,
+        )
+        .values(enquiry_digest_sent_at=now)
+    )
+    if claimed.rowcount != 1:
+        db.rollback()
+        return 0
+
+    window = db.query(Enquiry).filter(
+        Enquiry.business_id == business.id,
+        Enquiry.created_at > window_start,
+        Enquiry.created_at <= now,
+    )
+
+    count = window.count()
+
+    if count:
+        latest = window.order_by(Enquiry.created_at.desc()).limit(DIGEST_PREVIEW_LIMIT).all()
+
+        send_enquiry_digest(
+            db=db,
+            business_email=business.email,
+            business_name=business.name,
+            enquiry_count=count,
+            enquiries=[
+                {
+                    "name": e.name,
+                    "email": e.email,
+                    "message": e.message[:DIGEST_MESSAGE_PREVIEW_CHARS],
+                }
+                for e in latest
+            ],
+            window_minutes=business.enquiry_digest_minutes,
+        )
+
+    db.commit()
+    return int(bool(count))
+
+
+#Send the pending window early, e.g. before the digest is switched off; returns 1 if an email was queued
+def flush_enquiry_digest(db: Session, business: Business, now: datetime | None = None) -> int:
+    if not business.enquiry_digest_minutes:
+        return 0
+
+    return _send_digest_window(db, business, now or datetime.now(timezone.utc))
@@ -1,10 +1,21 @@
 from datetime import datetime, timezone
-from app.core.utils import _send_email, _format_booking_time
+from sqlalchemy.orm import Session
+
+from app.core.utils import _format_booking_time
+from app.services.outbox import queue_email
+
+"""
+EMAIL NOTIFICATIONS
+
+Each helper queues a templated email in the outbox on the caller's
+session; it is delivered by the outbox workers once the caller commits.
+"""
 
 
 #Send an email verification code during signup
-def send_verification_email(*, user_email: str, code: str) -> None:
-    _send_email(
+def send_verification_email(*, db: Session, user_email: str, code: str) -> None:
+    queue_email(
+        db,
         to=user_email,
         template_id=15,  # verify email
         params={
@@ -15,8 +26,9 @@ def send_verification_email(*, user_email: str, code: str) -> None:
 
 
 #Send a password reset code after identity verification
-def send_password_reset_email(*, user_email: str, code: str) -> None:
-    _send_email(
+def send_password_reset_email(*, db: Session, user_email: str, code: str) -> None:
+    queue_email(
+        db,
         to=user_email,
         template_id=16,  # reset password
         params={
@@ -29,12 +41,14 @@ def send_password_reset_email(*, user_email: str, code: str) -> None:
 #Notify a business that a new customer enquiry has been received
 def send_enquiry_notification(
     *,
+    db: Session,
     business_email: str,
     customer_name: str,
     customer_email: str,
     message: str,
 ) -> None:
-    _send_email(
+    queue_email(
+        db,
         to=business_email,
         template_id=14,  # enquiry received (business)
         params={
@@ -45,16 +59,42 @@ def send_enquiry_notification(
     )
 
 
+#Send a business a single summary of enquiries received during its digest window
+def send_enquiry_digest(
+    *,
+    db: Session,
+    business_email: str,
+    business_name: str,
+    enquiry_count: int,
+    enquiries: list[dict],
+    window_minutes: int,
+) -> None:
+    queue_email(
+        db,
+        to=business_email,
+        template_id=22,  # enquiry digest (business)
+        params={
+            "BUSINESS_NAME": business_name,
+            "ENQUIRY_COUNT": enquiry_count,
+            "ENQUIRIES": enquiries,
+            "WINDOW_MINUTES": window_minutes,
+            "DATE": datetime.now(timezone.utc).strftime("%d %B %Y"),
+        },
+    )
+
+
 #Notify a customer that their booking request is pending confirmation
 def send_booking_pending_customer(
     *,
+    db: Session,
     customer_email: str,
     business_name: str,
     start_time: datetime,
 ) -> None:
     formatted_date, formatted_time = _format_booking_time(start_time)
 
-    _send_email(
+    queue_email(
+        db,
         to=customer_email,
         template_id=10,  # booking pending (customer)
         params={
@@ -68,6 +108,7 @@ def send_booking_pending_customer(
 #Notify a business that a new booking request is awaiting action
 def send_booking_pending_business(
     *,
+    db: Session,
     business_email: str,
     business_name: str,
     customer_email: str | None,
@@ -75,7 +116,8 @@ def send_booking_pending_business(
 ) -> None:
     formatted_date, formatted_time = _format_booking_time(start_time)
 
-    _send_email(
+    queue_email(
+        db,
         to=business_email,
         template_id=11,  # booking pending (business)
         params={
@@ -90,6 +132,7 @@ def send_booking_pending_business(
 #Notify a customer that their booking has been confirmed
 def send_booking_confirmed_customer(
     *,
+    db: Session,
     customer_email: str,
     business_name: str,
     business_email: str,
@@ -97,7 +140,8 @@ def send_booking_confirmed_customer(
 ) -> None:
     formatted_date, formatted_time = _format_booking_time(start_time)
 
-    _send_email(
+    queue_email(
+        db,
         to=customer_email,
         template_id=12,  # booking confirmed (customer)
         params={
@@ -112,13 +156,15 @@ def send_booking_confirmed_customer(
 #Notify a customer that their booking has been cancelled
 def send_booking_cancelled_customer(
     *,
+    db: Session,
     customer_email: str,
     business_name: str,
     start_time: datetime,
 ) -> None:
     formatted_date, formatted_time = _format_booking_time(start_time)
 
-    _send_email(
+    queue_email(
+        db,
         to=customer_email,
         template_id=13,  # booking cancelled (customer)
         params={
@@ -129,13 +175,63 @@ def send_booking_cancelled_customer(
     )
 
 
+#Remind a customer about an upcoming confirmed booking
+def send_booking_reminder_customer(
+    *,
+    db: Session,
+    customer_email: str,
+    business_name: str,
+    business_email: str,
+    start_time: datetime,
+) -> None:
+    formatted_date, formatted_time = _format_booking_time(start_time)
+
+    queue_email(
+        db,
+        to=customer_email,
+        template_id=23,  # booking reminder (customer)
+        params={
+            "BUSINESS_NAME": business_name,
+            "FORMATTED_DATE": formatted_date,
+            "FORMATTED_TIME": formatted_time,
+            "BUSINESS_EMAIL": business_email,
+        },
+    )
+
+
+#Remind a business about an upcoming confirmed booking
+def send_booking_reminder_business(
+    *,
+    db: Session,
+    business_email: str,
+    business_name: str,
+    customer_email: str | None,
+    start_time: datetime,
+) -> None:
+    formatted_date, formatted_time = _format_booking_time(start_time)
+
+    queue_email(
+        db,
+        to=business_email,
+        template_id=24,  # booking reminder (business)
+        params={
+            "BUSINESS_NAME": business_name,
+            "FORMATTED_DATE": formatted_date,
+            "FORMATTED_TIME": formatted_time,
+            "CUSTOMER_EMAIL": customer_email or "",
+        },
+    )
+
+
 #Notify a business that their subscription has been activated
 def send_subscription_activated_email(
     *,
+    db: Session,
     business_email: str,
     tier: str,
 ) -> None:
-    _send_email(
+    queue_email(
+        db,
         to=business_email,
         template_id=17,  # subscription activated
         params={
@@ -148,11 +244,13 @@ def send_subscription_activated_email(
 #Notify a business that their subscription plan has changed
 def send_subscription_plan_changed_email(
     *,
+    db: Session,
     business_email: str,
     old_tier: str,
     new_tier: str,
 ) -> None:
-    _send_email(
+    queue_email(
+        db,
         to=business_email,
         template_id=18,  # subscription plan changed
         params={
@@ -166,9 +264,11 @@ def send_subscription_plan_changed_email(
 #Notify a business that their subscription has been cancelled
 def send_subscription_cancelled_email(
     *,
+    db: Session,
     business_email: str,
 ) -> None:
-    _send_email(
+    queue_email(
+        db,
         to=business_email,
         template_id=19,  # subscription cancelled
         params={
@@ -180,9 +280,11 @@ def send_subscription_cancelled_email(
 #Notify a business that their account has been paused due to payment issues
 def send_account_paused_email(
     *,
+    db: Session,
     business_email: str,
 ) -> None:
-    _send_email(
+    queue_email(
+        db,
         to=business_email,
         template_id=20,  # account paused
         params={
@@ -194,11 +296,13 @@ def send_account_paused_email(
 #Notify a business about a payment issue and remaining grace period
 def send_payment_issue_email(
     *,
+    db: Session,
     business_email: str,
     status: str,
     grace_days: int,
 ) -> None:
-    _send_email(
+    queue_email(
+        db,
         to=business_email,
         template_id=21,  # payment issue
         params={
@@ -0,0 +1,85 @@
+from datetime import datetime, timezone
+from threading import Lock
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+import stripe
+
+from app.core.config import apply_subscription_state
+from app.core.utils import _safe_stripe_subscription_refresh, invalidate_cached_principal
+from app.db.models import Business
+
+"""
+SUBSCRIPTION EXPIRY => TIME-DRIVEN TIER DOWNGRADES
+
+Access dates can pass without any webhook arriving. The sweeper scans
+pro businesses whose paid and subscription periods have both lapsed
+(or whose grace period has), and re-applies subscription state to them
+in batches. A due business whose stored status still says the
+subscription is live is refreshed from Stripe first, since that usually
+means a missed webhook. Selection is on current state, so a business
+whose refresh fails is simply picked up again by the next sweep.
+"""
+
+SWEEP_BATCH_SIZE = 200
+
+#Stored statuses that keep pro access on their own, so a lapsed date alone cannot downgrade
+LIVE_SUBSCRIPTION_STATUSES = ("active", "trialing", "past_due")
+
+_SWEEP_LOCK = Lock()
+
+
+#Scheduled job: re-apply subscription state for businesses whose access dates fell due
+def sweep_expired_subscriptions(db: Session, now: datetime | None = None) -> int:
+    with _SWEEP_LOCK:
+        now = now or datetime.now(timezone.utc)
+        changed = 0
+        last_id = 0
+
+        #At least one period has ended and neither still covers now
+        paid_end = Business.latest_paid_period_end
+        period_end = Business.stripe_current_period_end
+        lapsed = and_(
+            or_(paid_end <= now, period_end <= now),
+            or_(paid_end.is_(None), paid_end <= now),
+            or_(period_end.is_(None), period_end <= now),
+        )
+        due = or_(lapsed, Business.grace_period_ends_at <= now)
+
+        while True:
+            businesses = (
+                db.query(Business)
+                .filter(Business.tier == "pro", Business.id > last_id, due)
+                .order_by(Business.id)
+                .limit(SWEEP_BATCH_SIZE)
+                .all()
+            )
+            if not businesses:
+                break
+
+            last_id = businesses[-1].id
+            updated = []
+
+            for business in businesses:
+                version = business.entitlements_version
+
+                if business.stripe_subscription_id and business.stripe_subscription_status in LIVE_SUBSCRIPTION_STATUSES:
+                    try:
+                        _safe_stripe_subscription_refresh(business)
+                    except stripe.error.StripeError as e:
+                        #Stored state stands; the business is still due at the next sweep
+                        print(f"⚠️ Subscription refresh for business {business.id} failed:", str(e))
+
+                apply_subscription_state(business)
+
+                if business.entitlements_version != version:
+                    updated.append(business.id)
+
+            db.commit()
+
+            for business_id in updated:
+                invalidate_cached_principal(business_id)
+
+            changed += len(updated)
+
+        return changed
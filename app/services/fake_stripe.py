@@ -0,0 +1,177 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+from urllib.parse import urlparse, parse_qs
+import json
+import time
+import stripe
+
+"""
+FAKE STRIPE API => LOCAL STAND-IN FOR BENCHMARKS AND DRILLS
+
+Serves the few read endpoints the webhook processor and the
+reconciliation job call (subscription retrieve/list and invoice list)
+from a local HTTP server, so they can be exercised without reaching
+Stripe. Configured subscriptions are served as given; any other id is
+an active, paid one. Rate limiting can be simulated with periodic 429 responses.
+"""
+
+FAKE_PERIOD_SECONDS = 30 * 24 * 60 * 60
+
+
+#Request handler answering subscription and invoice reads with an active paid subscription
+class _FakeStripeHandler(BaseHTTPRequestHandler):
+    server_version = "FakeStripe/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, body: dict):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        parts = url.path.strip("/").split("/")
+        count = self.server.record_request(url.path)
+
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        if self.server.rate_limit_every and count % self.server.rate_limit_every == 0:
+            return self._send_json(429, {"error": {"type": "rate_limit_error", "message": "Too many requests"}})
+
+        if parts == ["v1", "subscriptions"]:
+            return self._send_json(200, self.server.list_subscriptions(parse_qs(url.query)))
+
+        if len(parts) == 3 and parts[:2] == ["v1", "subscriptions"]:
+            configured = self.server.get_subscription(parts[2])
+            return self._send_json(200, configured or fake_subscription(parts[2]))
+
+        if parts == ["v1", "invoices"]:
+            sub_id = (parse_qs(url.query).get("subscription") or [None])[0]
+            configured = self.server.get_subscription(sub_id)
+            invoice = configured.get("latest_invoice") if configured else _fake_invoice(sub_id)
+            return self._send_json(200, {
+                "object": "list",
+                "url": "/v1/invoices",
+                "has_more": False,
+                "data": [invoice] if invoice else [],
+            })
+
+        self._send_json(404, {"error": {"type": "invalid_request_error", "message": "Unknown fake route"}})
+
+
+#Paid invoice covering the current fake billing period
+def _fake_invoice(sub_id: str | None) -> dict:
+    now = int(time.time())
+    return {
+        "id": f"in_{sub_id}",
+        "object": "invoice",
+        "status": "paid",
+        "subscription": sub_id,
+        "lines": {
+            "object": "list",
+            "has_more": False,
+            "data": [{"object": "line_item", "period": {"start": now, "end": now + FAKE_PERIOD_SECONDS}}],
+        },
+    }
+
+
+#Subscription with items and its latest invoice expanded; active and paid by default
+def fake_subscription(sub_id: str, status: str = "active", customer: str | None = None) -> dict:
+    now = int(time.time())
+    return {
+        "id": sub_id,
+        "object": "subscription",
+        "customer": customer,
+        "status": status,
+        "cancel_at_period_end": False,
+        "ended_at": None,
+        "items": {
+            "object": "list",
+            "has_more": False,
+            "data": [{"object": "subscription_item", "current_period_end": now + FAKE_PERIOD_SECONDS}],
+        },
+        "latest_invoice": _fake_invoice(sub_id),
+    }
+
+
+#Threaded fake Stripe server; used as a context manager it points the Stripe SDK at itself
+class FakeStripeServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        subscriptions: list[dict] | None = None,
+        rate_limit_every: int = 0,
+    ):
+        super().__init__((host, port), _FakeStripeHandler)
+        self.latency = latency
+        self.rate_limit_every = rate_limit_every
+        self.subscriptions = subscriptions or []
+        self._request_total = 0
+        self.requests = {}
+        self._lock = Lock()
+        self._thread = None
+        self._previous_api_base = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def request_count(self) -> int:
+        return sum(self.requests.values())
+
+    #Count a request per resource; returns the running total across all resources
+    def record_request(self, path: str) -> int:
+        key = "/".join(path.strip("/").split("/")[:2])
+        with self._lock:
+            self.requests[key] = self.requests.get(key, 0) + 1
+            self._request_total += 1
+            return self._request_total
+
+    #A configured subscription by id, or None to serve the default active one
+    def get_subscription(self, sub_id: str | None) -> dict | None:
+        for sub in self.subscriptions:
+            if sub["id"] == sub_id:
+                return sub
+        return None
+
+    #One cursor page of the configured subscriptions, as Subscription.list returns it
+    def list_subscriptions(self, query: dict) -> dict:
+        limit = int((query.get("limit") or ["10"])[0])
+        starting_after = (query.get("starting_after") or [None])[0]
+
+        start = 0
+        if starting_after:
+            ids = [sub["id"] for sub in self.subscriptions]
+            start = ids.index(starting_after) + 1 if starting_after in ids else len(ids)
+
+        page = self.subscriptions[start:start + limit]
+        return {
+            "object": "list",
+            "url": "/v1/subscriptions",
+            "has_more": start + limit < len(self.subscriptions),
+            "data": page,
+        }
+
+    def __enter__(self):
+        self._thread = Thread(target=self.serve_forever, name="fake-stripe", daemon=True)
+        self._thread.start()
+        self._previous_api_base = stripe.api_base
+        stripe.api_base = self.url
+        return self
+
+    def __exit__(self, *exc):
+        stripe.api_base = self._previous_api_base
+        self.shutdown()
+        self.server_close()
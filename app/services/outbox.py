@@ -0,0 +1,269 @@
+from datetime import datetime, timezone, timedelta
+from threading import Event, Thread
+from typing import Any
+import asyncio
+
+from sqlalchemy import event, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.email_transport import get_email_transport
+from app.db.session import SessionLocal
+from app.db.models import EmailOutbox
+
+"""
+EMAIL OUTBOX => DURABLE TRANSACTIONAL EMAIL DELIVERY
+
+Emails are written to the outbox in the same transaction as the
+business change, then delivered concurrently by background workers
+with retries, exponential backoff and a dead-letter state.
+
+A claim is identified by the attempts value it set. Sends finish
+within the lease, and outcomes are only recorded while the claim is
+still current, so a re-claimed email is never overwritten by a stale
+worker.
+"""
+
+EMAIL_MAX_ATTEMPTS = 8
+EMAIL_BACKOFF_BASE_SECONDS = 30
+EMAIL_BACKOFF_MAX_SECONDS = 60 * 60
+EMAIL_CLAIM_LEASE_SECONDS = 120
+EMAIL_SEND_TIMEOUT_SECONDS = 60
+
+#Set after a commit that queued mail so idle workers wake immediately
+_OUTBOX_WAKE = Event()
+
+
+#Session after_commit hook registered by queue_email
+def _wake_workers(session):
+    _OUTBOX_WAKE.set()
+
+
+#Queue a transactional email; it becomes deliverable when the caller commits
+def queue_email(db: Session, *, to: str, template_id: int, params: dict[str, Any]) -> EmailOutbox | None:
+    #Replays and benchmarks mark their session so no customer mail goes out
+    if db.info.get("suppress_emails"):
+        return None
+
+    row = EmailOutbox(
+        to_email=to,
+        template_id=template_id,
+        params=params,
+        status="pending",
+        attempts=0,
+        next_attempt_at=datetime.now(timezone.utc),
+    )
+    db.add(row)
+
+    if not event.contains(db, "after_commit", _wake_workers):
+        event.listen(db, "after_commit", _wake_workers, once=True)
+
+    return row
+
+
+#Delay before the next attempt, doubling per failure up to the cap
+def _backoff_seconds(attempts: int) -> int:
+    return min(EMAIL_BACKOFF_BASE_SECONDS * 2 ** max(attempts - 1, 0), EMAIL_BACKOFF_MAX_SECONDS)
+
+
+#Claim up to `limit` due emails by leasing them, safe across processes
+def claim_due_emails(limit: int) -> list[dict]:
+    db = SessionLocal()
+    try:
+        now = datetime.now(timezone.utc)
+
+        candidates = (
+            db.query(EmailOutbox.id, EmailOutbox.attempts)
+            .filter(
+                EmailOutbox.status == "pending",
+                EmailOutbox.next_attempt_at <= now,
+            )
+            .order_by(EmailOutbox.next_attempt_at)
+            .limit(limit)
+            .all()
+        )
+
+        claimed_ids = []
+        lease_until = now + timedelta(seconds=EMAIL_CLAIM_LEASE_SECONDS)
+
+        for row in candidates:
+            #Conditional update so only one worker wins each row; a crashed worker's lease simply expires
+            result = db.execute(
+                update(EmailOutbox)
+                .where(
+                    EmailOutbox.id == row.id,
+                    EmailOutbox.status == "pending",
+                    EmailOutbox.attempts == row.attempts,
+                    EmailOutbox.next_attempt_at <= now,
+                )
+                .values(
+                    next_attempt_at=lease_until,
+                    attempts=EmailOutbox.attempts + 1,
+                )
+            )
+            if result.rowcount == 1:
+                claimed_ids.append(row.id)
+
+        db.commit()
+
+        if not claimed_ids:
+            return []
+
+        rows = db.query(EmailOutbox).filter(EmailOutbox.id.in_(claimed_ids)).all()
+
+        return [
+            {
+                "id": r.id,
+                "to": r.to_email,
+                "template_id": r.template_id,
+                "params": r.params or {},
+                "attempts": r.attempts,
+                "lease_until": lease_until,
+            }
+            for r in rows
+        ]
+
+    finally:
+        db.close()
+
+
+#Update an email only while this worker's claim is current; returns False once it has been re-claimed
+def _update_claimed_email(email_id: int, attempts: int, values: dict) -> bool:
+    db = SessionLocal()
+    try:
+        result = db.execute(
+            update(EmailOutbox)
+            .where(
+                EmailOutbox.id == email_id,
+                EmailOutbox.status == "pending",
+                EmailOutbox.attempts == attempts,
+            )
+            .values(**values)
+        )
+        db.commit()
+    finally:
+        db.close()
+
+    if result.rowcount == 0:
+        print(f"⚠️ Email {email_id} claim {attempts} is no longer current; outcome not recorded")
+        return False
+    return True
+
+
+#Record a successful delivery
+def mark_email_sent(email_id: int, attempts: int) -> bool:
+    return _update_claimed_email(
+        email_id,
+        attempts,
+        {"status": "sent", "sent_at": datetime.now(timezone.utc), "last_error": None},
+    )
+
+
+#Record a failed delivery, scheduling a retry or dead-lettering the email
+def mark_email_failed(email_id: int, attempts: int, error: str) -> bool:
+    if attempts >= EMAIL_MAX_ATTEMPTS:
+        values = {"status": "dead", "last_error": error}
+    else:
+        values = {
+            "next_attempt_at": datetime.now(timezone.utc) + timedelta(seconds=_backoff_seconds(attempts)),
+            "last_error": error,
+        }
+
+    return _update_claimed_email(email_id, attempts, values)
+
+
+#Hand back a claim that was never attempted, without spending an attempt
+def release_email_claim(email_id: int, attempts: int) -> bool:
+    return _update_claimed_email(
+        email_id,
+        attempts,
+        {"attempts": attempts - 1, "next_attempt_at": datetime.now(timezone.utc)},
+    )
+
+
+#Background worker that drains the outbox with bounded concurrency
+class EmailOutboxWorker:
+    def __init__(self, concurrency: int, poll_seconds: float, batch_size: int = 50):
+        self.concurrency = concurrency
+        self.poll_seconds = poll_seconds
+        self.batch_size = batch_size
+        self._stopping = Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = Thread(target=lambda: asyncio.run(self._run()), name="email-outbox", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10):
+        self._stopping.set()
+        _OUTBOX_WAKE.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    async def _deliver(self, email: dict, slots: asyncio.Semaphore):
+        async with slots:
+            #A send must end inside the lease, or another worker could claim and send it again
+            remaining = (email["lease_until"] - datetime.now(timezone.utc)).total_seconds()
+            if remaining < EMAIL_SEND_TIMEOUT_SECONDS:
+                await asyncio.to_thread(release_email_claim, email["id"], email["attempts"])
+                return
+
+            try:
+                await asyncio.wait_for(
+                    get_email_transport().asend(
+                        to=email["to"],
+                        template_id=email["template_id"],
+                        params=email["params"],
+                    ),
+                    EMAIL_SEND_TIMEOUT_SECONDS,
+                )
+            except Exception as e:
+                await asyncio.to_thread(mark_email_failed, email["id"], email["attempts"], str(e) or type(e).__name__)
+                return
+
+            await asyncio.to_thread(mark_email_sent, email["id"], email["attempts"])
+
+    async def _run(self):
+        slots = asyncio.Semaphore(self.concurrency)
+
+        while not self._stopping.is_set():
+            try:
+                batch = await asyncio.to_thread(claim_due_emails, self.batch_size)
+            except Exception as e:
+                print("❌ Email outbox claim failed:", str(e))
+                batch = []
+
+            if batch:
+                await asyncio.gather(*(self._deliver(email, slots) for email in batch))
+                continue
+
+            await asyncio.to_thread(_OUTBOX_WAKE.wait, self.poll_seconds)
+            _OUTBOX_WAKE.clear()
+
+        await get_email_transport().aclose()
+
+
+_WORKER = None
+
+
+#Start the outbox worker for this process
+def start_email_workers():
+    global _WORKER
+
+    if not settings.EMAIL_WORKERS_ENABLED or _WORKER is not None:
+        return
+
+    _WORKER = EmailOutboxWorker(
+        concurrency=settings.EMAIL_WORKER_CONCURRENCY,
+        poll_seconds=settings.EMAIL_OUTBOX_POLL_SECONDS,
+    )
+    _WORKER.start()
+
+
+#Stop the outbox worker, letting in-flight deliveries finish
+def stop_email_workers():
+    global _WORKER
+
+    if _WORKER is not None:
+        _WORKER.stop()
+        _WORKER = None
@@ -0,0 +1,216 @@
+from datetime import datetime, timezone
+import time
+
+from sqlalchemy.orm import Session
+import stripe
+
+from app.core.config import settings, apply_subscription_state
+from app.core.utils import _ts_to_dt, _subscription_period_end, invalidate_cached_principal
+from app.db.models import Business
+from app.services.audit import log_action
+
+"""
+STRIPE RECONCILIATION => BULK REPAIR OF MISSED WEBHOOKS
+
+Pages through every subscription in Stripe, compares it with the
+businesses table in memory and applies only the differences in
+batches, so a missed webhook is corrected with one list call per
+hundred subscriptions instead of one retrieve per business. Each batch
+re-reads its businesses under a row lock and skips any whose Stripe
+state a webhook moved since the snapshot, as the listing may be minutes
+old by then.
+"""
+
+RECONCILE_PAGE_SIZE = 100
+RECONCILE_BATCH_SIZE = 100
+RECONCILE_MAX_RETRIES = 6
+RECONCILE_BACKOFF_BASE_SECONDS = 1.0
+RECONCILE_BACKOFF_MAX_SECONDS = 60.0
+
+#Columns compared between Stripe and the database
+RECONCILED_FIELDS = (
+    "stripe_subscription_status",
+    "stripe_cancel_at_period_end",
+    "stripe_ended_at",
+    "stripe_current_period_end",
+    "latest_paid_period_end",
+)
+
+
+#Normalise a possibly naive database timestamp to UTC
+def _as_utc(value):
+    if isinstance(value, datetime) and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+#Fetch one page, backing off on rate limits and transient connection errors
+def _list_page(starting_after: str | None):
+    params = {
+        "status": "all",
+        "limit": RECONCILE_PAGE_SIZE,
+        "expand": ["data.latest_invoice"],
+    }
+    if starting_after:
+        params["starting_after"] = starting_after
+
+    for attempt in range(RECONCILE_MAX_RETRIES + 1):
+        try:
+            return stripe.Subscription.list(**params)
+        except (stripe.error.RateLimitError, stripe.error.APIConnectionError):
+            if attempt == RECONCILE_MAX_RETRIES:
+                raise
+            time.sleep(min(RECONCILE_BACKOFF_BASE_SECONDS * 2 ** attempt, RECONCILE_BACKOFF_MAX_SECONDS))
+
+
+#Every subscription in the account, paginated by cursor with a pause between pages
+def _iter_subscriptions():
+    starting_after = None
+
+    while True:
+        page = _list_page(starting_after)
+        yield from page.data
+
+        if not page.has_more or not page.data:
+            return
+
+        starting_after = page.data[-1].id
+        if settings.STRIPE_RECONCILE_PAGE_INTERVAL_SECONDS:
+            time.sleep(settings.STRIPE_RECONCILE_PAGE_INTERVAL_SECONDS)
+
+
+#Subscription fields as Stripe reports them, in the businesses table's shape
+def _desired_fields(sub, current_paid_end):
+    fields = {
+        "stripe_subscription_status": sub.get("status"),
+        "stripe_cancel_at_period_end": bool(sub.get("cancel_at_period_end")),
+        "stripe_ended_at": _ts_to_dt(sub.get("ended_at")),
+        "stripe_current_period_end": _ts_to_dt(_subscription_period_end(sub)),
+        "latest_paid_period_end": current_paid_end,
+    }
+
+    #Paid coverage only moves forward, as with the webhook path
+    invoice = sub.get("latest_invoice")
+    if isinstance(invoice, dict) and invoice.get("status") == "paid":
+        lines = (invoice.get("lines") or {}).get("data") or []
+        max_end = max([(line.get("period") or {}).get("end") or 0 for line in lines] or [0])
+        paid_end = _ts_to_dt(max_end)
+        if paid_end and (not current_paid_end or paid_end > current_paid_end):
+            fields["latest_paid_period_end"] = paid_end
+
+    return fields
+
+
+#Apply one batch of differences with a single commit; returns (updated, skipped as changed since the snapshot)
+def _apply_batch(db: Session, changes: dict[int, dict], snapshot: dict[int, tuple], listed_at: datetime) -> tuple[int, int]:
+    businesses = (
+        db.query(Business)
+        .filter(Business.id.in_(list(changes)))
+        .with_for_update()
+        .populate_existing()
+        .all()
+    )
+
+    updated = []
+    for business in businesses:
+        #A webhook applied newer state (or a new subscription) after the snapshot was taken
+        current = (business.stripe_subscription_id, _as_utc(business.stripe_state_updated_at))
+        if current != snapshot[business.id]:
+            continue
+
+        diff = changes[business.id]
+        for field, value in diff.items():
+            setattr(business, field, value)
+
+        #Stripe's state as listed is at least as new as the start of the listing
+        if not current[1] or current[1] < listed_at:
+            business.stripe_state_updated_at = listed_at
+
+        apply_subscription_state(business)
+        updated.append(business.id)
+
+        log_action(
+            db=db,
+            actor_type="system",
+            actor_id=business.id,
+            action="billing.reconciled",
+            details=",".join(sorted(diff)),
+        )
+
+    db.commit()
+
+    for business_id in updated:
+        invalidate_cached_principal(business_id)
+
+    return len(updated), len(businesses) - len(updated)
+
+
+#Compare every Stripe subscription with the businesses table and fix any drift
+def reconcile_subscriptions(db: Session, dry_run: bool = False) -> dict:
+    listed_at = datetime.now(timezone.utc)
+    rows = (
+        db.query(
+            Business.id,
+            Business.stripe_subscription_id,
+            Business.stripe_state_updated_at,
+            *[getattr(Business, f) for f in RECONCILED_FIELDS],
+        )
+        .filter(Business.stripe_subscription_id.isnot(None))
+        .all()
+    )
+    by_subscription = {row.stripe_subscription_id: row for row in rows}
+    snapshot = {row.id: (row.stripe_subscription_id, _as_utc(row.stripe_state_updated_at)) for row in rows}
+    #No transaction stays open while Stripe is paged
+    db.commit()
+
+    changes = {}
+    seen = set()
+    scanned = 0
+
+    for sub in _iter_subscriptions():
+        scanned += 1
+        row = by_subscription.get(sub.get("id"))
+        if row is None:
+            continue
+
+        seen.add(row.stripe_subscription_id)
+        desired = _desired_fields(sub, _as_utc(row.latest_paid_period_end))
+        diff = {
+            field: value
+            for field, value in desired.items()
+            if _as_utc(getattr(row, field)) != value
+        }
+        if diff:
+            changes[row.id] = diff
+
+    #A full listing without our subscription means it no longer exists in Stripe.
+    #No overlap at all points at the wrong account or mode, so nothing is cancelled then.
+    missing = [] if not seen else [sub_id for sub_id in by_subscription if sub_id not in seen]
+
+    for sub_id in missing:
+        row = by_subscription[sub_id]
+        changes[row.id] = {
+            "stripe_subscription_id": None,
+            "stripe_subscription_status": "canceled",
+            "stripe_cancel_at_period_end": False,
+            "stripe_current_period_end": None,
+            "stripe_ended_at": _as_utc(row.stripe_ended_at) or datetime.now(timezone.utc),
+        }
+
+    updated = skipped = 0
+    if not dry_run:
+        ids = list(changes)
+        for start in range(0, len(ids), RECONCILE_BATCH_SIZE):
+            batch = {business_id: changes[business_id] for business_id in ids[start:start + RECONCILE_BATCH_SIZE]}
+            batch_updated, batch_skipped = _apply_batch(db, batch, snapshot, listed_at)
+            updated += batch_updated
+            skipped += batch_skipped
+
+    return {
+        "scanned": scanned,
+        "tracked": len(by_subscription),
+        "drifted": len(changes),
+        "missing": len(missing),
+        "updated": updated,
+        "skipped": skipped,
+    }
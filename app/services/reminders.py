@@ -0,0 +1,173 @@
+from datetime import datetime, timezone, timedelta
+from threading import Lock
+import heapq
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session, joinedload
+
+from app.core.config import settings
+from app.db.models import Booking
+from app.services.email import send_booking_reminder_customer, send_booking_reminder_business
+
+"""
+BOOKING REMINDERS => HEAP-SCHEDULED REMINDER EMAILS
+
+Upcoming confirmed bookings are loaded into an in-memory min-heap keyed
+by reminder time, refreshed incrementally as bookings change, and
+dispatched in batches. A tick only touches reminders that are due.
+"""
+
+REMINDER_BATCH_SIZE = 100
+
+
+#Normalise a possibly naive database timestamp to UTC
+def _as_utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+#Min-heap of (fire_at, booking_id) with lazy deletion for rescheduled or cancelled bookings
+class ReminderScheduler:
+    def __init__(self, lead: timedelta, horizon: timedelta):
+        self.lead = lead
+        self.horizon = horizon
+        self._heap = []
+        self._fire_at = {}
+        self._lock = Lock()
+        self.loaded = False
+
+    def __len__(self):
+        return len(self._fire_at)
+
+    #Schedule (or reschedule) the reminder for a booking
+    def schedule(self, booking_id: int, start_time: datetime):
+        fire_at = (_as_utc(start_time) - self.lead).timestamp()
+        with self._lock:
+            if self._fire_at.get(booking_id) == fire_at:
+                return
+            self._fire_at[booking_id] = fire_at
+            heapq.heappush(self._heap, (fire_at, booking_id))
+
+    #Forget a booking's reminder; its heap entry is skipped when popped
+    def unschedule(self, booking_id: int):
+        with self._lock:
+            self._fire_at.pop(booking_id, None)
+
+    #Pop up to `limit` booking ids whose reminder time has passed
+    def pop_due(self, now: datetime, limit: int) -> list[int]:
+        now_ts = now.timestamp()
+        due = []
+
+        with self._lock:
+            while self._heap and len(due) < limit and self._heap[0][0] <= now_ts:
+                fire_at, booking_id = heapq.heappop(self._heap)
+                if self._fire_at.get(booking_id) != fire_at:
+                    continue
+                del self._fire_at[booking_id]
+                due.append(booking_id)
+
+        return due
+
+    #Load reminders for confirmed bookings starting within lead + horizon
+    def load_window(self, db: Session, now: datetime):
+        rows = (
+            db.query(Booking.id, Booking.start_time)
+            .filter(
+                Booking.status == "confirmed",
+                Booking.start_time > now,
+                Booking.start_time <= now + self.lead + self.horizon,
+                Booking.reminder_sent_at.is_(None),
+            )
+            .all()
+        )
+
+        for row in rows:
+            self.schedule(row.id, row.start_time)
+
+        self.loaded = True
+
+
+reminder_scheduler = ReminderScheduler(
+    lead=timedelta(minutes=settings.BOOKING_REMINDER_LEAD_MINUTES),
+    horizon=timedelta(seconds=settings.BOOKING_REMINDER_REFRESH_SECONDS * 2),
+)
+
+
+#Keep the reminder heap in step with a booking that was created, confirmed or cancelled
+def notify_booking_changed(booking: Booking):
+    if booking.status != "confirmed" or booking.reminder_sent_at:
+        reminder_scheduler.unschedule(booking.id)
+        return
+
+    now = datetime.now(timezone.utc)
+    if _as_utc(booking.start_time) <= now + reminder_scheduler.lead + reminder_scheduler.horizon:
+        reminder_scheduler.schedule(booking.id, booking.start_time)
+
+
+#Scheduled job: reload the upcoming window so other processes' changes are picked up
+def refresh_reminder_window(db: Session):
+    reminder_scheduler.load_window(db, datetime.now(timezone.utc))
+
+
+#Scheduled job: queue reminder emails for every due booking in batches
+def dispatch_due_reminders(db: Session, now: datetime | None = None) -> int:
+    now = now or datetime.now(timezone.utc)
+    dispatched = 0
+
+    if not reminder_scheduler.loaded:
+        reminder_scheduler.load_window(db, now)
+
+    while True:
+        booking_ids = reminder_scheduler.pop_due(now, REMINDER_BATCH_SIZE)
+        if not booking_ids:
+            break
+
+        bookings = (
+            db.query(Booking)
+            .options(joinedload(Booking.business), joinedload(Booking.enquiry))
+            .filter(Booking.id.in_(booking_ids))
+            .all()
+        )
+
+        for booking in bookings:
+            if booking.status != "confirmed" or booking.reminder_sent_at:
+                continue
+
+            if _as_utc(booking.start_time) <= now:
+                continue
+
+            #Claim the reminder so another process dispatching the same booking skips it
+            claimed = db.execute(
+                update(Booking)
+                .where(Booking.id == booking.id, Booking.reminder_sent_at.is_(None))
+                .values(reminder_sent_at=now)
+            )
+            if claimed.rowcount != 1:
+                continue
+
+            business = booking.business
+            customer_email = booking.customer_email or (booking.enquiry.email if booking.enquiry else None)
+
+            if customer_email:
+                send_booking_reminder_customer(
+                    db=db,
+                    customer_email=customer_email,
+                    business_name=business.name,
+                    business_email=business.email,
+                    start_time=booking.start_time,
+                )
+
+            send_booking_reminder_business(
+                db=db,
+                business_email=business.email,
+                business_name=business.name,
+                customer_email=customer_email,
+                start_time=booking.start_time,
+            )
+
+            dispatched += 1
+
+        db.commit()
+
+    return dispatched
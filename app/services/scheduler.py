@@ -0,0 +1,127 @@
+from datetime import datetime, timedelta, timezone
+from threading import Event, Thread
+from typing import Callable
+
+from sqlalchemy import insert, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.db.models import ScheduledJobRun
+
+"""
+SCHEDULED JOBS => IN-PROCESS PERIODIC TASKS
+
+Runs registered jobs on a fixed interval in background threads,
+each tick with its own database session. Jobs must be safe to run
+concurrently from several worker processes, unless they are marked
+single-runner: those run once per interval across all processes, by
+whichever worker first moves the job's next_run_at forward.
+"""
+
+
+#Create a job's lease row; a row created concurrently wins
+def _insert_job_run_ignoring_duplicates(db: Session, values: dict):
+    dialect = db.get_bind().dialect.name
+
+    if dialect == "postgresql":
+        stmt = postgresql.insert(ScheduledJobRun).values(**values).on_conflict_do_nothing(index_elements=["name"])
+    elif dialect == "sqlite":
+        stmt = sqlite.insert(ScheduledJobRun).values(**values).on_conflict_do_nothing(index_elements=["name"])
+    else:
+        stmt = insert(ScheduledJobRun).values(**values)
+
+    db.execute(stmt)
+
+
+#Claim this interval's run of a cluster-wide job; False when another process already has it
+def claim_job_run(db: Session, name: str, interval_seconds: float, now: datetime | None = None) -> bool:
+    now = now or datetime.now(timezone.utc)
+    _insert_job_run_ignoring_duplicates(db, {"name": name, "next_run_at": now})
+
+    #Conditional update: exactly one process moves a due row forward
+    result = db.execute(
+        update(ScheduledJobRun)
+        .where(ScheduledJobRun.name == name, ScheduledJobRun.next_run_at <= now)
+        .values(next_run_at=now + timedelta(seconds=interval_seconds), last_started_at=now)
+    )
+    db.commit()
+    return result.rowcount == 1
+
+
+#Periodic job running `fn(db)` every `interval_seconds`, in one process only when `single_runner`
+class PeriodicJob:
+    def __init__(self, name: str, interval_seconds: float, fn: Callable[[Session], None], single_runner: bool = False):
+        self.name = name
+        self.interval_seconds = interval_seconds
+        self.fn = fn
+        self.single_runner = single_runner
+        self._stopping = Event()
+        self._thread = None
+
+    #Run a single tick, never letting a failure kill the job thread
+    def run_once(self):
+        db = SessionLocal()
+        try:
+            if self.single_runner and not claim_job_run(db, self.name, self.interval_seconds):
+                return
+            self.fn(db)
+        except Exception as e:
+            db.rollback()
+            print(f"❌ Scheduled job {self.name} failed:", str(e))
+        finally:
+            db.close()
+
+    def _run(self):
+        while not self._stopping.wait(self.interval_seconds):
+            self.run_once()
+
+    def start(self):
+        self._thread = Thread(target=self._run, name=f"job-{self.name}", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10):
+        self._stopping.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+
+_JOBS: list[PeriodicJob] = []
+
+
+#Build the jobs enabled for this process
+def _build_jobs() -> list[PeriodicJob]:
+    from app.services.digest import send_enquiry_digests
+    from app.services.reminders import dispatch_due_reminders, refresh_reminder_window
+    from app.services.stripe_events import purge_stripe_events
+    from app.services.reconcile import reconcile_subscriptions
+    from app.services.expiry import sweep_expired_subscriptions
+    from app.services.slot_bitmap import extend_slot_bitmaps
+
+    return [
+        PeriodicJob("enquiry-digest", settings.ENQUIRY_DIGEST_INTERVAL_SECONDS, send_enquiry_digests),
+        PeriodicJob("booking-reminders", settings.BOOKING_REMINDER_TICK_SECONDS, dispatch_due_reminders),
+        PeriodicJob("booking-reminders-refresh", settings.BOOKING_REMINDER_REFRESH_SECONDS, refresh_reminder_window),
+        PeriodicJob("stripe-events-retention", 60 * 60, purge_stripe_events),
+        PeriodicJob("subscription-expiry", settings.SUBSCRIPTION_SWEEP_INTERVAL_SECONDS, sweep_expired_subscriptions, single_runner=True),
+        PeriodicJob("stripe-reconcile", settings.STRIPE_RECONCILE_INTERVAL_SECONDS, reconcile_subscriptions, single_runner=True),
+        PeriodicJob("slot-bitmaps", 60 * 60, extend_slot_bitmaps, single_runner=True),
+    ]
+
+
+#Start all scheduled jobs for this process
+def start_scheduled_jobs():
+    if not settings.SCHEDULED_JOBS_ENABLED or _JOBS:
+        return
+
+    _JOBS.extend(_build_jobs())
+    for job in _JOBS:
+        job.start()
+
+
+#Stop all scheduled jobs
+def stop_scheduled_jobs():
+    for job in _JOBS:
+        job.stop()
+    _JOBS.clear()
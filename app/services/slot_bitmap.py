@@ -0,0 +1,239 @@
+from datetime import date, datetime, time as dt_time, timedelta, timezone
+from math import ceil, gcd
+
+from sqlalchemy import insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.db.models import Booking, BookingSlotDay, Business
+
+"""
+SLOT BITMAPS => OCCUPIED TIME UNITS PER DAY
+
+Each business keeps one row per UTC day whose bits mark the time units
+touched by its non-cancelled bookings. The unit divides the slot
+length, the buffer and the hour, so slots built from opening hours
+line up with whole units. A row is authoritative for its day once it
+exists; it is created and updated only on the write path (booking
+create, confirm and cancel, availability changes and the horizon job).
+
+A set bit means "some booking touches this unit". An interval with a
+set bit on a unit it fully covers is busy; one whose units are all
+clear is free; only a set bit on a partly covered edge unit needs the
+exact overlap query.
+"""
+
+SLOT_BITMAP_HORIZON_DAYS = 90
+
+
+#Normalise a possibly naive database timestamp to UTC
+def _as_utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+#Minutes per bit for a business's availability rules
+def slot_unit_minutes(rules: dict) -> int:
+    return gcd(gcd(rules["slot_length_minutes"], rules["buffer_minutes"]), 60)
+
+
+def _day_start(day: date) -> datetime:
+    return datetime.combine(day, dt_time.min, tzinfo=timezone.utc)
+
+
+#Per-day masks for [start, end); touched units, or only fully covered ones when covered=True
+def interval_masks(start: datetime, end: datetime, unit: int, covered: bool = False) -> dict[date, int]:
+    start, end = _as_utc(start), _as_utc(end)
+    unit_seconds = unit * 60
+    masks = {}
+
+    cursor = start
+    while cursor < end:
+        day = cursor.date()
+        day_start = _day_start(day)
+        segment_end = min(end, day_start + timedelta(days=1))
+
+        offset = (cursor - day_start).total_seconds() / unit_seconds
+        limit = (segment_end - day_start).total_seconds() / unit_seconds
+        first, last = (ceil(offset), int(limit)) if covered else (int(offset), ceil(limit))
+
+        if last > first:
+            masks[day] = masks.get(day, 0) | (((1 << (last - first)) - 1) << first)
+        cursor = segment_end
+
+    return masks
+
+
+#Every UTC day [start, end) touches
+def interval_days(start: datetime, end: datetime) -> list[date]:
+    first = _as_utc(start).date()
+    last = (_as_utc(end) - timedelta(microseconds=1)).date()
+    return [first + timedelta(days=n) for n in range((last - first).days + 1)]
+
+
+#Masks built from every non-cancelled booking on the given days
+def _masks_from_bookings(db: Session, business_id: int, days: list[date], unit: int) -> dict[date, int]:
+    if not days:
+        return {}
+
+    window_start = _day_start(min(days))
+    window_end = _day_start(max(days)) + timedelta(days=1)
+    wanted = set(days)
+
+    bookings = db.execute(
+        select(Booking.start_time, Booking.end_time).where(
+            Booking.business_id == business_id,
+            Booking.status != "cancelled",
+            Booking.start_time < window_end,
+            Booking.end_time > window_start,
+        )
+    ).all()
+
+    masks = {day: 0 for day in days}
+    for start, end in bookings:
+        for day, mask in interval_masks(start, end, unit).items():
+            if day in wanted:
+                masks[day] |= mask
+    return masks
+
+
+#Create a day's row; returns False when another transaction created it first
+def _insert_day_ignoring_duplicates(db: Session, values: dict) -> bool:
+    dialect = db.get_bind().dialect.name
+
+    if dialect == "postgresql":
+        stmt = postgresql.insert(BookingSlotDay).values(**values).on_conflict_do_nothing(index_elements=["business_id", "day"])
+    elif dialect == "sqlite":
+        stmt = sqlite.insert(BookingSlotDay).values(**values).on_conflict_do_nothing(index_elements=["business_id", "day"])
+    else:
+        stmt = insert(BookingSlotDay).values(**values)
+
+    return db.execute(stmt).rowcount == 1
+
+
+def _locked_rows(db: Session, business_id: int, days: list[date]) -> dict[date, BookingSlotDay]:
+    rows = (
+        db.query(BookingSlotDay)
+        .filter(BookingSlotDay.business_id == business_id, BookingSlotDay.day.in_(days))
+        .order_by(BookingSlotDay.day)
+        .with_for_update()
+        .populate_existing()
+        .all()
+    )
+    return {row.day: row for row in rows}
+
+
+#Recompute the given days from the bookings table (after a cancel or a unit change)
+def rebuild_slot_days(db: Session, business_id: int, days: list[date], unit: int):
+    if not days:
+        return
+
+    #Lock first: bookings committed by writers queued on these rows are then visible to the recount
+    rows = _locked_rows(db, business_id, days)
+    db.flush()
+    masks = _masks_from_bookings(db, business_id, days, unit)
+
+    for day in days:
+        row = rows.get(day)
+        if row is None:
+            _insert_day_ignoring_duplicates(
+                db, {"business_id": business_id, "day": day, "unit_minutes": unit, "bits": format(masks[day], "x")}
+            )
+        else:
+            row.unit_minutes = unit
+            row.bits = format(masks[day], "x")
+
+
+#Set the units a new or confirmed booking touches; call after the booking is added to the session
+def record_booking_slots(db: Session, business_id: int, start: datetime, end: datetime, unit: int):
+    masks = interval_masks(start, end, unit)
+    days = sorted(masks)
+    rows = _locked_rows(db, business_id, days)
+
+    missing = []
+    for day in days:
+        row = rows.get(day)
+        if row is None:
+            missing.append(day)
+        elif row.unit_minutes != unit:
+            rebuild_slot_days(db, business_id, [day], unit)
+        else:
+            row.bits = format(int(row.bits, 16) | masks[day], "x")
+
+    if not missing:
+        return
+
+    #A first booking on a day builds its row from the table, this booking included
+    db.flush()
+    built = _masks_from_bookings(db, business_id, missing, unit)
+    for day in missing:
+        values = {"business_id": business_id, "day": day, "unit_minutes": unit, "bits": format(built[day], "x")}
+        if not _insert_day_ignoring_duplicates(db, values):
+            #Built concurrently without this booking; add it under the row lock
+            row = _locked_rows(db, business_id, [day])[day]
+            row.bits = format(int(row.bits, 16) | masks[day], "x")
+
+
+#Clear a cancelled booking's units by recounting its days from the remaining bookings
+def release_booking_slots(db: Session, business_id: int, start: datetime, end: datetime, unit: int):
+    rebuild_slot_days(db, business_id, interval_days(start, end), unit)
+
+
+#Create rows for every day in [start_day, start_day + days) that has none, or the wrong unit
+def ensure_slot_days(db: Session, business_id: int, unit: int, start_day: date, days: int = SLOT_BITMAP_HORIZON_DAYS):
+    wanted = [start_day + timedelta(days=n) for n in range(days)]
+    existing = dict(
+        db.query(BookingSlotDay.day, BookingSlotDay.unit_minutes)
+        .filter(
+            BookingSlotDay.business_id == business_id,
+            BookingSlotDay.day >= wanted[0],
+            BookingSlotDay.day <= wanted[-1],
+        )
+        .all()
+    )
+
+    stale = [day for day in wanted if day in existing and existing[day] != unit]
+    rebuild_slot_days(db, business_id, stale, unit)
+
+    missing = [day for day in wanted if day not in existing]
+    built = _masks_from_bookings(db, business_id, missing, unit)
+    for day in missing:
+        _insert_day_ignoring_duplicates(
+            db, {"business_id": business_id, "day": day, "unit_minutes": unit, "bits": format(built[day], "x")}
+        )
+
+
+#Decide an interval from loaded rows: True busy, False free, None when the exact query is needed
+def check_slot_interval(rows: dict[date, BookingSlotDay], start: datetime, end: datetime, unit: int) -> bool | None:
+    touched = interval_masks(start, end, unit)
+    covered = interval_masks(start, end, unit, covered=True)
+
+    undecided = False
+    for day, mask in touched.items():
+        row = rows.get(day)
+        if row is None or row.unit_minutes != unit:
+            return None
+
+        bits = int(row.bits, 16)
+        if bits & covered.get(day, 0):
+            return True
+        if bits & mask:
+            undecided = True
+
+    return None if undecided else False
+
+
+#Scheduled job: keep rows for the coming horizon for every active business and drop past days
+def extend_slot_bitmaps(db: Session):
+    from app.services.availability import business_slot_unit
+
+    today = datetime.now(timezone.utc).date()
+
+    db.query(BookingSlotDay).filter(BookingSlotDay.day < today - timedelta(days=1)).delete(synchronize_session=False)
+    db.commit()
+
+    business_ids = [row.id for row in db.query(Business.id).filter(Business.is_active.is_(True)).all()]
+    for business_id in business_ids:
+        ensure_slot_days(db, business_id, business_slot_unit(db, business_id), today)
+        db.commit()
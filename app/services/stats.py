@@ -0,0 +1,185 @@
+from time import time
+
+from sqlalchemy import case, func, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.core.config import _ENQUIRY_STATS_CACHE, ENQUIRY_STATS_TIME_TO_LIVE
+from app.db.models import Business, BusinessStats, Enquiry, Visit
+
+"""
+DASHBOARD STATS => PER-BUSINESS COUNTERS
+
+Enquiry and visit counts are kept in a business_stats row adjusted in
+the same transaction as the change, so the dashboard header is one
+primary-key read. Businesses without a row yet are served from a single
+conditional-aggregation query, cached briefly; their row is created
+from that aggregate on the next change.
+"""
+
+STATS_FIELDS = ("enquiries_total", "enquiries_unread", "enquiries_new", "visits_total")
+
+
+#Counts straight from the enquiries and visits tables in one round trip
+def _count_business_stats(db: Session, business_id: int) -> dict:
+    visits = select(func.count(Visit.id)).where(Visit.business_id == business_id).scalar_subquery()
+
+    row = db.execute(
+        select(
+            func.count(Enquiry.id),
+            func.coalesce(func.sum(case((Enquiry.is_read.is_(False), 1), else_=0)), 0),
+            func.coalesce(func.sum(case((Enquiry.status == "new", 1), else_=0)), 0),
+            visits,
+        ).where(Enquiry.business_id == business_id)
+    ).one()
+
+    return dict(zip(STATS_FIELDS, (int(value or 0) for value in row)))
+
+
+#Create a business's counters row; returns False when another transaction created it first
+def _insert_stats_ignoring_duplicates(db: Session, values: dict) -> bool:
+    dialect = db.get_bind().dialect.name
+
+    if dialect == "postgresql":
+        stmt = postgresql.insert(BusinessStats).values(**values).on_conflict_do_nothing(index_elements=["business_id"])
+    elif dialect == "sqlite":
+        stmt = sqlite.insert(BusinessStats).values(**values).on_conflict_do_nothing(index_elements=["business_id"])
+    else:
+        stmt = insert(BusinessStats).values(**values)
+
+    return db.execute(stmt).rowcount == 1
+
+
+#Add deltas to an existing counters row, waiting on its row lock; returns how many rows were updated
+def _apply_stats_deltas(db: Session, business_id: int, deltas: dict) -> int:
+    return db.execute(
+        update(BusinessStats)
+        .where(BusinessStats.business_id == business_id)
+        .values({field: getattr(BusinessStats, field) + delta for field, delta in deltas.items()})
+    ).rowcount
+
+
+#Apply counter deltas in the caller's transaction, e.g. enquiries_total=1 for a new enquiry.
+#Call after the change itself is added to the session, so a first-time row can be counted with it.
+def adjust_business_stats(db: Session, business_id: int, **deltas: int):
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    if _apply_stats_deltas(db, business_id, deltas) == 0:
+        db.flush()
+        values = {"business_id": business_id, **_count_business_stats(db, business_id)}
+        if not _insert_stats_ignoring_duplicates(db, values):
+            #Created concurrently and counted without this change; add it under the row lock
+            _apply_stats_deltas(db, business_id, deltas)
+
+    _ENQUIRY_STATS_CACHE.pop(business_id, None)
+
+
+#Counter deltas for an enquiry moving between read/status states
+def enquiry_change_deltas(was_read: bool, was_status: str, is_read: bool, status: str) -> dict:
+    return {
+        "enquiries_unread": int(not is_read) - int(not was_read),
+        "enquiries_new": int(status == "new") - int(was_status == "new"),
+    }
+
+
+#Re-read an enquiry's counted state after another request changed it; None once it is gone
+def _current_enquiry_state(db: Session, enquiry_id: int) -> tuple[bool, str] | None:
+    row = db.query(Enquiry.is_read, Enquiry.status).filter(Enquiry.id == enquiry_id).first()
+    return (row.is_read, row.status) if row else None
+
+
+#Move an enquiry to a new read/status state and adjust the counters by what actually changed.
+#The write only applies while the row still holds the state the deltas were derived from, so two
+#requests making the same change count it once. Returns False when the enquiry no longer exists.
+def update_enquiry_state(db: Session, enquiry: Enquiry, is_read: bool | None = None, status: str | None = None) -> bool:
+    state = (enquiry.is_read, enquiry.status)
+
+    while state is not None:
+        was_read, was_status = state
+        target = (was_read if is_read is None else is_read, was_status if status is None else status)
+        if target == state:
+            return True
+
+        updated = (
+            db.query(Enquiry)
+            .filter(Enquiry.id == enquiry.id, Enquiry.is_read == was_read, Enquiry.status == was_status)
+            .update({"is_read": target[0], "status": target[1]}, synchronize_session=False)
+        )
+        if updated:
+            db.expire(enquiry, ["is_read", "status"])
+            adjust_business_stats(db, enquiry.business_id, **enquiry_change_deltas(was_read, was_status, *target))
+            return True
+
+        state = _current_enquiry_state(db, enquiry.id)
+
+    return False
+
+
+#Delete an enquiry and take it out of the counters as it was when deleted; False if already gone
+def delete_enquiry_counted(db: Session, enquiry: Enquiry) -> bool:
+    business_id = enquiry.business_id
+    state = (enquiry.is_read, enquiry.status)
+
+    while state is not None:
+        was_read, was_status = state
+        deleted = (
+            db.query(Enquiry)
+            .filter(Enquiry.id == enquiry.id, Enquiry.is_read == was_read, Enquiry.status == was_status)
+            .delete(synchronize_session=False)
+        )
+        if deleted:
+            db.expunge(enquiry)
+            adjust_business_stats(
+                db,
+                business_id,
+                enquiries_total=-1,
+                enquiries_unread=-int(not was_read),
+                enquiries_new=-int(was_status == "new"),
+            )
+            return True
+
+        state = _current_enquiry_state(db, enquiry.id)
+
+    return False
+
+
+#Dashboard counts for a business: the counters row, or a briefly cached aggregate
+def get_business_stats(db: Session, business_id: int) -> dict:
+    stats = db.get(BusinessStats, business_id)
+    if stats is not None:
+        return {field: getattr(stats, field) for field in STATS_FIELDS}
+
+    entry = _ENQUIRY_STATS_CACHE.get(business_id)
+    if entry and time() - entry[1] <= ENQUIRY_STATS_TIME_TO_LIVE:
+        return entry[0]
+
+    counts = _count_business_stats(db, business_id)
+    _ENQUIRY_STATS_CACHE[business_id] = (counts, time())
+    return counts
+
+
+#Recompute counters from the tables, for one business or all; returns how many rows were written
+def rebuild_business_stats(db: Session, business_id: int | None = None) -> int:
+    query = db.query(Business.id)
+    if business_id is not None:
+        query = query.filter(Business.id == business_id)
+
+    rebuilt = 0
+    for (bid,) in query.all():
+        #Adjustments wait on the locked row, so none land between the recount and the write
+        stats = db.query(BusinessStats).filter(BusinessStats.business_id == bid).with_for_update().first()
+        counts = _count_business_stats(db, bid)
+
+        if stats is None:
+            _insert_stats_ignoring_duplicates(db, {"business_id": bid, **counts})
+        else:
+            for field, value in counts.items():
+                setattr(stats, field, value)
+
+        db.commit()
+        _ENQUIRY_STATS_CACHE.pop(bid, None)
+        rebuilt += 1
+
+    return rebuilt
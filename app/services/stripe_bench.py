@@ -0,0 +1,175 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+from datetime import datetime, timezone
+import hashlib
+import hmac
+import json
+import os
+import time
+import uuid
+
+from fastapi.testclient import TestClient
+from sqlalchemy import update
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.db.models import Business, EmailOutbox, StripeEvent
+from app.services.fake_stripe import FakeStripeServer
+from app.services.stripe_events import claim_due_stripe_events, run_stripe_event_group
+
+"""
+STRIPE WEBHOOK BENCHMARK
+
+Drives signed synthetic events through the real webhook route and the
+event workers against a local fake Stripe API, reporting ingest and
+processing throughput. Intended for a scratch database.
+"""
+
+BENCH_EVENT_TYPES = (
+    "customer.subscription.created",
+    "customer.subscription.updated",
+    "invoice.paid",
+    "invoice.payment_succeeded",
+)
+
+
+#Sign a payload the way Stripe does so the webhook route accepts it
+def _signature_header(payload: str) -> str:
+    timestamp = str(int(time.time()))
+    signature = hmac.new(
+        settings.STRIPE_WEBHOOK_SECRET.encode("utf-8"),
+        f"{timestamp}.{payload}".encode("utf-8"),
+        hashlib.sha256,
+    ).hexdigest()
+    return f"t={timestamp},v1={signature}"
+
+
+#Synthetic event for a subscription; every other one is left incomplete to exercise the refresh path
+def _bench_event(run_id: str, n: int, sub_id: str, customer_id: str) -> dict:
+    event_type = BENCH_EVENT_TYPES[n % len(BENCH_EVENT_TYPES)]
+    now = int(time.time())
+
+    if event_type.startswith("customer.subscription."):
+        obj = {"id": sub_id, "object": "subscription", "customer": customer_id, "status": "active"}
+        if n % 2 == 0:
+            obj["items"] = {"data": [{"current_period_end": now + 30 * 24 * 60 * 60}]}
+    else:
+        obj = {"id": f"in_{run_id}_{n}", "object": "invoice", "subscription": sub_id, "customer": customer_id, "status": "paid"}
+
+    return {
+        "id": f"evt_bench_{run_id}_{n}",
+        "object": "event",
+        "type": event_type,
+        "created": now + n,
+        "data": {"object": obj},
+    }
+
+
+#Run the benchmark and return throughput figures
+def run_webhook_benchmark(
+    events: int = 1000,
+    subscriptions: int = 50,
+    concurrency: int = 4,
+    stripe_latency: float = 0.0,
+    keep: bool = False,
+) -> dict:
+    from app.main import app
+
+    run_id = uuid.uuid4().hex[:8]
+    db = SessionLocal()
+
+    try:
+        businesses = []
+        for i in range(subscriptions):
+            businesses.append(
+                Business(
+                    name=f"Bench {run_id} {i}",
+                    slug=f"bench-{run_id}-{i}",
+                    email=f"bench-{run_id}-{i}@example.invalid",
+                    hashed_password="!",
+                    is_active=True,
+                    email_verified=True,
+                    stripe_customer_id=f"cus_bench_{run_id}_{i}",
+                    stripe_subscription_id=f"sub_bench_{run_id}_{i}",
+                )
+            )
+        db.add_all(businesses)
+        db.commit()
+
+        payloads = []
+        for n in range(events):
+            business = businesses[n % subscriptions]
+            payloads.append(
+                json.dumps(_bench_event(run_id, n, business.stripe_subscription_id, business.stripe_customer_id))
+            )
+
+        #Handler debug output would dominate the timings
+        with FakeStripeServer(latency=stripe_latency) as fake, open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+            #Not entered as a context manager, so the app's own workers stay stopped
+            client = TestClient(app)
+
+            started = time.perf_counter()
+            for payload in payloads:
+                res = client.post(
+                    "/stripe/webhook",
+                    content=payload,
+                    headers={"stripe-signature": _signature_header(payload), "content-type": "application/json"},
+                )
+                res.raise_for_status()
+            ingest_seconds = time.perf_counter() - started
+
+            #Skip the coalescing hold so processing starts from a full queue
+            db.execute(
+                update(StripeEvent)
+                .where(StripeEvent.event_id.like(f"evt_bench_{run_id}_%"), StripeEvent.status == "pending")
+                .values(next_attempt_at=datetime.now(timezone.utc))
+            )
+            db.commit()
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                while True:
+                    groups = claim_due_stripe_events(50)
+                    if not groups:
+                        break
+                    list(pool.map(run_stripe_event_group, groups))
+            process_seconds = time.perf_counter() - started
+
+            stripe_requests = fake.request_count
+
+        statuses = _count_statuses(db, run_id)
+
+        return {
+            "run_id": run_id,
+            "events": events,
+            "subscriptions": subscriptions,
+            "ingest_seconds": round(ingest_seconds, 3),
+            "ingest_per_second": round(events / ingest_seconds, 1) if ingest_seconds else None,
+            "process_seconds": round(process_seconds, 3),
+            "process_per_second": round(events / process_seconds, 1) if process_seconds else None,
+            "stripe_requests": stripe_requests,
+            "statuses": statuses,
+        }
+
+    finally:
+        if not keep:
+            _cleanup_benchmark(db, run_id)
+        db.close()
+
+
+#Count benchmark events per final status
+def _count_statuses(db, run_id: str) -> dict[str, int]:
+    counts = {}
+    rows = db.query(StripeEvent.status).filter(StripeEvent.event_id.like(f"evt_bench_{run_id}_%")).all()
+    for row in rows:
+        counts[row.status] = counts.get(row.status, 0) + 1
+    return counts
+
+
+#Remove every row the benchmark created
+def _cleanup_benchmark(db, run_id: str):
+    db.rollback()
+    db.query(StripeEvent).filter(StripeEvent.event_id.like(f"evt_bench_{run_id}_%")).delete(synchronize_session=False)
+    db.query(EmailOutbox).filter(EmailOutbox.to_email.like(f"bench-{run_id}-%")).delete(synchronize_session=False)
+    db.query(Business).filter(Business.slug.like(f"bench-{run_id}-%")).delete(synchronize_session=False)
+    db.commit()
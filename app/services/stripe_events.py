@@ -0,0 +1,778 @@
+from datetime import datetime, timezone, timedelta
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event, Lock, Thread
+import json
+
+from sqlalchemy import delete, insert, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+import stripe
+
+from app.core.utils import (
+    _ts_to_dt,
+    _safe_stripe_subscription_refresh,
+    _apply_stripe_subscription_payload,
+    _apply_stripe_invoice_payload,
+    _mark_stripe_state_applied,
+    invalidate_cached_principal,
+)
+from app.db.session import SessionLocal
+from app.db.models import Business, StripeEvent
+from app.services.audit import log_action
+from app.services.email import (
+    send_subscription_cancelled_email,
+    send_account_paused_email,
+    send_subscription_plan_changed_email,
+)
+from app.core.config import settings, apply_subscription_state
+
+stripe.api_key = settings.STRIPE_SECRET_KEY
+
+"""
+STRIPE EVENTS => DURABLE WEBHOOK QUEUE AND PROCESSING
+
+The webhook route only verifies and stores each event; background
+workers claim stored events and apply them to businesses off the
+request path, retrying failures with exponential backoff.
+
+Events for the same subscription are processed serially, and bursts of
+subscription/invoice events arriving together are merged into a single
+state sync, apply_subscription_state and commit. The hold on a burst is
+anchored to its first event: once that is due, the rest are claimed
+with it.
+"""
+
+STRIPE_EVENT_MAX_ATTEMPTS = 8
+STRIPE_EVENT_BACKOFF_BASE_SECONDS = 15
+STRIPE_EVENT_BACKOFF_MAX_SECONDS = 60 * 60
+STRIPE_EVENT_CLAIM_LEASE_SECONDS = 300
+STRIPE_EVENT_MIN_RETENTION_DAYS = 7
+STRIPE_EVENT_PURGE_BATCH_SIZE = 500
+
+#Most recent events an admin request replays inline; the CLI replays any number
+STRIPE_EVENT_ADMIN_REPLAY_LIMIT = 200
+
+#Event types whose effect is a pure subscription state sync, safe to merge
+COALESCED_EVENT_TYPES = (
+    "customer.subscription.created",
+    "customer.subscription.updated",
+    "invoice.paid",
+    "invoice.payment_succeeded",
+)
+
+#Set when an event is stored so idle workers wake immediately
+_STRIPE_EVENT_WAKE = Event()
+
+
+#Bounded LRU of event ids this process has already stored
+class RecentEventIds:
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._ids = OrderedDict()
+        self._lock = Lock()
+
+    def __contains__(self, event_id: str) -> bool:
+        with self._lock:
+            if event_id not in self._ids:
+                return False
+            self._ids.move_to_end(event_id)
+            return True
+
+    def add(self, event_id: str):
+        with self._lock:
+            self._ids[event_id] = None
+            self._ids.move_to_end(event_id)
+            while len(self._ids) > self.max_size:
+                self._ids.popitem(last=False)
+
+
+#Answers Stripe retry storms without touching the database
+recent_event_ids = RecentEventIds(settings.STRIPE_EVENT_DEDUP_CACHE_SIZE)
+
+
+#Stripe subscription id an event relates to, used to serialize and merge processing
+def _subscription_key(event_type: str | None, obj: dict) -> str | None:
+    if not event_type:
+        return None
+
+    if event_type.startswith("customer.subscription."):
+        return obj.get("id")
+
+    if event_type.startswith("invoice.") or event_type == "checkout.session.completed":
+        return obj.get("subscription")
+
+    return None
+
+
+#Insert statement that silently skips an event id that is already stored
+def _insert_event_ignoring_duplicates(db: Session, values: dict):
+    dialect = db.get_bind().dialect.name
+
+    if dialect == "postgresql":
+        stmt = postgresql.insert(StripeEvent).values(**values).on_conflict_do_nothing(index_elements=["event_id"])
+    elif dialect == "sqlite":
+        stmt = sqlite.insert(StripeEvent).values(**values).on_conflict_do_nothing(index_elements=["event_id"])
+    else:
+        stmt = insert(StripeEvent).values(**values)
+
+    try:
+        return db.execute(stmt).rowcount == 1
+    except IntegrityError:
+        db.rollback()
+        return False
+
+
+#Durably store a verified event; returns False if it was already received
+def enqueue_stripe_event(event_id: str, event_type: str, payload: str) -> bool:
+    if event_id in recent_event_ids:
+        return False
+
+    obj = (json.loads(payload).get("data") or {}).get("object") or {}
+    now = datetime.now(timezone.utc)
+
+    #Hold mergeable events briefly so the rest of their burst is claimed with them
+    next_attempt_at = now
+    if event_type in COALESCED_EVENT_TYPES:
+        next_attempt_at = now + timedelta(seconds=settings.STRIPE_EVENT_COALESCE_SECONDS)
+
+    db = SessionLocal()
+    try:
+        #Single insert-or-ignore round trip; the primary key decides duplicates
+        inserted = _insert_event_ignoring_duplicates(
+            db,
+            {
+                "event_id": event_id,
+                "event_type": event_type,
+                "subscription_key": _subscription_key(event_type, obj),
+                "customer_key": obj.get("customer"),
+                "payload": payload,
+                "status": "pending",
+                "attempts": 0,
+                "next_attempt_at": next_attempt_at,
+            },
+        )
+        db.commit()
+
+    finally:
+        db.close()
+
+    recent_event_ids.add(event_id)
+
+    if inserted:
+        _STRIPE_EVENT_WAKE.set()
+
+    return inserted
+
+
+#Apply an event's own payload to the business; False when a live refresh is needed instead
+def _apply_event_payload(business: Business, event: dict) -> bool:
+    if not settings.STRIPE_APPLY_EVENT_PAYLOADS:
+        return False
+
+    event_type = event.get("type") or ""
+    obj = (event.get("data") or {}).get("object") or {}
+
+    if event_type.startswith("customer.subscription."):
+        return _apply_stripe_subscription_payload(business, obj, event.get("created"))
+
+    if event_type in ("invoice.paid", "invoice.payment_succeeded"):
+        return _apply_stripe_invoice_payload(business, obj)
+
+    return False
+
+
+#Bring a business's subscription fields up to date for an event, from its payload when possible
+def _sync_subscription_state(business: Business, event: dict) -> str:
+    if _apply_event_payload(business, event):
+        return "payload"
+
+    #Payload missing fields or older than state already applied: ask Stripe
+    _safe_stripe_subscription_refresh(business)
+    _mark_stripe_state_applied(business, event.get("created"))
+    return "refresh"
+
+
+#Load the business for a subscription, locking its row so processes apply events one at a time
+def _business_for_subscription(db: Session, sub_id: str | None) -> Business | None:
+    if not sub_id:
+        return None
+
+    return (
+        db.query(Business)
+        .filter(Business.stripe_subscription_id == sub_id)
+        .with_for_update()
+        .first()
+    )
+
+
+#Log and notify a tier change caused by subscription events
+def _record_tier_change(db: Session, business: Business, old_tier: str):
+    if old_tier == business.tier:
+        return
+
+    log_action(
+        db=db,
+        actor_type="system",
+        actor_id=business.id,
+        action="billing.tier_updated",
+        details=f"{old_tier}->{business.tier}",
+    )
+
+    send_subscription_plan_changed_email(
+        db=db,
+        business_email=business.email,
+        old_tier=old_tier,
+        new_tier=business.tier,
+    )
+
+
+#Apply a verified Stripe event to the matching business; returns whether it was handled
+def process_stripe_event(db: Session, event: dict) -> bool:
+    event_type = event.get("type")
+    obj = (event.get("data") or {}).get("object") or {}
+    handled = False
+
+    # ------------------------------------------------------------------
+    # CHECKOUT COMPLETED
+    # ------------------------------------------------------------------
+    if event_type == "checkout.session.completed":
+        metadata = obj.get("metadata") or {}
+        business_id = metadata.get("business_id")
+
+        business = db.get(Business, int(business_id)) if business_id else None
+
+        if business:
+            business.stripe_customer_id = obj.get("customer")
+            business.stripe_subscription_id = obj.get("subscription")
+
+            # ❗ DO NOT refresh subscription here
+            # Stripe has not finished creating it yet
+
+            db.commit()
+
+            log_action(
+                db=db,
+                actor_type="system",
+                actor_id=business.id,
+                action="billing.checkout_completed",
+            )
+
+            handled = True
+            db.commit()
+
+
+    # ------------------------------------------------------------------
+    # SUBSCRIPTION UPDATED / CREATED (Refreshes everything)
+    # ------------------------------------------------------------------
+    elif event_type in ("customer.subscription.updated", "customer.subscription.created"):
+        sub_id = obj.get("id")
+
+        business = _business_for_subscription(db, sub_id)
+
+        if business:
+
+            old_tier = business.tier
+
+            # 1. Sync status, cancel_at, ended_at and period end (payload first, live refresh as fallback)
+            source = _sync_subscription_state(business, event)
+            apply_subscription_state(business)
+            db.commit()
+            invalidate_cached_principal(business.id)
+
+            print(f"WEBHOOK: {event_type} handled via {source}")
+            print(f"  Sub: {business.stripe_subscription_status}")
+            print(f"  Tier: {business.tier}")
+            print(f"  Invoice Exp: {business.latest_paid_period_end}")
+
+            _record_tier_change(db, business, old_tier)
+
+            handled = True
+            db.commit()
+
+    # ------------------------------------------------------------------
+    # INVOICE PAID / SUCCEEDED (Updates access coverage)
+    # ------------------------------------------------------------------
+    elif event_type in ("invoice.paid", "invoice.payment_succeeded"):
+        # If an invoice is paid, we should update the business's latest_paid_period_end
+        sub_id = obj.get("subscription")
+        if sub_id:
+            business = _business_for_subscription(db, sub_id)
+            if business:
+                # The paid invoice's line periods extend access directly;
+                # incomplete payloads fall back to the authoritative refresh.
+                _sync_subscription_state(business, event)
+                apply_subscription_state(business)
+                db.commit()
+                invalidate_cached_principal(business.id)
+                handled = True
+
+
+    # ------------------------------------------------------------------
+    # PAYMENT FAILED → START / CONTINUE GRACE PERIOD
+    # ------------------------------------------------------------------
+    elif event_type == "invoice.payment_failed":
+        sub_id = obj.get("subscription")
+        cust_id = obj.get("customer")
+
+        business = _business_for_subscription(db, sub_id)
+
+        if not business and cust_id:
+            business = (
+                db.query(Business)
+                .filter(Business.stripe_customer_id == cust_id)
+                .first()
+            )
+
+        if business:
+            _safe_stripe_subscription_refresh(business)
+            apply_subscription_state(business, "past_due")
+            db.commit()
+            invalidate_cached_principal(business.id)
+
+            log_action(
+                db=db,
+                actor_type="system",
+                actor_id=business.id,
+                action="billing.payment_failed",
+            )
+
+            send_account_paused_email(
+                db=db,
+                business_email=business.email
+            )
+
+            handled = True
+            db.commit()
+
+    # ------------------------------------------------------------------
+    # SUBSCRIPTION CANCELLED
+    # ------------------------------------------------------------------
+    elif event_type == "customer.subscription.deleted":
+        sub_id = obj.get("id")
+
+        business = _business_for_subscription(db, sub_id)
+
+        if business:
+            # Mark as canceled in our model, but KEEP authoritative access date
+            # We assume "deleted" means immediate cancellation in Stripe terms, 
+            # but user might still have paid time left.
+            
+            business.stripe_subscription_status = "canceled"
+            business.stripe_subscription_id = None
+            business.stripe_cancel_at_period_end = False
+            business.stripe_current_period_end = None
+            # business.latest_paid_period_end # Do NOT clear this!
+            
+            # Recompute: if latest_paid_period_end > now, they stay Pro.
+            business.stripe_ended_at = _ts_to_dt(obj.get("ended_at")) or business.stripe_ended_at
+            apply_subscription_state(business)
+            db.commit()
+            invalidate_cached_principal(business.id)
+
+            log_action(
+                db=db,
+                actor_type="system",
+                actor_id=business.id,
+                action="billing.subscription_cancelled",
+            )
+
+            send_subscription_cancelled_email(
+                db=db,
+                business_email=business.email
+            )
+
+            handled = True
+            db.commit()
+
+    return handled
+
+
+#Merge a burst of state-sync events for one subscription into one sync, apply and commit
+def _process_coalesced_events(db: Session, events: list[dict]) -> list[bool]:
+    if len(events) <= 1:
+        return [process_stripe_event(db, event) for event in events]
+
+    first = events[0]
+    sub_id = _subscription_key(first.get("type"), (first.get("data") or {}).get("object") or {})
+    business = _business_for_subscription(db, sub_id)
+
+    if not business:
+        return [False] * len(events)
+
+    old_tier = business.tier
+
+    #Every payload is applied in order; any that can't be trusted triggers one refresh at the end
+    needs_refresh = False
+    for event in events:
+        if not _apply_event_payload(business, event):
+            needs_refresh = True
+
+    if needs_refresh:
+        _safe_stripe_subscription_refresh(business)
+        for event in events:
+            _mark_stripe_state_applied(business, event.get("created"))
+
+    apply_subscription_state(business)
+    _record_tier_change(db, business, old_tier)
+    db.commit()
+    invalidate_cached_principal(business.id)
+
+    print(f"WEBHOOK: {len(events)} events for {sub_id} coalesced via {'refresh' if needs_refresh else 'payload'}")
+    print(f"  Sub: {business.stripe_subscription_status}")
+    print(f"  Tier: {business.tier}")
+
+    return [True] * len(events)
+
+
+#Process events for one subscription in Stripe order, merging consecutive state-sync events
+def process_stripe_events(db: Session, events: list[dict]) -> list[bool]:
+    outcomes = []
+    run = []
+
+    for event in events:
+        if event.get("type") in COALESCED_EVENT_TYPES:
+            run.append(event)
+            continue
+
+        outcomes.extend(_process_coalesced_events(db, run))
+        run = []
+        outcomes.append(process_stripe_event(db, event))
+
+    outcomes.extend(_process_coalesced_events(db, run))
+    return outcomes
+
+
+#Delay before the next attempt, doubling per failure up to the cap
+def _backoff_seconds(attempts: int) -> int:
+    return min(STRIPE_EVENT_BACKOFF_BASE_SECONDS * 2 ** max(attempts - 1, 0), STRIPE_EVENT_BACKOFF_MAX_SECONDS)
+
+
+#Claim up to `limit` due events by leasing them, grouped per subscription; safe across processes.
+#Each group maps event id to its claimed attempts count, which fences the claim's later writes.
+def claim_due_stripe_events(limit: int) -> list[dict[str, int]]:
+    db = SessionLocal()
+    try:
+        now = datetime.now(timezone.utc)
+
+        candidates = (
+            db.query(StripeEvent.event_id, StripeEvent.attempts, StripeEvent.subscription_key)
+            .filter(
+                StripeEvent.status == "pending",
+                StripeEvent.next_attempt_at <= now,
+            )
+            .order_by(StripeEvent.received_at)
+            .limit(limit)
+            .all()
+        )
+
+        groups = {}
+        lease_until = now + timedelta(seconds=STRIPE_EVENT_CLAIM_LEASE_SECONDS)
+
+        for row in candidates:
+            result = db.execute(
+                update(StripeEvent)
+                .where(
+                    StripeEvent.event_id == row.event_id,
+                    StripeEvent.status == "pending",
+                    StripeEvent.attempts == row.attempts,
+                    StripeEvent.next_attempt_at <= now,
+                )
+                .values(
+                    next_attempt_at=lease_until,
+                    attempts=StripeEvent.attempts + 1,
+                )
+            )
+            if result.rowcount == 1:
+                #Events without a subscription have nothing to serialize on, so run alone
+                key = row.subscription_key or f"event:{row.event_id}"
+                groups.setdefault(key, {})[row.event_id] = row.attempts + 1
+
+        #A due group takes the rest of its burst still on hold, so one burst is one refresh.
+        #attempts == 0 limits this to never-claimed events, leaving other workers' leases alone.
+        subscription_keys = [row.subscription_key for row in candidates if row.subscription_key in groups]
+        if subscription_keys:
+            held = (
+                db.query(StripeEvent.event_id, StripeEvent.subscription_key)
+                .filter(
+                    StripeEvent.subscription_key.in_(set(subscription_keys)),
+                    StripeEvent.status == "pending",
+                    StripeEvent.attempts == 0,
+                )
+                .all()
+            )
+
+            for row in held:
+                result = db.execute(
+                    update(StripeEvent)
+                    .where(
+                        StripeEvent.event_id == row.event_id,
+                        StripeEvent.status == "pending",
+                        StripeEvent.attempts == 0,
+                    )
+                    .values(
+                        next_attempt_at=lease_until,
+                        attempts=1,
+                    )
+                )
+                if result.rowcount == 1:
+                    groups[row.subscription_key][row.event_id] = 1
+
+        db.commit()
+        return list(groups.values())
+
+    finally:
+        db.close()
+
+
+#Write an event's outcome; with `attempts`, only while that claim is still the current one
+def _record_event_outcome(db: Session, event_id: str, attempts: int | None, values: dict) -> bool:
+    stmt = update(StripeEvent).where(StripeEvent.event_id == event_id)
+    if attempts is not None:
+        stmt = stmt.where(StripeEvent.status == "pending", StripeEvent.attempts == attempts)
+
+    if db.execute(stmt.values(**values)).rowcount == 0:
+        #The lease ran out and another worker re-claimed the event; its outcome stands
+        print(f"⚠️ Stripe event {event_id} outcome dropped: claim no longer current")
+        return False
+
+    return True
+
+
+#Process stored events for one subscription in Stripe order and record each outcome.
+#`claims` (event id -> claimed attempts) fences the writes to a worker's own claim.
+def _process_event_records(
+    db: Session,
+    records: list[StripeEvent],
+    retry: bool = True,
+    claims: dict[str, int] | None = None,
+) -> dict[str, int]:
+    #Stripe's created time orders the burst; arrival order breaks ties
+    records = sorted(records, key=lambda r: (json.loads(r.payload).get("created") or 0, r.received_at))
+    ordered_ids = [r.event_id for r in records]
+    attempts = {r.event_id: r.attempts for r in records}
+    claimed = claims or {}
+    events = [json.loads(r.payload) for r in records]
+
+    try:
+        outcomes = process_stripe_events(db, events)
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Stripe events {ordered_ids} failed:", str(e))
+
+        failed = 0
+        for event_id in ordered_ids:
+            values = {"last_error": str(e), "status": "failed"}
+            if retry and attempts[event_id] < STRIPE_EVENT_MAX_ATTEMPTS:
+                values["status"] = "pending"
+                values["next_attempt_at"] = datetime.now(timezone.utc) + timedelta(
+                    seconds=_backoff_seconds(attempts[event_id])
+                )
+            if _record_event_outcome(db, event_id, claimed.get(event_id), values):
+                failed += 1
+        db.commit()
+        return {"failed": failed}
+
+    now = datetime.now(timezone.utc)
+    counts = {"processed": 0, "ignored": 0}
+    for event_id, handled in zip(ordered_ids, outcomes):
+        status = "processed" if handled else "ignored"
+        values = {"status": status, "processed_at": now, "last_error": None}
+        if _record_event_outcome(db, event_id, claimed.get(event_id), values):
+            counts[status] += 1
+    db.commit()
+
+    return counts
+
+
+#Extend a group's leases before processing; returns the claims still held by this worker
+def _renew_stripe_event_claims(db: Session, claims: dict[str, int]) -> dict[str, int]:
+    lease_until = datetime.now(timezone.utc) + timedelta(seconds=STRIPE_EVENT_CLAIM_LEASE_SECONDS)
+    held = {}
+
+    for event_id, attempts in claims.items():
+        result = db.execute(
+            update(StripeEvent)
+            .where(
+                StripeEvent.event_id == event_id,
+                StripeEvent.status == "pending",
+                StripeEvent.attempts == attempts,
+            )
+            .values(next_attempt_at=lease_until)
+        )
+        if result.rowcount == 1:
+            held[event_id] = attempts
+        else:
+            print(f"⚠️ Stripe event {event_id} skipped: claim no longer current")
+
+    db.commit()
+    return held
+
+
+#Process one subscription's claimed events serially and record each outcome.
+#A group that waited out its lease in the pool queue may have been re-claimed; those events are left to the new claimant.
+def run_stripe_event_group(claims: dict[str, int]):
+    db = SessionLocal()
+    try:
+        claims = _renew_stripe_event_claims(db, claims)
+        if not claims:
+            return
+
+        records = (
+            db.query(StripeEvent)
+            .filter(StripeEvent.event_id.in_(claims), StripeEvent.status == "pending")
+            .all()
+        )
+        if records:
+            _process_event_records(db, records, claims=claims)
+
+    finally:
+        db.close()
+
+
+#Re-run stored events in arrival order, in bulk or for one business; emails are suppressed unless `notify`.
+#With `limit`, only the most recent events are replayed and the older ones are counted as skipped.
+def replay_stripe_events(
+    business_id: int | None = None,
+    since: datetime | None = None,
+    notify: bool = False,
+    limit: int | None = None,
+) -> dict[str, int]:
+    db = SessionLocal()
+    try:
+        query = db.query(StripeEvent).filter(StripeEvent.payload.isnot(None))
+
+        if business_id is not None:
+            business = db.get(Business, business_id)
+            if not business:
+                raise ValueError(f"Business {business_id} not found")
+
+            #Customer id survives resubscription; the current subscription covers events without one
+            keys = [StripeEvent.customer_key == business.stripe_customer_id] if business.stripe_customer_id else []
+            if business.stripe_subscription_id:
+                keys.append(StripeEvent.subscription_key == business.stripe_subscription_id)
+            if not keys:
+                return {"events": 0, "processed": 0, "ignored": 0, "failed": 0, "skipped": 0}
+
+            query = query.filter(or_(*keys))
+
+        if since is not None:
+            query = query.filter(StripeEvent.received_at >= since)
+
+        if limit is None:
+            records = query.order_by(StripeEvent.received_at).all()
+            skipped = 0
+        else:
+            records = query.order_by(StripeEvent.received_at.desc()).limit(limit).all()[::-1]
+            skipped = max(query.count() - len(records), 0)
+
+        #Keep each subscription's events together, subscriptions in order of first arrival
+        groups = {}
+        for record in records:
+            key = record.subscription_key or f"event:{record.event_id}"
+            groups.setdefault(key, []).append(record)
+
+        db.info["suppress_emails"] = not notify
+        totals = {"events": len(records), "processed": 0, "ignored": 0, "failed": 0, "skipped": skipped}
+
+        #Replays report failures rather than leaving them for the workers to retry with emails on
+        for group in groups.values():
+            for outcome, count in _process_event_records(db, group, retry=False).items():
+                totals[outcome] += count
+
+        return totals
+
+    finally:
+        db.close()
+
+
+#Scheduled job: delete settled events past the retention window, in batches
+def purge_stripe_events(db: Session, now: datetime | None = None) -> int:
+    now = now or datetime.now(timezone.utc)
+
+    #Must outlive Stripe's retry schedule (about three days) or retries would be re-processed
+    retention_days = max(settings.STRIPE_EVENT_RETENTION_DAYS, STRIPE_EVENT_MIN_RETENTION_DAYS)
+    cutoff = now - timedelta(days=retention_days)
+    purged = 0
+
+    while True:
+        batch = (
+            select(StripeEvent.event_id)
+            .where(
+                StripeEvent.status.in_(("processed", "ignored")),
+                StripeEvent.received_at < cutoff,
+            )
+            .limit(STRIPE_EVENT_PURGE_BATCH_SIZE)
+        )
+        event_ids = db.execute(batch).scalars().all()
+        if not event_ids:
+            break
+
+        db.execute(delete(StripeEvent).where(StripeEvent.event_id.in_(event_ids)))
+        db.commit()
+        purged += len(event_ids)
+
+    return purged
+
+
+#Background worker draining stored Stripe events through a thread pool, one task per subscription
+class StripeEventWorker:
+    def __init__(self, concurrency: int, poll_seconds: float, batch_size: int = 50):
+        self.poll_seconds = poll_seconds
+        self.batch_size = batch_size
+        self.pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="stripe-event")
+        self._stopping = Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = Thread(target=self._run, name="stripe-events", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10):
+        self._stopping.set()
+        _STRIPE_EVENT_WAKE.set()
+        if self._thread:
+            self._thread.join(timeout)
+        self.pool.shutdown(wait=True)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                groups = claim_due_stripe_events(self.batch_size)
+            except Exception as e:
+                print("❌ Stripe event claim failed:", str(e))
+                groups = []
+
+            if groups:
+                list(self.pool.map(run_stripe_event_group, groups))
+                continue
+
+            _STRIPE_EVENT_WAKE.wait(self.poll_seconds)
+            _STRIPE_EVENT_WAKE.clear()
+
+
+_WORKER = None
+
+
+#Start the Stripe event worker for this process
+def start_stripe_event_workers():
+    global _WORKER
+
+    if not settings.STRIPE_EVENT_WORKERS_ENABLED or _WORKER is not None:
+        return
+
+    _WORKER = StripeEventWorker(
+        concurrency=settings.STRIPE_EVENT_WORKER_CONCURRENCY,
+        poll_seconds=settings.STRIPE_EVENT_POLL_SECONDS,
+    )
+    _WORKER.start()
+
+
+#Stop the Stripe event worker, letting in-flight events finish
+def stop_stripe_event_workers():
+    global _WORKER
+
+    if _WORKER is not None:
+        _WORKER.stop()
+        _WORKER = None